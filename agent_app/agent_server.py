@@ -0,0 +1,123 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from mcp_client import MCPClient
+from conversation import Conversation
+from session_manager import SessionManager, SessionLimitError
+from interfaces import QueryRequest, QueryResponse, SessionResponse
+from tracing import trace_request, metrics_text
+
+# Comma separated paths of the MCP servers shared by every session
+MCP_SERVERS = [path.strip() for path in os.getenv("AGENT_MCP_SERVERS", "").split(",") if path.strip()]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    client = MCPClient()
+    sessions = SessionManager()
+    await client.connect_to_servers(MCP_SERVERS)
+    sessions.start()
+    app.state.client = client
+    app.state.sessions = sessions
+    try:
+        yield
+    finally:
+        await sessions.stop()
+        await client.cleanup()
+
+app = FastAPI(lifespan=lifespan)
+app.middleware("http")(trace_request)
+
+
+def get_conversation(session_id: str) -> Conversation:
+    try:
+        return app.state.sessions.get(session_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+
+async def stream_tokens(conversation: Conversation, query: str) -> AsyncIterator[str]:
+    """
+    Process a query of a conversation yielding the tokens of the answer as they arrive.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def run():
+        try:
+            async with conversation.lock:
+                await app.state.client.process_query(query, conversation, on_token=queue.put_nowait)
+        finally:
+            conversation.touch()
+            queue.put_nowait(None)
+
+    task = asyncio.create_task(run())
+    try:
+        while (token := await queue.get()) is not None:
+            yield token
+        await task
+    finally:
+        if not task.done():
+            task.cancel()
+
+@app.get("/sessions")
+def sessions_stats():
+    return app.state.sessions.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return metrics_text()
+
+@app.post("/sessions", response_model=SessionResponse)
+def create_session():
+    try:
+        conversation = app.state.sessions.create()
+    except SessionLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"session_id": conversation.id}
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str):
+    if not app.state.sessions.close(session_id):
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return {"deleted": session_id}
+
+@app.post("/sessions/{session_id}/query", response_model=QueryResponse)
+async def query_session(session_id: str, request: QueryRequest):
+    conversation = get_conversation(session_id)
+    async with conversation.lock:
+        response = await app.state.client.process_query(request.query, conversation)
+    conversation.touch()
+    return {"session_id": session_id, "response": response}
+
+@app.post("/sessions/{session_id}/stream")
+async def stream_session(session_id: str, request: QueryRequest):
+    conversation = get_conversation(session_id)
+    return StreamingResponse(stream_tokens(conversation, request.query), media_type="text/plain")
+
+@app.websocket("/sessions/{session_id}/ws")
+async def websocket_session(websocket: WebSocket, session_id: str):
+    try:
+        conversation = app.state.sessions.get(session_id)
+    except KeyError:
+        await websocket.close(code=4404)
+        return
+
+    await websocket.accept()
+    try:
+        while True:
+            query = await websocket.receive_text()
+            answer = []
+            try:
+                async for token in stream_tokens(conversation, query):
+                    answer.append(token)
+                    await websocket.send_json({"type": "token", "content": token})
+            except Exception as e:
+                await websocket.send_json({"type": "error", "content": str(e)})
+                continue
+            await websocket.send_json({"type": "done", "content": "".join(answer)})
+    except WebSocketDisconnect:
+        pass
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Optional
+
+from conversation import Conversation
+
+# Seconds the privileges of a user are trusted before resolving them again
+AUTHZ_CACHE_TTL = float(os.getenv("AUTHZ_CACHE_TTL", 300))
+# Optional JSON file mapping tool names to the privilege names allowing them
+AUTHZ_POLICY_PATH = os.getenv("AUTHZ_POLICY_PATH")
+
+# Privilege names allowing each user management tool, "*" means any privilege.
+# Reading the users and their privileges is a user management operation too.
+DEFAULT_POLICY = {
+    "get_users": ["read_users", "user_management"],
+    "get_all_privileges": ["read_privileges", "user_management"],
+    "get_privileges_of_user": ["read_privileges", "user_management"],
+    "get_privileges_of_users": ["read_privileges", "user_management"],
+    "create_user": ["create_user", "user_management"],
+    "update_user": ["update_user", "user_management"],
+    "delete_user": ["delete_user", "user_management"],
+    "add_privileges_to_user": ["grant_privileges", "user_management"],
+    "add_privileges_to_users": ["grant_privileges", "user_management"],
+    "delete_privileges_to_user": ["revoke_privileges", "user_management"],
+    "delete_privileges_to_users": ["revoke_privileges", "user_management"],
+}
+
+# Tools changing the privileges of the users given in their arguments
+INVALIDATING_TOOLS = {
+    "delete_user",
+    "add_privileges_to_user",
+    "add_privileges_to_users",
+    "delete_privileges_to_user",
+    "delete_privileges_to_users",
+}
+
+IDENTIFY_USER_TOOL = {
+    "type": "function",
+    "name": "identify_user",
+    "description": "Identify the user of the conversation by name or id. It must be called once before any user management operation; privileges are then checked automatically.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "user_name": {"type": "string", "description": "Name of the user"},
+            "user_id": {"type": "string", "description": "Id of the user, when it is known"}
+        }
+    }
+}
+
+
+def load_policy() -> dict:
+    if AUTHZ_POLICY_PATH is None:
+        return DEFAULT_POLICY
+    with open(AUTHZ_POLICY_PATH, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+class Authorizer:
+    """
+    Checks the user management tool calls against the privileges of the
+    user of the conversation without going through the model.
+
+    The privileges of each user are resolved once and cached for the whole
+    process, and they are invalidated when a tool changes them.
+    """
+
+    def __init__(self, servers, policy: Optional[dict] = None, ttl: float = AUTHZ_CACHE_TTL):
+        self.servers = servers
+        self.policy = policy if policy is not None else load_policy()
+        self.ttl = ttl
+        self.privileges: dict[str, tuple[float, set[str]]] = {}
+        # Lookups in progress, the concurrent checks of a user wait for the same one
+        self.in_flight: dict[str, asyncio.Future] = {}
+
+    async def _call(self, tool_name: str, tool_args: dict) -> Any:
+        result = await self.servers.call_tool(tool_name, tool_args)
+        if result.isError:
+            # Not cached as "no privileges", the check fails until the server answers
+            raise RuntimeError(f"Could not resolve the privileges with {tool_name}: {result.content[0].text if result.content else 'no details'}")
+        if not result.content:
+            return None
+        return json.loads(result.content[0].text)
+
+    async def privileges_of(self, user_id: str) -> set[str]:
+        cached = self.privileges.get(user_id)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        pending = self.in_flight.get(user_id)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # The lookup we joined was cancelled, not this one
+                if not pending.cancelled():
+                    raise
+            return await self.privileges_of(user_id)
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[user_id] = future
+        try:
+            result = await self._call("get_privileges_of_user", {"user_id": user_id}) or {}
+            names = {
+                privilege["privilege_name"].lower()
+                for privilege in result.get("privileges", []) if privilege
+            }
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Retrieve it so an exception nobody waited for is not reported
+            future.exception()
+            raise
+        finally:
+            current = self.in_flight.get(user_id) is future
+            if current:
+                del self.in_flight[user_id]
+
+        future.set_result(names)
+        # Not stored when the privileges were invalidated during the lookup
+        if current:
+            self.privileges[user_id] = (time.monotonic() + self.ttl, names)
+        return names
+
+    def invalidate(self, user_id: str):
+        self.privileges.pop(str(user_id), None)
+        # Later checks must not join a lookup started before the change
+        self.in_flight.pop(str(user_id), None)
+
+    async def identify(self, conversation: Conversation, tool_args: dict) -> dict:
+        """
+        Resolve the user of the conversation and its privileges. A name must
+        match exactly (ignoring case) a single user; otherwise the partial
+        matches are only returned as candidates to ask the user about.
+        """
+        user_id = tool_args.get("user_id")
+        user_name = tool_args.get("user_name")
+
+        if user_id is None:
+            if not user_name:
+                return {"error": "missing_identity", "message": "Provide the name or the id of the user."}
+            result = await self._call("get_users", {"name": user_name, "fields": "id_user,user_name"}) or {}
+            users = result.get("items", [])
+            exact = [user for user in users if user["user_name"].lower() == user_name.lower()]
+            if len(exact) != 1:
+                return {
+                    "error": "not_found" if not exact else "ambiguous",
+                    "message": "Ask the user for their exact name or id.",
+                    "candidates": (exact or users)[:10]
+                }
+            user_id = exact[0]["id_user"]
+
+        conversation.acting_user_id = str(user_id)
+        privileges = await self.privileges_of(conversation.acting_user_id)
+        return {"user_id": conversation.acting_user_id, "privileges": sorted(privileges)}
+
+    async def check(self, conversation: Conversation, tool_name: str) -> Optional[dict]:
+        """
+        Return None when the tool call is allowed, or the error explaining why it is not.
+        """
+        required = self.policy.get(tool_name)
+        if required is None:
+            return None
+
+        if conversation.acting_user_id is None:
+            return {
+                "error": "unauthenticated",
+                "message": f"Ask the user who they are and call identify_user before using {tool_name}."
+            }
+
+        privileges = await self.privileges_of(conversation.acting_user_id)
+        if ("*" in required and privileges) or privileges & {name.lower() for name in required}:
+            return None
+        return {
+            "error": "forbidden",
+            "message": f"The user {conversation.acting_user_id} does not have the privileges to use {tool_name}.",
+            "required_privileges": required
+        }
+
+    def after_call(self, tool_name: str, tool_args: dict):
+        if tool_name not in INVALIDATING_TOOLS:
+            return
+        for user_id in tool_args.get("user_ids") or [tool_args.get("user_id")]:
+            if user_id is not None:
+                self.invalidate(user_id)
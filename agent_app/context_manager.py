@@ -0,0 +1,153 @@
+import json
+import os
+from typing import Any, Callable
+
+from conversation import Conversation
+
+# Maximum number of tokens of the context sent to the model
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 12000))
+# Latest turns that are never compacted nor summarized
+CONTEXT_KEEP_RECENT_TURNS = int(os.getenv("CONTEXT_KEEP_RECENT_TURNS", 2))
+# Size, in tokens, a tool output of an older turn is compacted to
+TOOL_OUTPUT_COMPACT_TOKENS = int(os.getenv("TOOL_OUTPUT_COMPACT_TOKENS", 200))
+# Model used to summarize the older turns
+CONTEXT_SUMMARY_MODEL = os.getenv("CONTEXT_SUMMARY_MODEL", "gpt-4.1-mini")
+
+COMPACTED_MARKER = '{"compacted": true'
+
+SUMMARY_PROMPT = "Summarize the conversation between a user and a store assistant. Keep the identity of the user, the ids, names and values mentioned, the operations performed and any pending request. Answer only with the summary."
+
+# Tokenizer loaded on first use, False when tiktoken is not available
+_encoding = None
+
+
+def get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = False
+    return _encoding
+
+def count_text_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    # Approximation when tiktoken is not installed
+    return len(text) // 4 + 1
+
+def truncate_tokens(text: str, tokens: int, keep_end: bool = False) -> str:
+    """
+    First (or last, with keep_end) `tokens` tokens of the text.
+    """
+    encoding = get_encoding()
+    if encoding:
+        encoded = encoding.encode(text)
+        return encoding.decode(encoded[-tokens:] if keep_end else encoded[:tokens])
+    # Same approximation as count_text_tokens, 4 characters per token
+    return text[-tokens * 4:] if keep_end else text[:tokens * 4]
+
+def item_text(item: dict) -> str:
+    if item.get("type") == "function_call":
+        return f"{item['name']}({item['arguments']})"
+    if item.get("type") == "function_call_output":
+        return item["output"]
+    return item.get("content", "")
+
+def count_tokens(items: list[dict]) -> int:
+    return sum(count_text_tokens(item_text(item)) for item in items)
+
+
+class ContextManager:
+    """
+    Keeps the context of a conversation under a token budget.
+
+    When the budget is exceeded the tool outputs of the older turns are
+    compacted first and, if that is not enough, the oldest turns are folded
+    into the running summary of the conversation. The developer instructions
+    always come first and the context is only rewritten when the budget is
+    exceeded, so the prompt prefix stays stable for provider-side caching.
+    """
+
+    def __init__(
+        self,
+        get_openai: Callable[[], Any],
+        budget: int = CONTEXT_TOKEN_BUDGET,
+        keep_recent_turns: int = CONTEXT_KEEP_RECENT_TURNS,
+        tool_output_tokens: int = TOOL_OUTPUT_COMPACT_TOKENS,
+        summary_model: str = CONTEXT_SUMMARY_MODEL,
+    ):
+        # The OpenAI client is only needed, and created, when summarizing
+        self.get_openai = get_openai
+        self.budget = budget
+        self.keep_recent_turns = max(1, keep_recent_turns)
+        self.tool_output_tokens = tool_output_tokens
+        self.summary_model = summary_model
+
+    async def fit(self, conversation: Conversation):
+        if count_tokens(conversation.messages()) <= self.budget:
+            return
+
+        older_turns = conversation.turns[:-self.keep_recent_turns]
+        for turn in older_turns:
+            self.compact_turn(turn)
+
+        evicted = []
+        while (
+            len(conversation.turns) > self.keep_recent_turns
+            and count_tokens(conversation.messages()) > self.budget
+        ):
+            evicted.append(conversation.turns.pop(0))
+
+        if evicted:
+            conversation.summary = await self.summarize(conversation.summary, evicted)
+
+    def compact_turn(self, turn: list[dict]):
+        """
+        Replace the large tool outputs of a turn with a short preview.
+        """
+        for item in turn:
+            if item.get("type") != "function_call_output" or item["output"].startswith(COMPACTED_MARKER):
+                continue
+            tokens = count_text_tokens(item["output"])
+            if tokens <= self.tool_output_tokens:
+                continue
+            item["output"] = json.dumps({
+                "compacted": True,
+                "note": f"Output of {tokens} tokens truncated, call the tool again for the full data.",
+                "preview": truncate_tokens(item["output"], self.tool_output_tokens)
+            })
+
+    async def summarize(self, summary: str, turns: list[list[dict]]) -> str:
+        """
+        Fold the given turns into the running summary of the conversation.
+        """
+        transcript = []
+        for turn in turns:
+            for item in turn:
+                if item.get("type") == "function_call":
+                    transcript.append(f"tool call: {item_text(item)}")
+                elif item.get("type") == "function_call_output":
+                    transcript.append(f"tool output: {item_text(item)}")
+                else:
+                    transcript.append(f"{item['role']}: {item['content']}")
+
+        content = "\n".join(transcript)
+        if summary:
+            content = f"Previous summary: {summary}\n\n{content}"
+
+        try:
+            response = await self.get_openai().responses.create(
+                model=self.summary_model,
+                input=[
+                    {"role": "developer", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": content}
+                ],
+            )
+            return response.output_text
+        except Exception as e:
+            print(f"Could not summarize the conversation: {e}")
+            # Keep the end of the raw transcript, within a fraction of the budget
+            return truncate_tokens(content, self.budget // 4, keep_end=True)
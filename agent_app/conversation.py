@@ -0,0 +1,73 @@
+import asyncio
+import time
+import uuid
+from typing import Optional
+
+from tool_memo import ToolMemo, TOOL_MEMO_TTL
+from rate_limit import RateLimiter
+
+DEVELOPER_PROMPT = "If the user wants to make an operation related to user management, you have to authenticate the user first asking who he is and calling identify_user once you know it. The privileges of the user are verified automatically on every user management tool, so you do not need to retrieve them to check permissions; if a tool answers that the user is not allowed, explain it to the user. Beaware that if the user has some privilege of user management, implicity, he could list or retrieve information from the system."
+
+
+class Conversation:
+    """
+    State of a single conversation and a lock so only one query of the
+    conversation is processed at a time.
+
+    The context is kept as a stable prefix (the developer instructions), an
+    optional summary of the older turns and the list of recent turns, each
+    one holding the items (messages, tool calls and their outputs) sent to
+    the model.
+    """
+
+    def __init__(self, conversation_id: Optional[str] = None):
+        self.id = conversation_id or uuid.uuid4().hex
+        self.prefix: list[dict] = [{
+            "role": "developer",
+            "content": DEVELOPER_PROMPT
+        }]
+        self.summary: Optional[str] = None
+        self.turns: list[list[dict]] = []
+        # Id of the user identified in the conversation, used for authorization
+        self.acting_user_id: Optional[str] = None
+        # Results of read-only tool calls, used when TOOL_MEMO_SCOPE is "session"
+        self.tool_memo = ToolMemo(TOOL_MEMO_TTL)
+        # Rate limits of its tool calls, kept on reset so it cannot be used to skip them
+        self.rate_limiter = RateLimiter()
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+    def start_turn(self, query: str):
+        self.turns.append([{
+            "role": "user",
+            "content": query
+        }])
+
+    def add_items(self, items: list[dict]):
+        self.turns[-1].extend(items)
+
+    def messages(self) -> list[dict]:
+        """
+        Items of the context in the order they are sent to the model.
+        """
+        messages = list(self.prefix)
+        if self.summary:
+            messages.append({
+                "role": "developer",
+                "content": f"Summary of the earlier conversation: {self.summary}"
+            })
+        for turn in self.turns:
+            messages.extend(turn)
+        return messages
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+    def idle_time(self) -> float:
+        return time.monotonic() - self.last_used
+
+    def reset(self):
+        self.summary = None
+        self.turns.clear()
+        self.acting_user_id = None
+        self.tool_memo.clear()
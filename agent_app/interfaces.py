@@ -0,0 +1,11 @@
+from pydantic import BaseModel, Field
+
+class QueryRequest(BaseModel):
+    query: str = Field(description="Message of the user")
+
+class QueryResponse(BaseModel):
+    session_id: str
+    response: str
+
+class SessionResponse(BaseModel):
+    session_id: str
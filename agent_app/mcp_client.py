@@ -1,208 +1,282 @@
 import asyncio
-from typing import Optional
-from contextlib import AsyncExitStack
-import httpx
-from mcp.server.fastmcp import FastMCP
+from typing import Callable, Optional
 
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from server_registry import ServerRegistry
+from conversation import Conversation
+from context_manager import ContextManager
+from authorization import Authorizer, IDENTIFY_USER_TOOL
+from tool_memo import ToolMemo, TOOL_MEMO_SCOPE
+from rate_limit import RateLimitError
+from tracing import span
 
-from openai import OpenAI
 from dotenv import load_dotenv
 import os
 import json
 
 load_dotenv()
 
-context_window = []
+# Maximum number of tool calls of one model turn executed at the same time
+MAX_CONCURRENT_TOOL_CALLS = int(os.getenv("MAX_CONCURRENT_TOOL_CALLS", 4))
+# Model turns and tool calls one query may use before the model has to answer
+AGENT_MAX_ITERATIONS = int(os.getenv("AGENT_MAX_ITERATIONS", 10))
+AGENT_MAX_TOOL_CALLS = int(os.getenv("AGENT_MAX_TOOL_CALLS", 30))
+
+def budget_exhausted() -> asyncio.Future:
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(json.dumps([{
+        "error": "The tool call budget of this query is exhausted, answer with the information already retrieved."
+    }]))
+    return future
 
 class MCPClient:
     def __init__(self):
         # Initialize session and client objects
-        self.session: Optional[ClientSession] = None
-        self.exist_stack: AsyncExitStack = AsyncExitStack()
-        self.openai = OpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            base_url=os.getenv("OPENAI_API_BASE_URL", "https://api.openai.com/v1")
-        )
-        self.mcp = FastMCP("mcp_client")
-
-    async def connect_to_server(self, server_script_path: str):
+        self.servers = ServerRegistry()
+        self._openai = None
+        self.context_manager = ContextManager(lambda: self.openai)
+        self.authorizer = Authorizer(self.servers)
+
+    @property
+    def openai(self):
         """
-        Connect to the MCP server using the provided script path.
+        OpenAI client, created on first use so the `openai` package is not
+        imported before the servers are connected.
+        """
+        if self._openai is None:
+            from openai import AsyncOpenAI
+
+            self._openai = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=os.getenv("OPENAI_API_BASE_URL", "https://api.openai.com/v1")
+            )
+        return self._openai
+
+    @openai.setter
+    def openai(self, client):
+        self._openai = client
+
+    async def connect_to_servers(self, server_script_paths: list[str]):
         """
-        is_python = server_script_path.endswith(".py")
-        is_js = server_script_path.endswith(".js")
-
-        if not (is_python or is_js):
-            raise ValueError("Server script must be a Python or JavaScript file.")
-
-        command = "python" if is_python else "node"
-
-        server_params = StdioServerParameters(
-            command=command,
-            args=[server_script_path],
-            env=None
-        )
-
-        stdio_transport = await self.exist_stack.enter_async_context(
-            stdio_client(server_params)
-        )
-        self.stidio, self.write = stdio_transport
-        self.session = await self.exist_stack.enter_async_context(
-            ClientSession(self.stidio, self.write)
-        )
-
-        await self.session.initialize()
-
-        # List available tools
-        response = await self.session.list_tools()
-        tools = response.tools
-        print("Connected to server with tools:", [tool.name for tool in tools])
+        Connect to the MCP servers using the provided script paths.
+        """
+        await self.servers.connect_all(server_script_paths)
     
-    async def process_query(self, query: str) -> str:
+    async def process_query(
+        self,
+        query: str,
+        conversation: Conversation,
+        on_token: Optional[Callable[[str], None]] = None
+    ) -> str:
         """
-        Process a query using the MCP server and return the response.
+        Process a query of a conversation using the MCP servers and return the response.
+        The text of the model is streamed to `on_token` as it arrives.
         """
 
-        messages = []
-
-        if len(context_window) > 0:
-            # Use existing context window if available
-            context_window.append({
-                "role": "user",
-                "content": query
-            })
-        
-        else:
-            # Initialize context window with developer instructions
-            context_window.append({
-                    "role": "developer",
-                    "content": "If the user wants to make an operation related to user management, you have to authenticate the user first asking who he is, and then once you already know who is, then verify if the user has the privileges to perform the operation. Beaware that if the user has some privilege of user management, implicity, he could list or retrieve information from the system."
-            })
-            context_window.append({
-                    "role": "user",
-                    "content": query
-            })
-        
-        messages = context_window.copy()
-
-
-        # Get available tools
-        response = await self.session.list_tools()
-        available_tools = [
-            {   
-                "type": "function",
-                "name": tool.name,
-                "description": tool.description,
-                "parameters": tool.inputSchema
-            } for tool in response.tools
-        ]
+        with span("agent query", conversation_id=conversation.id):
+            return await self._process_query(query, conversation, on_token)
+
+    async def _process_query(
+        self,
+        query: str,
+        conversation: Conversation,
+        on_token: Optional[Callable[[str], None]]
+    ) -> str:
+        conversation.start_turn(query)
+        with span("context fit"):
+            await self.context_manager.fit(conversation)
+        messages = conversation.messages()
+
+        # Get available tools (cached until a server reports a change)
+        available_tools = await self.servers.get_tools()
+        if "get_privileges_of_user" in self.servers.tool_routes:
+            available_tools = available_tools + [IDENTIFY_USER_TOOL]
 
         final_text = []
-        assistant_message_content = []
         thought_process = True
+        iteration = 0
+        tool_calls = 0
+        tool_semaphore = asyncio.Semaphore(MAX_CONCURRENT_TOOL_CALLS)
+        # Repeated read-only tool calls of the query share their results
+        if TOOL_MEMO_SCOPE == "session":
+            memo = conversation.tool_memo
+        elif TOOL_MEMO_SCOPE == "turn":
+            memo = ToolMemo()
+        else:
+            memo = None
 
         while thought_process:
-            messages.extend(assistant_message_content)
-
-            response = self.openai.responses.create(
-                model="gpt-4.1",
-                input=messages,
-                tools=available_tools,
-            )
-        
-            for output in response.output:
-                if output.type == "message":
-                    model_answer = output.content[0]
-                    final_text.append(model_answer.text)
-                    assistant_message_content.append({
-                        "role": "assistant",
-                        "content": model_answer.text
-                    })
-                    
-                elif output.type == "function_call":
-                    # Extract tool call details
-                    tool_name = output.name
-                    tool_args = json.loads(output.arguments)
-                    tool_call_id = output.call_id
-                    
-                    print("\033[92mCalling tool:", tool_name)
-
-                    assistant_message_content.append({
-                        "call_id": tool_call_id,
-                        "type": "function_call",
-                        "name": tool_name,
-                        "arguments": json.dumps(tool_args)
-                    })
-
-
-                    # Execute tool call
-                    result = await self.session.call_tool(tool_name, tool_args)
-                    
-                    result_call_function = []
-
-                    for item in result.content:
-                        result_call_function.append(json.loads(item.text))                                
-                    
+            iteration += 1
+            # Once the budget is spent the model is asked to answer without tools
+            last_iteration = iteration >= AGENT_MAX_ITERATIONS or tool_calls >= AGENT_MAX_TOOL_CALLS
+            with span("agent iteration", iteration=iteration):
+                assistant_message_content = []
+                function_calls = []
+
+                with span("llm response", metric="agent_llm_duration_seconds", labels={"model": "gpt-4.1"}, iteration=iteration):
+                    stream = await self.openai.responses.create(
+                        model="gpt-4.1",
+                        input=messages,
+                        tools=available_tools,
+                        tool_choice="none" if last_iteration else "auto",
+                        stream=True,
+                        prompt_cache_key=conversation.id,
+                    )
+
+                    try:
+                        async for event in stream:
+                            if event.type == "response.output_text.delta":
+                                if on_token is not None:
+                                    on_token(event.delta)
+
+                            elif event.type == "response.output_item.done":
+                                output = event.item
+
+                                if output.type == "message":
+                                    model_answer = "".join(
+                                        content.text for content in output.content if content.type == "output_text"
+                                    )
+                                    final_text.append(model_answer)
+                                    assistant_message_content.append({
+                                        "role": "assistant",
+                                        "content": model_answer
+                                    })
+
+                                elif output.type == "function_call":
+                                    # Extract tool call details
+                                    tool_name = output.name
+                                    tool_args = json.loads(output.arguments)
+                                    tool_call_id = output.call_id
+
+                                    print("\033[92mCalling tool:", tool_name, "\033[0m")
+
+                                    assistant_message_content.append({
+                                        "call_id": tool_call_id,
+                                        "type": "function_call",
+                                        "name": tool_name,
+                                        "arguments": json.dumps(tool_args)
+                                    })
+                                    if last_iteration or tool_calls >= AGENT_MAX_TOOL_CALLS:
+                                        function_calls.append((tool_call_id, budget_exhausted()))
+                                        continue
+                                    tool_calls += 1
+                                    # Start the tool as soon as its arguments are complete
+                                    function_calls.append((
+                                        tool_call_id,
+                                        asyncio.create_task(self.call_tool(tool_name, tool_args, conversation, tool_semaphore, memo))
+                                    ))
+                    except BaseException:
+                        for _, task in function_calls:
+                            task.cancel()
+                        raise
+
+                # Wait for the tool calls of this turn, keeping their order
+                results = await asyncio.gather(*(task for _, task in function_calls))
+
+                for (tool_call_id, _), result_call_function in zip(function_calls, results):
                     # Append tool call 
                     assistant_message_content.append({
                         "type": "function_call_output",
                         "call_id": tool_call_id,
-                        "output": json.dumps(result_call_function)
+                        "output": result_call_function
                     })
 
-            thought_process = self.has_call_tool(response)
+                messages.extend(assistant_message_content)
+                conversation.add_items(assistant_message_content)
+                thought_process = len(function_calls) > 0 and not last_iteration
 
-        context_window.append({
-                "role": "assistant",
-                "content": "".join(final_text)
-        })
-        
+        if not final_text:
+            final_text.append(f"I could not finish this request within {iteration} steps and {tool_calls} tool calls.")
         return "\n".join(final_text)
 
-    def has_call_tool(self, response) -> bool:
+    async def call_tool(
+        self,
+        tool_name: str,
+        tool_args: dict,
+        conversation: Conversation,
+        semaphore: asyncio.Semaphore,
+        memo: Optional[ToolMemo] = None
+    ) -> str:
         """
-        Check if the output contains a tool call.
+        Execute a tool call and return its output serialized for the model.
+        A failing call produces an error output instead of aborting the other calls.
+        User management tools are authorized locally before reaching the server,
+        read-only tools already called with the same arguments reuse the result
+        and the calls reaching a server are rate limited per conversation and tool.
         """
-        return any(
-            output.type == "function_call" for output in response.output
-        )
-
+        async with semaphore:
+            with span(f"tool {tool_name}", metric="agent_tool_duration_seconds", labels={"tool": tool_name}, kind="client") as current:
+                try:
+                    if tool_name == IDENTIFY_USER_TOOL["name"]:
+                        return json.dumps([await self.authorizer.identify(conversation, tool_args)])
+
+                    denial = await self.authorizer.check(conversation, tool_name)
+                    if denial is not None:
+                        return json.dumps([denial])
+
+                    async def load():
+                        # Only the calls reaching a server count against the rate limits
+                        wait = conversation.rate_limiter.reserve(tool_name)
+                        if wait > 0:
+                            current.set(rate_limit_wait=wait)
+                            await asyncio.sleep(wait)
+                        return await self.servers.call_tool(tool_name, tool_args)
+
+                    if memo is None:
+                        result = await load()
+                    else:
+                        result = await memo.call(tool_name, tool_args, self.servers.tool_traits.get(tool_name), load)
+                    result_call_function = [json.loads(item.text) for item in result.content]
+                    self.authorizer.after_call(tool_name, tool_args)
+                except RateLimitError as e:
+                    current.set(rate_limited=True)
+                    result_call_function = [{"error": {"type": "rate_limited", "message": str(e), "retryable": True}}]
+                except Exception as e:
+                    current.status = "error"
+                    current.set(error=str(e))
+                    result_call_function = [{"error": str(e)}]
+
+        return json.dumps(result_call_function)
 
     async def chat_tool(self):
         "Run an interactive chat loop"
-        
+        conversation = Conversation()
+
         while True:
             try:
-                query = input("\nQuery: ").strip()
+                query = (await asyncio.to_thread(input, "\nQuery: ")).strip()
 
                 if query.lower() == "quit":
                     break
                 if query.lower() == "reset":
-                    context_window.clear()
+                    conversation.reset()
                     print("\033[0mcontext window cleaned")
                     continue
+                if query.lower() == "refresh":
+                    tools = await self.servers.refresh_tools()
+                    print(f"\033[0mtool catalog refreshed ({len(tools)} tools)")
+                    continue
 
-                response = await self.process_query(query)
-                print("\n" + response)
+                print()
+                await self.process_query(query, conversation, on_token=lambda token: print(token, end="", flush=True))
+                print()
             except Exception as e:
                 print(f"Error: {str(e)}")
 
     async def cleanup(self):
         """Clean up resources"""
-        await self.exist_stack.aclose()
+        await self.servers.close()
+        if self._openai is not None:
+            await self._openai.close()
 
 async def main():
     if len(sys.argv) < 2:
         print(sys.argv)
-        print("Usage: python client.py <path_to_server_script>")
+        print("Usage: python client.py <path_to_server_script> [<path_to_server_script> ...]")
         sys.exit(1)
 
     client = MCPClient()
     try:
-        await client.connect_to_server(sys.argv[1])
-        await client.connect_to_server(sys.argv[2])
+        await client.connect_to_servers(sys.argv[1:])
         await client.chat_tool()
     finally:
         await client.cleanup()
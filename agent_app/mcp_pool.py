@@ -0,0 +1,213 @@
+"""
+Pool of warm MCP servers shared by the agents of the machine.
+
+    python agent_app/mcp_pool.py start <path_to_server_script> [...] [--base-port 9100]
+    python agent_app/mcp_pool.py status
+    python agent_app/mcp_pool.py stop
+
+Each Python server is started once over streamable HTTP and left running.
+While it is alive, an agent given the path of its script attaches to it
+instead of spawning a new interpreter, so a short session does not pay for
+the cold start of every server.
+"""
+import argparse
+import hashlib
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+# File describing the running pool, shared by the pool and the agents
+MCP_POOL_FILE = os.getenv(
+    "MCP_POOL_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".mcp_pool.json")
+)
+# Seconds a server of the pool may take to accept connections
+MCP_POOL_START_TIMEOUT = float(os.getenv("MCP_POOL_START_TIMEOUT", 30))
+
+
+def load_pool(path: str = MCP_POOL_FILE) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_pool(servers: dict, path: str = MCP_POOL_FILE):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(servers, file, indent=2)
+    os.replace(tmp_path, path)
+
+def is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def source_files(server_script_path: str) -> list[str]:
+    """
+    The script and the Python modules it may import: the ones of its package
+    and the ones shared by the servers in `common` at the project root.
+    """
+    package = os.path.dirname(os.path.abspath(server_script_path))
+    shared = os.path.join(os.path.dirname(package), "common")
+    files = {os.path.abspath(server_script_path)}
+    for directory in (package, shared):
+        if os.path.isdir(directory):
+            files.update(
+                os.path.join(directory, name)
+                for name in os.listdir(directory)
+                if name.endswith(".py")
+            )
+    return sorted(files)
+
+def script_version(server_script_path: str) -> Optional[str]:
+    """
+    Hash of the modification times of the script and of the modules it may
+    import, so editing any of them invalidates what was derived from the
+    running code.
+    """
+    digest = hashlib.sha1()
+    try:
+        for file in source_files(server_script_path):
+            digest.update(f"{file}:{os.stat(file).st_mtime_ns}\n".encode())
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+def pooled_url(server_script_path: str, path: str = MCP_POOL_FILE) -> Optional[str]:
+    """
+    URL of the warm server running the script, None when the pool does not
+    run it, its process is gone or the script changed since it was started.
+    """
+    entry = load_pool(path).get(os.path.abspath(server_script_path))
+    if entry is None or not is_alive(entry["pid"]):
+        return None
+    if entry["version"] != script_version(server_script_path):
+        return None
+    return entry["url"]
+
+def port_free(host: str, port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind((host, port))
+        except OSError:
+            return False
+    return True
+
+def wait_until_listening(process: subprocess.Popen, host: str, port: int, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+def start(server_script_paths: list[str], host: str, base_port: int) -> dict:
+    servers = {key: entry for key, entry in load_pool().items() if is_alive(entry["pid"])}
+    used_ports = {entry["port"] for entry in servers.values()}
+    port = base_port
+
+    for server_script_path in server_script_paths:
+        key = os.path.abspath(server_script_path)
+        if not key.endswith(".py"):
+            print(f"Skipping {server_script_path}: only Python servers can be pooled")
+            continue
+        if pooled_url(key) is not None:
+            print(f"{server_script_path} is already running at {servers[key]['url']}")
+            continue
+        if key in servers:
+            # Started from an older version of the script
+            stop_entry(servers.pop(key))
+
+        while port in used_ports or not port_free(host, port):
+            port += 1
+        log_path = os.path.join(tempfile.gettempdir(), f"mcp_pool_{os.path.splitext(os.path.basename(key))[0]}.log")
+        started = time.perf_counter()
+        with open(log_path, "ab") as log:
+            process = subprocess.Popen(
+                [sys.executable, key, "--transport", "streamable-http", "--host", host, "--port", str(port)],
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                start_new_session=True
+            )
+        if not wait_until_listening(process, host, port, MCP_POOL_START_TIMEOUT):
+            process.terminate()
+            print(f"Could not start {server_script_path}, see {log_path}")
+            continue
+
+        servers[key] = {
+            "pid": process.pid,
+            "port": port,
+            "url": f"http://{host}:{port}/mcp",
+            "version": script_version(key),
+            "log": log_path
+        }
+        used_ports.add(port)
+        save_pool(servers)
+        print(f"Started {server_script_path} at {servers[key]['url']} in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return servers
+
+def stop_entry(entry: dict):
+    try:
+        os.killpg(entry["pid"], signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def stop():
+    servers = load_pool()
+    for key, entry in servers.items():
+        stop_entry(entry)
+        print(f"Stopped {key}")
+    try:
+        os.remove(MCP_POOL_FILE)
+    except OSError:
+        pass
+
+def status():
+    servers = load_pool()
+    if not servers:
+        print("The pool is not running")
+    for key, entry in servers.items():
+        if not is_alive(entry["pid"]):
+            state = "stopped"
+        elif entry["version"] != script_version(key):
+            state = "outdated"
+        else:
+            state = "ready"
+        print(f"{key}: {state} at {entry['url']} (pid {entry['pid']}, log {entry['log']})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Pool of warm MCP servers")
+    commands = parser.add_subparsers(dest="command", required=True)
+    start_parser = commands.add_parser("start", help="start the servers that are not running yet")
+    start_parser.add_argument("servers", nargs="+", help="paths of the Python server scripts")
+    start_parser.add_argument("--host", default="127.0.0.1")
+    start_parser.add_argument("--base-port", type=int, default=9100)
+    commands.add_parser("status", help="show the servers of the pool")
+    commands.add_parser("stop", help="stop every server of the pool")
+    args = parser.parse_args()
+
+    if args.command == "start":
+        start(args.servers, args.host, args.base_port)
+    elif args.command == "stop":
+        stop()
+    else:
+        status()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import json
+import os
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Tool calls per second a conversation may send to the servers, and the burst it may save up
+AGENT_SESSION_RATE = float(os.getenv("AGENT_SESSION_RATE", 2))
+AGENT_SESSION_BURST = float(os.getenv("AGENT_SESSION_BURST", 20))
+# Calls per second of a single tool within a conversation, and its burst
+AGENT_TOOL_RATE = float(os.getenv("AGENT_TOOL_RATE", 1))
+AGENT_TOOL_BURST = float(os.getenv("AGENT_TOOL_BURST", 8))
+# Optional JSON overriding the limits of some tools, e.g. {"create_selling": [0.2, 3]}
+AGENT_TOOL_LIMITS = json.loads(os.getenv("AGENT_TOOL_LIMITS", "{}"))
+# Seconds a call may wait for its turn before it is answered with a rate limit error
+AGENT_RATE_LIMIT_WAIT = float(os.getenv("AGENT_RATE_LIMIT_WAIT", 2))
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second up to `burst` tokens.
+
+    A call that cannot be served now reserves a token ahead, leaving the
+    bucket in debt, so the calls waiting for it are served in order.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """
+        Take a token and return the seconds to wait before using it, or None
+        without taking it when the wait would be longer than `max_wait`.
+        """
+        if self.rate <= 0:
+            return None
+        self.refill()
+        wait = max(0.0, (1 - self.tokens) / self.rate)
+        if wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+    def refund(self):
+        self.tokens = min(self.burst, self.tokens + 1)
+
+
+class RateLimiter:
+    """
+    Limits of the tool calls of one conversation: a bucket for the whole
+    conversation and one per tool, so a looping model can neither flood the
+    servers nor hammer a single tool.
+    """
+
+    def __init__(self):
+        self.session = TokenBucket(AGENT_SESSION_RATE, AGENT_SESSION_BURST)
+        self.tools: dict[str, TokenBucket] = {}
+
+    def bucket(self, tool_name: str) -> TokenBucket:
+        bucket = self.tools.get(tool_name)
+        if bucket is None:
+            rate, burst = AGENT_TOOL_LIMITS.get(tool_name, (AGENT_TOOL_RATE, AGENT_TOOL_BURST))
+            bucket = self.tools[tool_name] = TokenBucket(rate, burst)
+        return bucket
+
+    def reserve(self, tool_name: str, max_wait: float = AGENT_RATE_LIMIT_WAIT) -> float:
+        """
+        Reserve a call of the tool and return the seconds to wait before
+        making it. Raises RateLimitError when it would wait too long.
+        """
+        tool_bucket = self.bucket(tool_name)
+        tool_wait = tool_bucket.reserve(max_wait)
+        if tool_wait is None:
+            raise RateLimitError(
+                f"Too many calls to {tool_name}, it allows {tool_bucket.rate:g} per second. "
+                "Use the results already retrieved or try again later."
+            )
+        session_wait = self.session.reserve(max_wait)
+        if session_wait is None:
+            tool_bucket.refund()
+            raise RateLimitError(
+                f"Too many tool calls in this conversation, it allows {self.session.rate:g} per second. "
+                "Use the results already retrieved or try again later."
+            )
+        return max(tool_wait, session_wait)
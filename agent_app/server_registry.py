@@ -0,0 +1,463 @@
+import asyncio
+import importlib
+import json
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from mcp import ClientSession, StdioServerParameters, types
+
+from mcp_pool import pooled_url, script_version
+from tracing import current_traceparent, span
+
+# File where the tool catalog of each server is persisted between runs
+TOOL_CACHE_PATH = os.getenv(
+    "TOOL_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".tool_cache.json")
+)
+# "stdio": each Python server runs as a subprocess
+# "inprocess": the FastMCP servers are imported and served through memory streams
+MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "stdio")
+# Seconds a request to a server given by URL may take
+MCP_REQUEST_TIMEOUT = float(os.getenv("MCP_REQUEST_TIMEOUT", 60))
+# Delays in seconds between the attempts to reconnect to a server given by URL
+MCP_RECONNECT_INITIAL_DELAY = float(os.getenv("MCP_RECONNECT_INITIAL_DELAY", 0.5))
+MCP_RECONNECT_MAX_DELAY = float(os.getenv("MCP_RECONNECT_MAX_DELAY", 30))
+# Seconds the first connection to a server given by URL is retried, so it may start after the agent
+MCP_STARTUP_TIMEOUT = float(os.getenv("MCP_STARTUP_TIMEOUT", 30))
+
+
+def is_url(target: str) -> bool:
+    return target.startswith(("http://", "https://"))
+
+
+def to_openai_tool(tool: types.Tool) -> dict:
+    """
+    Convert an MCP tool into the function schema of the OpenAI Responses API.
+    """
+    return {
+        "type": "function",
+        "name": tool.name,
+        "description": tool.description,
+        "parameters": tool.inputSchema
+    }
+
+
+def load_server(server_script_path: str):
+    """
+    Import the FastMCP instance `mcp` of a server script from its package,
+    e.g. selling_server/mcp_selling_server.py as selling_server.mcp_selling_server.
+    """
+    path = Path(server_script_path).resolve()
+    root = str(path.parent.parent)
+    if root not in sys.path:
+        sys.path.append(root)
+    module = importlib.import_module(f"{path.parent.name}.{path.stem}")
+    return module.mcp
+
+
+def tool_traits(tool: types.Tool) -> dict:
+    """
+    What the client needs to know about a tool besides its schema: whether it
+    only reads (its readOnlyHint annotation) and the resources it reads or
+    writes (the `resources` of its metadata, None when it does not say).
+    """
+    return {
+        "read_only": bool(tool.annotations is not None and tool.annotations.readOnlyHint),
+        "resources": (tool.meta or {}).get("resources")
+    }
+
+
+class ToolCatalogCache:
+    """
+    Converted tool schemas of each server persisted on disk, so a restart can
+    skip the list_tools round trip. The output schemas are kept too: the
+    session validates the results of the tools with them, and lists the tools
+    again when it does not know them. An entry is only used while the version
+    of its server (the modification times of the script and of the modules
+    it may import) does not change.
+    """
+
+    def __init__(self, path: str = TOOL_CACHE_PATH):
+        self.path = path
+        self.entries: dict = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump(self.entries, file)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save the tool cache: {e}")
+
+    def get(self, key: str, version: Optional[str]) -> Optional[tuple[list[dict], dict, dict]]:
+        entry = self.entries.get(key)
+        if version is None or entry is None or entry["version"] != version or "output_schemas" not in entry:
+            return None
+        return entry["tools"], entry["traits"], entry["output_schemas"]
+
+    def set(self, key: str, version: Optional[str], tools: list[dict], traits: dict, output_schemas: dict):
+        if version is None:
+            return
+        self.entries[key] = {"version": version, "tools": tools, "traits": traits, "output_schemas": output_schemas}
+        self._save()
+
+    def discard(self, key: str):
+        if self.entries.pop(key, None) is not None:
+            self._save()
+
+
+class ServerConnection:
+    """
+    Connection to a single MCP server, given by the path of its script or by
+    its URL (ending in /sse for SSE, streamable HTTP otherwise).
+
+    The transport and the session are opened and closed by a dedicated task,
+    so several servers can be connected at the same time. A server given by
+    URL is connected with an exponential backoff, until MCP_STARTUP_TIMEOUT
+    for the first connection and for ever when the connection is lost.
+    """
+
+    def __init__(self, server_script_path: str, transport: str = MCP_TRANSPORT):
+        self.name = server_script_path
+        self.server_params = None
+        self.reconnects = is_url(server_script_path)
+
+        if self.reconnects:
+            self.transport = "sse" if server_script_path.rstrip("/").endswith("/sse") else "streamable-http"
+            self.cache_key = server_script_path
+        else:
+            is_python = server_script_path.endswith(".py")
+            is_js = server_script_path.endswith(".js")
+
+            if not (is_python or is_js):
+                raise ValueError("Server script must be a Python or JavaScript file.")
+            if transport == "inprocess" and not is_python:
+                raise ValueError("Only Python servers can run in process.")
+
+            command = "python" if is_python else "node"
+
+            self.transport = transport
+            self.cache_key = os.path.abspath(server_script_path)
+            self.server_params = StdioServerParameters(
+                command=command,
+                args=[server_script_path],
+                # Without an env the child only gets HOME, PATH and a few others, so the
+                # MCP_*, TRACE_* and backend settings of the agent would not reach it
+                env={**os.environ}
+            )
+        self.session: Optional[ClientSession] = None
+        # Cached OpenAI schemas of the tools, None when they must be listed again
+        self.tool_schemas: Optional[list[dict]] = None
+        self.tool_traits: dict[str, dict] = {}
+        # Output schema of each tool, None when it has none
+        self.output_schemas: dict[str, Optional[dict]] = {}
+        self.on_tools_changed: Optional[Callable[["ServerConnection"], None]] = None
+        self._ready = asyncio.Event()
+        self._connected = asyncio.Event()
+        self._reconnect = asyncio.Event()
+        # Set when the current session is closed, so the calls waiting on it fail fast
+        self._lost = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._error: Optional[BaseException] = None
+        self._task: Optional[asyncio.Task] = None
+        # Seconds until the first session was initialized
+        self.connect_time: Optional[float] = None
+
+    def cache_version(self) -> Optional[str]:
+        # The tools of a remote server can change at any time, so they are not cached on disk
+        if self.reconnects:
+            return None
+        return script_version(self.name)
+
+    async def start(self):
+        started = time.perf_counter()
+        with span("mcp connect", metric="agent_server_connect_seconds", labels={"transport": self.transport}, server=self.name):
+            self._task = asyncio.create_task(self._run())
+            await self._ready.wait()
+            if self._error is not None:
+                raise self._error
+        self.connect_time = time.perf_counter() - started
+
+    @asynccontextmanager
+    async def _open_session(self):
+        # The clients of the transports are imported on first use
+        if self.transport == "inprocess":
+            from mcp.shared.memory import create_connected_server_and_client_session
+
+            server = load_server(self.name)
+            async with create_connected_server_and_client_session(server, message_handler=self._handle_message) as session:
+                yield session
+            return
+
+        if self.transport == "streamable-http":
+            from mcp.client.streamable_http import streamablehttp_client
+
+            transport = streamablehttp_client(self.name, timeout=MCP_REQUEST_TIMEOUT)
+        elif self.transport == "sse":
+            from mcp.client.sse import sse_client
+
+            transport = sse_client(self.name, timeout=MCP_REQUEST_TIMEOUT)
+        else:
+            from mcp.client.stdio import stdio_client
+
+            transport = stdio_client(self.server_params)
+        read_timeout = timedelta(seconds=MCP_REQUEST_TIMEOUT) if self.reconnects else None
+
+        async with transport as streams:
+            read, write = streams[0], streams[1]
+            async with ClientSession(read, write, read_timeout_seconds=read_timeout, message_handler=self._handle_message) as session:
+                await session.initialize()
+                yield session
+
+    async def _run(self):
+        delay = MCP_RECONNECT_INITIAL_DELAY
+        deadline = time.monotonic() + MCP_STARTUP_TIMEOUT
+        while not self._closing.is_set():
+            try:
+                async with self._open_session() as session:
+                    delay = MCP_RECONNECT_INITIAL_DELAY
+                    await self._serve(session)
+            except Exception as e:
+                # Unwrap the error out of the task groups of the transport
+                while len(getattr(e, "exceptions", ())) == 1:
+                    e = e.exceptions[0]
+                if self._ready.is_set():
+                    print(f"Lost the connection to server {self.name}: {e!r}")
+                elif not self.reconnects or time.monotonic() + delay > deadline:
+                    self._error = e
+                else:
+                    print(f"Could not connect to server {self.name} yet: {e!r}")
+            finally:
+                self.session = None
+                self._connected.clear()
+                self._lost.set()
+
+            if self._error is not None or not self.reconnects or self._closing.is_set():
+                break
+            print(f"Reconnecting to server {self.name} in {delay:.1f}s")
+            try:
+                await asyncio.wait_for(self._closing.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, MCP_RECONNECT_MAX_DELAY)
+        # Wakes start() up when it failed or the connection was closed while starting
+        self._ready.set()
+
+    async def _serve(self, session: ClientSession):
+        if self._ready.is_set():
+            # Reconnected, the server may expose other tools now
+            self._tools_changed()
+        self.session = session
+        self._seed_output_schemas()
+        self._lost = asyncio.Event()
+        self._reconnect.clear()
+        self._ready.set()
+        self._connected.set()
+
+        waiters = [asyncio.create_task(self._closing.wait()), asyncio.create_task(self._reconnect.wait())]
+        try:
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    def _tools_changed(self):
+        self.tool_schemas = None
+        if self.on_tools_changed is not None:
+            self.on_tools_changed(self)
+
+    async def _handle_message(self, message):
+        if isinstance(message, Exception):
+            # Errors of the transport, the session of a remote server is opened again
+            if self.reconnects:
+                self._reconnect.set()
+            return
+        if isinstance(message, types.ServerNotification) and isinstance(message.root, types.ToolListChangedNotification):
+            self._tools_changed()
+
+    async def list_tools(self) -> list[dict]:
+        session = await self._session()
+        response = await session.list_tools()
+        self.tool_schemas = [to_openai_tool(tool) for tool in response.tools]
+        self.tool_traits = {tool.name: tool_traits(tool) for tool in response.tools}
+        self.output_schemas = {tool.name: tool.outputSchema for tool in response.tools}
+        return self.tool_schemas
+
+    def use_tools(self, tool_schemas: list[dict], traits: dict, output_schemas: dict):
+        """
+        Use tools listed by an earlier session instead of listing them again.
+        """
+        self.tool_schemas = tool_schemas
+        self.tool_traits = traits
+        self.output_schemas = output_schemas
+        self._seed_output_schemas()
+
+    def _seed_output_schemas(self):
+        # The session validates each result against the output schema of its tool
+        # and sends tools/list first when it does not know the tool
+        if self.session is not None:
+            self.session._tool_output_schemas.update(self.output_schemas)
+
+    async def _session(self) -> ClientSession:
+        """
+        Session to send a request through, waiting for a remote server to be reconnected.
+        """
+        if self.reconnects and not self._connected.is_set():
+            try:
+                await asyncio.wait_for(self._connected.wait(), MCP_REQUEST_TIMEOUT)
+            except asyncio.TimeoutError:
+                pass
+        if self.session is None:
+            raise ConnectionError(f"Server {self.name} is not connected.")
+        return self.session
+
+    async def call_tool(self, tool_name: str, tool_args: dict) -> Any:
+        session = await self._session()
+        # The server continues the trace of the call
+        traceparent = current_traceparent()
+        meta = {"traceparent": traceparent} if traceparent is not None else None
+        if not self.reconnects:
+            return await session.call_tool(tool_name, tool_args, meta=meta)
+
+        # The call is not retried since it may have reached the server
+        call = asyncio.create_task(session.call_tool(tool_name, tool_args, meta=meta))
+        lost = asyncio.create_task(self._lost.wait())
+        try:
+            await asyncio.wait([call, lost], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            lost.cancel()
+        if not call.done():
+            call.cancel()
+            raise ConnectionError(f"Lost the connection to server {self.name} during {tool_name}.")
+        if call.exception() is not None:
+            self._reconnect.set()
+        return call.result()
+
+    async def close(self):
+        self._closing.set()
+        if self._task is not None:
+            await self._task
+
+
+class ServerRegistry:
+    """
+    Keeps the sessions of every connected MCP server and routes each tool
+    call to the server exposing that tool.
+
+    The merged tool catalog is cached and only rebuilt when a server notifies
+    that its tools changed or when it is refreshed explicitly.
+    """
+
+    def __init__(self, cache_path: str = TOOL_CACHE_PATH):
+        self.servers: dict[str, ServerConnection] = {}
+        self.tool_routes: dict[str, ServerConnection] = {}
+        self.tool_traits: dict[str, dict] = {}
+        self.available_tools: Optional[list[dict]] = None
+        self.catalog_cache = ToolCatalogCache(cache_path)
+
+    async def connect_all(self, server_script_paths: list[str]):
+        """
+        Connect to all the servers in parallel. A script run by the pool of
+        warm servers (see mcp_pool.py) is reached at its URL instead of
+        being spawned.
+        """
+        if MCP_TRANSPORT == "stdio":
+            server_script_paths = [pooled_url(path) or path for path in server_script_paths]
+        connections = [ServerConnection(path) for path in server_script_paths]
+        results = await asyncio.gather(
+            *(connection.start() for connection in connections),
+            return_exceptions=True
+        )
+
+        for connection, result in zip(connections, results):
+            if isinstance(result, BaseException):
+                print(f"Could not connect to server {connection.name}: {result}")
+                continue
+            connection.on_tools_changed = self._invalidate
+            self.servers[connection.name] = connection
+
+        await self.get_tools()
+
+        for connection in self.servers.values():
+            print(f"Connected to server {connection.name} in {connection.connect_time * 1000:.0f} ms with tools:", [
+                name for name, route in self.tool_routes.items() if route is connection
+            ])
+
+    def _invalidate(self, connection: ServerConnection):
+        self.catalog_cache.discard(connection.cache_key)
+        self.available_tools = None
+
+    async def _load_tools(self, connection: ServerConnection):
+        version = connection.cache_version()
+        cached = self.catalog_cache.get(connection.cache_key, version)
+        if cached is not None:
+            connection.use_tools(*cached)
+            return
+        tools = await connection.list_tools()
+        self.catalog_cache.set(connection.cache_key, version, tools, connection.tool_traits, connection.output_schemas)
+
+    async def get_tools(self) -> list[dict]:
+        """
+        Return the merged tool catalog of every server, building it and its
+        routing table when it is not cached.
+        """
+        if self.available_tools is not None:
+            return self.available_tools
+
+        connections = list(self.servers.values())
+        await asyncio.gather(*(
+            self._load_tools(connection) for connection in connections if connection.tool_schemas is None
+        ))
+
+        tools = []
+        tool_routes = {}
+        traits = {}
+        for connection in connections:
+            for tool in connection.tool_schemas:
+                if tool["name"] in tool_routes:
+                    print(f"Tool {tool['name']} of {connection.name} is already provided by {tool_routes[tool['name']].name}, ignoring it")
+                    continue
+                tool_routes[tool["name"]] = connection
+                traits[tool["name"]] = connection.tool_traits.get(tool["name"], {"read_only": False, "resources": None})
+                tools.append(tool)
+
+        self.available_tools = tools
+        self.tool_routes = tool_routes
+        self.tool_traits = traits
+        return tools
+
+    async def refresh_tools(self) -> list[dict]:
+        """
+        Drop the cached catalog and list the tools of every server again.
+        """
+        for connection in self.servers.values():
+            connection.tool_schemas = None
+            self._invalidate(connection)
+        return await self.get_tools()
+
+    async def call_tool(self, tool_name: str, tool_args: dict) -> Any:
+        if self.available_tools is None:
+            await self.get_tools()
+        connection = self.tool_routes.get(tool_name)
+        if connection is None:
+            raise ValueError(f"Tool {tool_name} is not provided by any connected server.")
+        return await connection.call_tool(tool_name, tool_args)
+
+    async def close(self):
+        await asyncio.gather(*(connection.close() for connection in self.servers.values()))
+        self.servers.clear()
+        self.tool_routes.clear()
+        self.available_tools = None
@@ -0,0 +1,86 @@
+import asyncio
+import os
+from typing import Optional
+
+from conversation import Conversation
+
+# Maximum number of conversations held at the same time
+MAX_SESSIONS = int(os.getenv("AGENT_MAX_SESSIONS", 100))
+# Seconds without activity after which a conversation is evicted
+SESSION_IDLE_TIMEOUT = float(os.getenv("AGENT_SESSION_IDLE_TIMEOUT", 1800))
+
+
+class SessionLimitError(Exception):
+    pass
+
+
+class SessionManager:
+    """
+    Holds the isolated conversations served by one agent process and evicts
+    the ones that have been idle for too long.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, idle_timeout: float = SESSION_IDLE_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions: dict[str, Conversation] = {}
+        self._eviction_task: Optional[asyncio.Task] = None
+
+    def create(self) -> Conversation:
+        if len(self.sessions) >= self.max_sessions:
+            self.evict_idle()
+        if len(self.sessions) >= self.max_sessions:
+            raise SessionLimitError(f"The maximum of {self.max_sessions} sessions has been reached.")
+
+        conversation = Conversation()
+        self.sessions[conversation.id] = conversation
+        return conversation
+
+    def get(self, session_id: str) -> Conversation:
+        """
+        Return the conversation of a session, raising KeyError when it does not exist.
+        """
+        conversation = self.sessions[session_id]
+        conversation.touch()
+        return conversation
+
+    def close(self, session_id: str) -> bool:
+        return self.sessions.pop(session_id, None) is not None
+
+    def evict_idle(self) -> int:
+        """
+        Remove the conversations idle for longer than the timeout, skipping
+        the ones with a query in progress.
+        """
+        expired = [
+            session_id for session_id, conversation in self.sessions.items()
+            if conversation.idle_time() > self.idle_timeout and not conversation.lock.locked()
+        ]
+        for session_id in expired:
+            del self.sessions[session_id]
+        return len(expired)
+
+    async def _evict_periodically(self):
+        interval = max(1.0, min(60.0, self.idle_timeout / 2))
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+
+    def start(self):
+        self._eviction_task = asyncio.create_task(self._evict_periodically())
+
+    async def stop(self):
+        if self._eviction_task is not None:
+            self._eviction_task.cancel()
+            try:
+                await self._eviction_task
+            except asyncio.CancelledError:
+                pass
+        self.sessions.clear()
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "idle_timeout": self.idle_timeout,
+        }
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+# "turn": results are reused within one query, "session": within the whole
+# conversation, "off": every tool call reaches the server
+TOOL_MEMO_SCOPE = os.getenv("TOOL_MEMO_SCOPE", "turn")
+# Seconds a result is reused when the scope is "session", 0 means until a write
+TOOL_MEMO_TTL = float(os.getenv("TOOL_MEMO_TTL", 60))
+
+
+def memo_key(tool_name: str, tool_args: dict) -> str:
+    return tool_name + ":" + json.dumps(tool_args, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class ToolMemo:
+    """
+    Reuses the results of read-only tool calls with the same arguments.
+
+    Identical calls running at the same time share a single request to the
+    server, and finished results are kept until a write tool touching one of
+    the resources they read is called (or the TTL expires). Tools that do not
+    declare their resources are invalidated by every write, and writes that
+    do not declare theirs invalidate everything.
+    """
+
+    def __init__(self, ttl: float = 0):
+        self.ttl = ttl
+        # key -> (expiration, resources, result)
+        self.entries: dict[str, tuple[float, Optional[set[str]], Any]] = {}
+        # key -> (resources, future) of the calls running, a write touching their
+        # resources removes them so their results are not stored
+        self.in_flight: dict[str, tuple[Optional[set[str]], asyncio.Future]] = {}
+
+    async def call(
+        self,
+        tool_name: str,
+        tool_args: dict,
+        traits: Optional[dict],
+        load: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Return the result of the tool call, calling `load` only when there is
+        no reusable result.
+        """
+        traits = traits or {}
+        resources = traits.get("resources")
+        resources = set(resources) if resources is not None else None
+
+        if not traits.get("read_only"):
+            self.invalidate(resources)
+            try:
+                return await load()
+            finally:
+                self.invalidate(resources)
+
+        key = memo_key(tool_name, tool_args)
+        cached = self.entries.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                return cached[2]
+            del self.entries[key]
+
+        pending = self.in_flight.get(key)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending[1])
+            except asyncio.CancelledError:
+                # The call we joined was cancelled, not this one
+                if not pending[1].cancelled():
+                    raise
+            return await load()
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = (resources, future)
+        try:
+            result = await load()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Retrieve it so an exception nobody waited for is not reported
+            future.exception()
+            raise
+        finally:
+            current = self.in_flight.get(key, (None, None))[1] is future
+            if current:
+                del self.in_flight[key]
+
+        future.set_result(result)
+        # Not stored when a write touched its resources while it ran
+        if current and not getattr(result, "isError", False):
+            expiration = time.monotonic() + self.ttl if self.ttl > 0 else float("inf")
+            self.entries[key] = (expiration, resources, result)
+        return result
+
+    def invalidate(self, resources: Optional[set[str]] = None):
+        """
+        Forget the results depending on any of the resources, or all of them
+        when the resources are unknown.
+        """
+        def affected(entry_resources: Optional[set[str]]) -> bool:
+            return resources is None or entry_resources is None or bool(entry_resources & resources)
+
+        for key in [key for key, entry in self.entries.items() if affected(entry[1])]:
+            del self.entries[key]
+        # Later calls must not join a request started before the write, nor
+        # must that request store its result
+        for key in [key for key, entry in self.in_flight.items() if affected(entry[0])]:
+            del self.in_flight[key]
+
+    def clear(self):
+        self.invalidate(None)
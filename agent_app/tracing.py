@@ -0,0 +1,20 @@
+"""
+Tracing of the agent, recorded with the tracer shared with the servers.
+"""
+import sys
+from pathlib import Path
+
+# The shared modules live at the project root, next to agent_app
+ROOT = str(Path(__file__).resolve().parent.parent)
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from common.tracing import get_tracer, current_traceparent  # noqa: E402
+
+SERVICE = "agent_app"
+
+tracer = get_tracer(SERVICE)
+span = tracer.span
+trace_request = tracer.trace_request
+metrics_text = tracer.metrics_text
+snapshot = tracer.snapshot
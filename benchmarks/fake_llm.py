@@ -0,0 +1,97 @@
+import asyncio
+import json
+import uuid
+from types import SimpleNamespace
+from typing import Callable, Union
+
+# A step of a script is either the tool calls of one model turn, as
+# (name, arguments) pairs, or the text of the final answer
+Step = Union[str, list[tuple[str, dict]]]
+Script = list[Step]
+
+
+class FakeStream:
+    """
+    Stream of Responses API events answering one model turn of a script.
+    """
+
+    def __init__(self, step: Step, first_token_latency: float, token_latency: float):
+        self.step = step
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+
+    def __aiter__(self):
+        return self.events()
+
+    async def events(self):
+        if self.first_token_latency:
+            await asyncio.sleep(self.first_token_latency)
+
+        if isinstance(self.step, str):
+            for word in self.step.split(" "):
+                if self.token_latency:
+                    await asyncio.sleep(self.token_latency)
+                yield SimpleNamespace(type="response.output_text.delta", delta=word + " ")
+            yield SimpleNamespace(type="response.output_item.done", item=SimpleNamespace(
+                type="message",
+                content=[SimpleNamespace(type="output_text", text=self.step)]
+            ))
+            return
+
+        for name, arguments in self.step:
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield SimpleNamespace(type="response.output_item.done", item=SimpleNamespace(
+                type="function_call",
+                name=name,
+                arguments=json.dumps(arguments),
+                call_id=f"call_{uuid.uuid4().hex[:12]}"
+            ))
+
+
+class FakeResponses:
+    def __init__(self, owner: "FakeOpenAI"):
+        self.owner = owner
+
+    async def create(self, input: list, stream: bool = False, **kwargs):
+        self.owner.requests += 1
+        if not stream:
+            # Summaries of the context manager
+            return SimpleNamespace(output_text="Summary of the benchmark conversation.")
+        return FakeStream(self.owner.next_step(input), self.owner.first_token_latency, self.owner.token_latency)
+
+
+class FakeOpenAI:
+    """
+    Local stand-in for the OpenAI client replaying a script per query.
+
+    The script of a query is chosen by `script_for` from the text of the user
+    message, and the step to answer is found from the tool calls already made
+    in the turn, so the same client serves many conversations at once.
+    """
+
+    def __init__(
+        self,
+        script_for: Callable[[str], Script],
+        first_token_latency: float = 0.0,
+        token_latency: float = 0.0
+    ):
+        self.script_for = script_for
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.responses = FakeResponses(self)
+        self.requests = 0
+
+    def next_step(self, messages: list[dict]) -> Step:
+        last_user = max(index for index, message in enumerate(messages) if message.get("role") == "user")
+        script = self.script_for(messages[last_user]["content"])
+        calls_done = sum(1 for message in messages[last_user:] if message.get("type") == "function_call")
+
+        for step in script:
+            if calls_done == 0 or isinstance(step, str):
+                return step
+            calls_done -= len(step)
+        return script[-1]
+
+    async def close(self):
+        pass
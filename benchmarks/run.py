@@ -0,0 +1,317 @@
+"""
+Latency and load benchmarks of the whole stack: agent, MCP servers, web
+servers and storage, all in one process.
+
+    python benchmarks/run.py run [--scenarios ...] [--concurrency 1,8] [--output results.json]
+    python benchmarks/run.py compare baseline.json results.json [--threshold 10]
+
+The model is replaced by a scripted local stand-in of the Responses API and
+Supabase by the embedded SQLite storage, so the numbers only depend on this
+code and the machine running it.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(1, str(ROOT))
+sys.path.insert(1, str(ROOT / "agent_app"))
+
+SERVERS = [
+    str(ROOT / "management_server" / "mcp_management_server.py"),
+    str(ROOT / "selling_server" / "mcp_selling_server.py"),
+]
+
+# Histograms of the tracers and the layer they measure
+LAYERS = {
+    "agent_llm_duration_seconds": "llm",
+    "agent_tool_duration_seconds": "agent_tool",
+    "mcp_tool_duration_seconds": "mcp_tool",
+    "http_server_duration_seconds": "rest_route",
+    "db_query_duration_seconds": "db",
+}
+
+
+def configure(args):
+    """
+    Everything runs in-process: the servers through memory streams, their
+    requests through an ASGI transport and the storage in SQLite.
+    """
+    os.environ["MCP_TRANSPORT"] = "inprocess"
+    os.environ["MCP_BACKEND"] = "direct"
+    os.environ["STORAGE_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = args.sqlite_path
+    os.environ["CACHE_BACKEND"] = "memory"
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("TOOL_CACHE_PATH", str(Path(tempfile.gettempdir()) / "benchmark_tool_cache.json"))
+
+
+def percentile(values: list[float], percent: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    # Nearest rank
+    rank = min(len(ordered), max(1, math.ceil(percent / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+def layer_snapshot() -> dict:
+    from common.tracing import get_tracer
+
+    totals = {}
+    for service in ("agent_app", "selling_server", "management_server"):
+        for metric, values in get_tracer(service).snapshot().items():
+            total = totals.setdefault(metric, {"count": 0, "sum": 0.0})
+            total["count"] += values["count"]
+            total["sum"] += values["sum"]
+    return totals
+
+def layer_report(before: dict, after: dict, requests: int) -> dict:
+    layers = {}
+    for metric, layer in LAYERS.items():
+        count = after.get(metric, {}).get("count", 0) - before.get(metric, {}).get("count", 0)
+        seconds = after.get(metric, {}).get("sum", 0.0) - before.get(metric, {}).get("sum", 0.0)
+        layers[layer] = {
+            "count": count,
+            "mean_ms": round(seconds * 1000 / count, 3) if count else 0.0,
+            "per_request_ms": round(seconds * 1000 / requests, 3) if requests else 0.0
+        }
+    return layers
+
+def tool_failed(output: str) -> bool:
+    return output == "[]" or output == "[null]" or '"error"' in output
+
+
+class Benchmark:
+    def __init__(self, args):
+        self.args = args
+        self.scripts: dict[str, list] = {}
+        self.data: dict = {}
+        self.client = None
+
+    def script_for(self, query: str) -> list:
+        return self.scripts[query]
+
+    async def start(self):
+        from mcp_client import MCPClient
+        from fake_llm import FakeOpenAI
+        from scenarios import seed
+        from selling_server.selling_server import app as selling_app
+        from management_server.management_server import app as management_app
+
+        self.client = MCPClient()
+        self.client.openai = FakeOpenAI(self.script_for, self.args.llm_first_token_ms / 1000, self.args.llm_token_ms / 1000)
+        await self.client.connect_to_servers(SERVERS)
+        await self.client.servers.get_tools()
+
+        sizes = {"clients": self.args.clients, "products": self.args.products, "sellings": self.args.sellings, "users": self.args.users}
+        self.data = await seed(
+            selling_app.state.repository,
+            management_app.state.repository,
+            sizes,
+            self.args.seed
+        )
+
+    async def stop(self):
+        if self.client is not None:
+            await self.client.cleanup()
+
+    async def query(self, scenario: str, index: int) -> tuple[float, int]:
+        from conversation import Conversation
+        from scenarios import SCENARIOS
+
+        query = f"{scenario} #{index}"
+        rng = random.Random(f"{self.args.seed}:{query}")
+        self.scripts[query] = SCENARIOS[scenario](rng, self.data, {"bulk_size": self.args.bulk_size})
+        conversation = Conversation()
+        started = time.perf_counter()
+        try:
+            await self.client.process_query(query, conversation)
+        finally:
+            self.scripts.pop(query, None)
+        elapsed = time.perf_counter() - started
+
+        outputs = [item["output"] for item in conversation.turns[-1] if item.get("type") == "function_call_output"]
+        return elapsed, sum(1 for output in outputs if tool_failed(output))
+
+    async def batch(self, scenario: str, concurrency: int, requests: int, offset: int) -> tuple[list[float], int, int]:
+        indexes = itertools.count(offset)
+        latencies, errors, tool_errors = [], 0, 0
+
+        async def worker():
+            nonlocal errors, tool_errors
+            while (index := next(indexes)) < offset + requests:
+                try:
+                    elapsed, failed = await self.query(scenario, index)
+                except Exception:
+                    errors += 1
+                    continue
+                latencies.append(elapsed)
+                tool_errors += failed
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, errors, tool_errors
+
+    async def run_scenario(self, scenario: str, concurrency: int) -> dict:
+        await self.batch(scenario, concurrency, self.args.warmup, 0)
+
+        before = layer_snapshot()
+        started = time.perf_counter()
+        latencies, errors, tool_errors = await self.batch(scenario, concurrency, self.args.requests, self.args.warmup)
+        wall_time = time.perf_counter() - started
+        after = layer_snapshot()
+
+        return {
+            "scenario": scenario,
+            "concurrency": concurrency,
+            "requests": self.args.requests,
+            "errors": errors,
+            "tool_errors": tool_errors,
+            "wall_time_s": round(wall_time, 3),
+            "throughput_rps": round(len(latencies) / wall_time, 2) if wall_time else 0.0,
+            "latency_ms": {
+                "p50": round(percentile(latencies, 50) * 1000, 3),
+                "p95": round(percentile(latencies, 95) * 1000, 3),
+                "p99": round(percentile(latencies, 99) * 1000, 3),
+                "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+                "max": round(max(latencies, default=0.0) * 1000, 3),
+            },
+            "layers": layer_report(before, after, len(latencies) + errors),
+        }
+
+
+async def run(args) -> dict:
+    from scenarios import SCENARIOS
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios {unknown}, available: {sorted(SCENARIOS)}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    benchmark = Benchmark(args)
+    results = []
+    # The agent prints every tool call, which would dominate the timings
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            await benchmark.start()
+            for scenario in scenarios:
+                for concurrency in levels:
+                    result = await benchmark.run_scenario(scenario, concurrency)
+                    results.append(result)
+                    print(summary_line(result), file=sys.stderr)
+        finally:
+            await benchmark.stop()
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+        },
+        "config": {key: value for key, value in vars(args).items() if key not in ("command", "handler", "output")},
+        "results": results,
+    }
+
+def summary_line(result: dict) -> str:
+    latency = result["latency_ms"]
+    layers = " ".join(f"{layer}={values['per_request_ms']}" for layer, values in result["layers"].items())
+    return (
+        f"{result['scenario']:<16} c={result['concurrency']:<3} "
+        f"p50={latency['p50']:.1f}ms p95={latency['p95']:.1f}ms p99={latency['p99']:.1f}ms "
+        f"{result['throughput_rps']:.1f} req/s errors={result['errors']}/{result['tool_errors']} | ms/request {layers}"
+    )
+
+def command_run(args):
+    configure(args)
+    for logger in ("httpx", "mcp"):
+        logging.getLogger(logger).setLevel(logging.WARNING)
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+def change(before: float, after: float) -> float:
+    return (after - before) / before * 100 if before else 0.0
+
+def command_compare(args):
+    """
+    Compare two result files and exit with 1 when a scenario of the second one
+    is slower (p95) or serves less (throughput) than the threshold allows.
+    """
+    with open(args.baseline, "r", encoding="utf-8") as file:
+        baseline = {(result["scenario"], result["concurrency"]): result for result in json.load(file)["results"]}
+    with open(args.candidate, "r", encoding="utf-8") as file:
+        candidate = json.load(file)["results"]
+
+    regressions = []
+    for result in candidate:
+        key = (result["scenario"], result["concurrency"])
+        base = baseline.get(key)
+        if base is None:
+            print(f"{key[0]:<16} c={key[1]:<3} not in the baseline")
+            continue
+        columns = []
+        for name in ("p50", "p95", "p99"):
+            delta = change(base["latency_ms"][name], result["latency_ms"][name])
+            columns.append(f"{name} {base['latency_ms'][name]:.1f}->{result['latency_ms'][name]:.1f}ms ({delta:+.1f}%)")
+        throughput = change(base["throughput_rps"], result["throughput_rps"])
+        columns.append(f"rps {base['throughput_rps']:.1f}->{result['throughput_rps']:.1f} ({throughput:+.1f}%)")
+        print(f"{key[0]:<16} c={key[1]:<3} " + "  ".join(columns))
+
+        if change(base["latency_ms"]["p95"], result["latency_ms"]["p95"]) > args.threshold or -throughput > args.threshold:
+            regressions.append(key)
+
+    if regressions:
+        print(f"Regressions beyond {args.threshold}%: " + ", ".join(f"{name} c={concurrency}" for name, concurrency in regressions))
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the MCP agent application")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the scenarios and report their latency")
+    run_parser.add_argument("--scenarios", default="single_read,fan_out,bulk_sellings,privilege_check",
+                            help="comma separated scenarios to run")
+    run_parser.add_argument("--concurrency", default="1,8", help="comma separated numbers of concurrent queries")
+    run_parser.add_argument("--requests", type=int, default=50, help="measured queries per scenario and concurrency")
+    run_parser.add_argument("--warmup", type=int, default=5, help="queries run before measuring")
+    run_parser.add_argument("--llm-first-token-ms", type=float, default=0.0, help="simulated delay of each model response")
+    run_parser.add_argument("--llm-token-ms", type=float, default=0.0, help="simulated delay between streamed items")
+    run_parser.add_argument("--clients", type=int, default=200)
+    run_parser.add_argument("--products", type=int, default=100)
+    run_parser.add_argument("--sellings", type=int, default=5000)
+    run_parser.add_argument("--users", type=int, default=50)
+    run_parser.add_argument("--bulk-size", type=int, default=100, help="sellings created by each bulk_sellings query")
+    run_parser.add_argument("--sqlite-path", default=":memory:", help="SQLite file of both storages, in memory by default")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--output", help="JSON file to save the results to")
+    run_parser.set_defaults(handler=command_run)
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="allowed regression in percent")
+    compare_parser.set_defaults(handler=command_compare)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+if __name__ == "__main__":
+    main()
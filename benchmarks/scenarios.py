@@ -0,0 +1,99 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+from fake_llm import Script
+
+ANSWER = "Here is the information you asked for."
+
+
+async def seed(selling_repository, management_repository, sizes: dict, seed: int) -> dict:
+    """
+    Fill both storages with deterministic data and return the ids the scenarios use.
+    """
+    rng = random.Random(seed)
+
+    clients = await selling_repository.insert("Client", [
+        {"client_name": f"Client {index}", "email": f"client{index}@example.com"}
+        for index in range(sizes["clients"])
+    ])
+    products = await selling_repository.insert("Product", [
+        {"product_name": f"Product {index}", "price": round(rng.uniform(1, 500), 2)}
+        for index in range(sizes["products"])
+    ])
+    client_ids = [str(row["id_client"]) for row in clients]
+    product_ids = [str(row["id_product"]) for row in products]
+
+    start = datetime.now(timezone.utc) - timedelta(days=90)
+    sellings = [{
+        "id_client": rng.choice(client_ids),
+        "id_product": rng.choice(product_ids),
+        "price_at_moment": round(rng.uniform(1, 500), 2),
+        "created_at": (start + timedelta(minutes=rng.randrange(90 * 24 * 60))).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    } for _ in range(sizes["sellings"])]
+    for offset in range(0, len(sellings), 1000):
+        await selling_repository.insert("Sellings", sellings[offset:offset + 1000])
+
+    privileges = await management_repository.insert("Privileges", [
+        {"privilege_name": name, "privilege_description": f"Allows {name}"}
+        for name in ("user_management", "create_user", "update_user", "delete_user", "grant_privileges", "revoke_privileges", "reader")
+    ])
+    users = await management_repository.insert("Users", [
+        {"user_name": f"user_{index}"} for index in range(sizes["users"])
+    ])
+    user_ids = [str(row["id_user"]) for row in users]
+    privilege_ids = {row["privilege_name"]: row["id_privilege"] for row in privileges}
+    await management_repository.insert("Users_X_Privileges", [
+        {"id_user": user["id_user"], "id_privilege": privilege_ids["user_management" if index == 0 else "reader"]}
+        for index, user in enumerate(users)
+    ])
+
+    return {"clients": client_ids, "products": product_ids, "users": user_ids, "admin": user_ids[0]}
+
+
+def single_read(rng: random.Random, data: dict, options: dict) -> Script:
+    return [
+        [("get_product", {"product_id": rng.choice(data["products"])})],
+        ANSWER
+    ]
+
+def fan_out(rng: random.Random, data: dict, options: dict) -> Script:
+    return [
+        [
+            ("get_client", {"client_id": rng.choice(data["clients"])}),
+            ("list_products", {"limit": 20}),
+            ("list_sellings", {"limit": 20}),
+            ("get_sales_summary", {"group_by": "month"}),
+            ("get_top_products", {"limit": 5}),
+            ("get_top_clients", {"limit": 5}),
+        ],
+        ANSWER
+    ]
+
+def bulk_sellings(rng: random.Random, data: dict, options: dict) -> Script:
+    items = [{
+        "id_client": rng.choice(data["clients"]),
+        "id_product": rng.choice(data["products"]),
+        "price_at_moment": round(rng.uniform(1, 500), 2)
+    } for _ in range(options["bulk_size"])]
+    return [
+        [("create_sellings_bulk", {"items": items})],
+        ANSWER
+    ]
+
+def privilege_check(rng: random.Random, data: dict, options: dict) -> Script:
+    return [
+        [("identify_user", {"user_id": data["admin"]})],
+        [
+            ("get_users", {"limit": 20}),
+            ("get_privileges_of_user", {"user_id": rng.choice(data["users"])}),
+        ],
+        ANSWER
+    ]
+
+
+SCENARIOS = {
+    "single_read": single_read,
+    "fan_out": fan_out,
+    "bulk_sellings": bulk_sellings,
+    "privilege_check": privilege_check,
+}
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+from starlette.routing import Match
+
+from common.tracing import Tracer
+
+# Requests of one route served at the same time and waiting for a slot
+ROUTE_CONCURRENCY = int(os.environ.get("ROUTE_CONCURRENCY", 16))
+ROUTE_QUEUE_SIZE = int(os.environ.get("ROUTE_QUEUE_SIZE", 64))
+# Seconds a request may wait for a slot before it is rejected
+ROUTE_QUEUE_TIMEOUT = float(os.environ.get("ROUTE_QUEUE_TIMEOUT", 5.0))
+# Optional JSON overriding the limits of some routes, e.g. {"POST /sellings/bulk": [2, 8]}
+ROUTE_LIMITS = json.loads(os.environ.get("ROUTE_LIMITS", "{}"))
+# Routes that are never queued
+EXEMPT_PATHS = {"/health", "/metrics", "/cache/stats"}
+
+
+class RouteLimiter:
+    """
+        Admits up to `concurrency` requests of a route and queues the next ones in arrival
+        order. A request is rejected when the queue is full or it waited too long.
+    """
+
+    def __init__(self, concurrency: int, queue_size: int, timeout: float = ROUTE_QUEUE_TIMEOUT):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiters: deque[asyncio.Future] = deque()
+        self.rejected = 0
+
+    async def acquire(self) -> bool:
+        if self.active < self.concurrency and not self.waiters:
+            self.active += 1
+            return True
+        if len(self.waiters) >= self.queue_size:
+            self.rejected += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.timeout)
+            return True
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # The slot was handed over just as the wait expired
+                return True
+            self.rejected += 1
+            return False
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+                waiter.cancel()
+
+    def release(self):
+        # The slot goes straight to the oldest waiter
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {"concurrency": self.concurrency, "active": self.active, "queued": len(self.waiters), "rejected": self.rejected}
+
+
+def match_route(request) -> Optional[str]:
+    for route in request.app.router.routes:
+        match, child_scope = route.matches(request.scope)
+        if match == Match.FULL:
+            # Resolved here so the tracing middleware labels the request even if it is rejected
+            request.scope.update(child_scope)
+            return getattr(route, "path", None)
+    return None
+
+
+class Admission:
+    """
+        Admission control of one service: a RouteLimiter per route, created on its first request.
+        The time spent waiting for a slot is recorded by the tracer of the service.
+    """
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self.limiters: dict[str, RouteLimiter] = {}
+
+    def limiter_for(self, route: str) -> RouteLimiter:
+        limiter = self.limiters.get(route)
+        if limiter is None:
+            concurrency, queue_size = ROUTE_LIMITS.get(route, (ROUTE_CONCURRENCY, ROUTE_QUEUE_SIZE))
+            limiter = self.limiters[route] = RouteLimiter(concurrency, queue_size)
+        return limiter
+
+    def stats(self) -> dict:
+        return {route: limiter.stats() for route, limiter in self.limiters.items()}
+
+    async def admit_request(self, request, call_next):
+        """
+            FastAPI middleware limiting the concurrent requests of each route. Extra requests wait
+            in a queue and are answered 429 when it is full or the wait times out, so one busy
+            route cannot take every database connection.
+        """
+        path = match_route(request)
+        if path is None or path in EXEMPT_PATHS:
+            return await call_next(request)
+
+        route = f"{request.method} {path}"
+        limiter = self.limiter_for(route)
+        started = time.perf_counter()
+        if not await limiter.acquire():
+            return JSONResponse(
+                status_code=429,
+                content={"detail": f"Too many concurrent requests to {route}, retry later."},
+                headers={"Retry-After": str(max(1, round(limiter.timeout)))}
+            )
+        self.tracer.observe("http_server_queue_seconds", {"route": path}, time.perf_counter() - started)
+        try:
+            return await call_next(request)
+        finally:
+            limiter.release()
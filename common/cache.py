@@ -0,0 +1,190 @@
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+
+class CacheBackend(ABC):
+    """
+        Storage of the cache. Values are (data, etag) tuples.
+        The methods are coroutines so a network backend does not block the event loop.
+    """
+    @abstractmethod
+    async def get(self, key: str) -> Optional[tuple]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: tuple, ttl: float):
+        ...
+
+    @abstractmethod
+    async def delete_prefix(self, prefix: str) -> int:
+        ...
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemoryCache(CacheBackend):
+    """
+        In-process cache with a time to live per entry and least recently used eviction.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, key: str) -> Optional[tuple]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value: tuple, ttl: float):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    async def delete_prefix(self, prefix: str) -> int:
+        with self.lock:
+            keys = [key for key in self.entries if key.startswith(prefix)]
+            for key in keys:
+                del self.entries[key]
+            return len(keys)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class RedisCache(CacheBackend):
+    """
+        Cache shared by every worker, stored in Redis. Requires the `redis` package,
+        whose asyncio client is awaited on the event loop.
+    """
+    def __init__(self, url: str, namespace: str):
+        from redis import asyncio as redis
+
+        self.client = redis.Redis.from_url(url)
+        self.namespace = namespace
+
+    async def get(self, key: str) -> Optional[tuple]:
+        raw = await self.client.get(self.namespace + key)
+        if raw is None:
+            return None
+        data, etag = json.loads(raw)
+        return data, etag
+
+    async def set(self, key: str, value: tuple, ttl: float):
+        await self.client.set(self.namespace + key, json.dumps(value), px=int(ttl * 1000))
+
+    async def delete_prefix(self, prefix: str) -> int:
+        keys = [key async for key in self.client.scan_iter(match=self.namespace + prefix + "*")]
+        if keys:
+            await self.client.delete(*keys)
+        return len(keys)
+
+
+def create_backend(namespace: str) -> CacheBackend:
+    """
+        Backend selected by CACHE_BACKEND: `memory` (default) or `redis` (using CACHE_URL).
+    """
+    if os.environ.get("CACHE_BACKEND", "memory") == "redis":
+        return RedisCache(os.environ.get("CACHE_URL", "redis://localhost:6379/0"), namespace)
+    return MemoryCache(int(os.environ.get("CACHE_MAX_ENTRIES", 1024)))
+
+
+def compute_etag(data: Any) -> str:
+    body = json.dumps(data, sort_keys=True, default=str).encode()
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+class ResponseCache:
+    """
+        Read-through cache of the responses of the read endpoints.
+        Write endpoints invalidate the entries of the resources they modify.
+        Each invalidated prefix has a generation, so a load that started before a write
+        and ends after it does not store the data it read before the write.
+    """
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.generations: dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def get_or_load(self, key: str, loader: Callable[[], Any]) -> tuple:
+        value = await self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        generation = self.generation(key)
+        data = loader()
+        if inspect.isawaitable(data):
+            data = await data
+        data = jsonable_encoder(data)
+        value = (data, compute_etag(data))
+        if generation == self.generation(key):
+            await self.backend.set(key, value, self.ttl)
+        return value
+
+    def generation(self, key: str) -> int:
+        # Generations only grow, so their sum changes whenever one of them does
+        return sum(count for prefix, count in self.generations.items() if key.startswith(prefix))
+
+    async def invalidate(self, *prefixes: str):
+        for prefix in prefixes:
+            self.generations[prefix] = self.generations.get(prefix, 0) + 1
+            self.invalidations += await self.backend.delete_prefix(prefix)
+
+    def stats(self) -> dict:
+        return {
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            **self.backend.stats(),
+        }
+
+    async def response(self, request: Request, key: str, loader: Callable[[], Any]) -> Response:
+        """
+            Cached JSON response with an ETag; answers 304 when the client already has it.
+        """
+        data, etag = await self.get_or_load(key, loader)
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return JSONResponse(data, headers={"ETag": etag})
+
+
+def create_cache(namespace: str) -> ResponseCache:
+    return ResponseCache(create_backend(namespace), float(os.environ.get("CACHE_TTL", 60)))
+
+def cache_key(*parts: Any) -> str:
+    return ":".join(str(part) for part in parts)
@@ -0,0 +1,101 @@
+import inspect
+import os
+from typing import Any, Optional, Union
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from supabase import create_client, acreate_client, Client, AsyncClient, ClientOptions, AsyncClientOptions
+
+from common.tracing import Tracer
+
+# "sync": blocking Supabase client, queries run in the threadpool
+# "async": async Supabase client, queries are awaited on the event loop
+DB_MODE = os.environ.get("DB_MODE", "sync")
+
+Connection = Union[Client, AsyncClient]
+
+
+def pool_limits() -> httpx.Limits:
+    """
+        Connection pool limits of the HTTP client used by Supabase.
+    """
+    return httpx.Limits(
+        max_connections=int(os.environ.get("DB_POOL_MAX_CONNECTIONS", 20)),
+        max_keepalive_connections=int(os.environ.get("DB_POOL_MAX_KEEPALIVE", 10)),
+        keepalive_expiry=float(os.environ.get("DB_POOL_KEEPALIVE_EXPIRY", 30.0)),
+    )
+
+def create_connection() -> Client:
+    """
+        Build a Supabase client backed by a pooled, keep-alive HTTP client.
+        It is meant to be created once per worker and shared by every request.
+    """
+    url: str = os.environ.get("SUPABASE_URL")
+    key: str = os.environ.get("SUPABASE_KEY")
+    http_client = httpx.Client(
+        limits=pool_limits(),
+        timeout=float(os.environ.get("DB_TIMEOUT", 30.0)),
+        http2=True,
+        follow_redirects=True,
+    )
+    supabase: Client = create_client(url, key, options=ClientOptions(httpx_client=http_client))
+    return supabase
+
+async def create_async_connection() -> AsyncClient:
+    """
+        Async counterpart of create_connection, used when DB_MODE is "async".
+    """
+    url: str = os.environ.get("SUPABASE_URL")
+    key: str = os.environ.get("SUPABASE_KEY")
+    http_client = httpx.AsyncClient(
+        limits=pool_limits(),
+        timeout=float(os.environ.get("DB_TIMEOUT", 30.0)),
+        http2=True,
+        follow_redirects=True,
+    )
+    supabase: AsyncClient = await acreate_client(url, key, options=AsyncClientOptions(httpx_client=http_client))
+    return supabase
+
+async def close_connection(supabase: Connection) -> None:
+    http_client = supabase.options.httpx_client
+    if isinstance(http_client, httpx.AsyncClient):
+        await http_client.aclose()
+    else:
+        http_client.close()
+
+async def execute(query, tracer: Tracer, operation: str = "select", table: Optional[str] = None) -> Any:
+    """
+        Execute a query builder of either client without blocking the event loop.
+        The query is traced by the tracer of the service and its latency recorded under its operation.
+    """
+    with tracer.span(f"db {operation}", metric="db_query_duration_seconds", labels={"operation": operation}, backend="supabase", table=table):
+        if inspect.iscoroutinefunction(query.execute):
+            return await query.execute()
+        return await run_in_threadpool(query.execute)
+
+def pool_status(supabase: Connection) -> dict:
+    """
+        Usage of the connection pool (open, active and idle connections).
+    """
+    http_client = supabase.options.httpx_client
+    pool = getattr(http_client._transport, "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    idle = sum(1 for connection in connections if connection.is_idle())
+    return {
+        "max_connections": getattr(pool, "_max_connections", None),
+        "max_keepalive_connections": getattr(pool, "_max_keepalive_connections", None),
+        "open": len(connections),
+        "active": len(connections) - idle,
+        "idle": idle,
+    }
+
+async def check_connection(supabase: Connection, tracer: Tracer, table: str, column: str) -> dict:
+    """
+        Run a cheap query against the database and report the pool usage.
+    """
+    try:
+        await execute(supabase.table(table).select(column).limit(1), tracer, "select", table)
+        status = "ok"
+    except Exception as e:
+        status = f"error: {e}"
+    return {"status": status, "mode": DB_MODE, "pool": pool_status(supabase)}
@@ -0,0 +1,341 @@
+import asyncio
+import json
+import os
+import random
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Optional
+
+import httpx
+from dotenv import load_dotenv
+from mcp.types import CallToolResult, TextContent
+
+from common.tracing import Tracer, inject
+
+load_dotenv()
+
+# Last body of each GET with an ETag, revalidated with If-None-Match
+ETAG_CACHE_SIZE = int(os.environ.get("MCP_ETAG_CACHE_SIZE", 256))
+
+# Retries of a transient failure and the backoff between them, in seconds
+RETRIES = int(os.environ.get("MCP_HTTP_RETRIES", 2))
+RETRY_BACKOFF = float(os.environ.get("MCP_HTTP_RETRY_BACKOFF", 0.05))
+RETRY_MAX_BACKOFF = float(os.environ.get("MCP_HTTP_RETRY_MAX_BACKOFF", 1.0))
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# Errors counted by the circuit breaker, the others mean the backend answered
+BACKEND_FAILURES = {"connection_error", "timeout", "unavailable", "server_error"}
+# Consecutive failures opening the circuit of a backend and seconds it stays open
+CIRCUIT_FAILURES = int(os.environ.get("MCP_CIRCUIT_FAILURES", 5))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get("MCP_CIRCUIT_RESET_TIMEOUT", 10.0))
+# Seconds after which a slow GET is sent again: 0 disables hedging, "auto" uses the p95 latency
+HEDGE_DELAY = os.environ.get("MCP_HTTP_HEDGE_DELAY", "0")
+
+def http2_enabled() -> bool:
+    """
+        HTTP/2 is used when it is enabled and the `h2` package is installed.
+    """
+    if os.environ.get("MCP_HTTP2", "1") != "1":
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def direct_backend() -> bool:
+    """
+        With MCP_BACKEND=direct the requests are served in-process by the REST application
+        (and its storage) instead of going through the network.
+    """
+    return os.environ.get("MCP_BACKEND", "http") == "direct"
+
+
+class RequestError(Exception):
+    """
+        Failure of a request to the REST backend, described so the model can decide what to do.
+    """
+
+    def __init__(self, type: str, message: str, status: Optional[int] = None, retryable: bool = False, detail: Any = None):
+        super().__init__(message)
+        self.type = type
+        self.message = message
+        self.status = status
+        self.retryable = retryable
+        self.detail = detail
+        self.attempts = 1
+
+    def payload(self) -> dict:
+        payload = {"type": self.type, "message": self.message, "retryable": self.retryable, "attempts": self.attempts}
+        if self.status is not None:
+            payload["status"] = self.status
+        if self.detail is not None:
+            payload["detail"] = self.detail
+        return payload
+
+
+class CircuitBreaker:
+    """
+        Stops sending requests to a backend after consecutive failures. Once the reset
+        timeout elapses a single probe is let through: its success closes the circuit,
+        its failure opens it again.
+    """
+
+    def __init__(self, failures: int = CIRCUIT_FAILURES, reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.threshold = failures
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # Start of the probe in flight, a probe that never finishes expires like the circuit
+        self.probe_started: Optional[float] = None
+
+    def before(self):
+        if self.opened_at is None:
+            return
+        now = time.monotonic()
+        remaining = self.opened_at + self.reset_timeout - now
+        probing = self.probe_started is not None and now - self.probe_started < self.reset_timeout
+        if remaining > 0 or probing:
+            raise RequestError(
+                "unavailable",
+                f"The backend is failing, requests are paused for {max(remaining, 0):.1f}s.",
+                retryable=True
+            )
+        self.probe_started = now
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+    def failure(self):
+        self.failures += 1
+        self.probe_started = None
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+def classify(error: Exception, method: str) -> RequestError:
+    """
+        Turn an exception of httpx into a RequestError telling whether it is worth retrying.
+        Only idempotent requests are retried, unless the request never reached the backend.
+    """
+    idempotent = method in IDEMPOTENT_METHODS
+    if isinstance(error, httpx.ConnectError):
+        return RequestError("connection_error", f"Could not connect to the backend: {error}", retryable=True)
+    if isinstance(error, httpx.TimeoutException):
+        return RequestError("timeout", f"The backend did not answer in time: {error!r}", retryable=idempotent)
+    if isinstance(error, httpx.TransportError):
+        return RequestError("connection_error", f"The connection to the backend failed: {error!r}", retryable=idempotent)
+    if isinstance(error, httpx.HTTPStatusError):
+        response = error.response
+        try:
+            detail = response.json().get("detail")
+        except (ValueError, AttributeError):
+            detail = response.text[:500] or None
+        status = response.status_code
+        if status == 429:
+            # Rejected by the admission control before it ran, so safe to send again
+            return RequestError("unavailable", f"The backend is overloaded and answered {status}.", status, retryable=True, detail=detail)
+        if status in (502, 503, 504):
+            return RequestError("unavailable", f"The backend answered {status}.", status, retryable=idempotent, detail=detail)
+        if status >= 500:
+            return RequestError("server_error", f"The backend failed with {status}.", status, detail=detail)
+        return RequestError("invalid_request" if status != 404 else "not_found", f"The backend rejected the request with {status}.", status, detail=detail)
+    if isinstance(error, ValueError):
+        return RequestError("invalid_response", f"The backend answered with an invalid body: {error}")
+    return RequestError("internal_error", f"{type(error).__name__}: {error}")
+
+def backoff(attempt: int) -> float:
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(RETRY_MAX_BACKOFF, RETRY_BACKOFF * 2 ** attempt))
+
+def error_result(error: RequestError) -> CallToolResult:
+    """
+        Tool result reporting the failure as a structured error, flagged with isError.
+    """
+    return CallToolResult(
+        content=[TextContent(type="text", text=json.dumps({"error": error.payload()}))],
+        isError=True
+    )
+
+
+class RestClient:
+    """
+        HTTP client of an MCP server to its REST backend, shared by every tool of the server.
+        `rest_app` returns the REST application, served in-process when MCP_BACKEND is "direct".
+    """
+
+    def __init__(self, user_agent: str, rest_app: Callable[[], Any], tracer: Tracer):
+        self.user_agent = user_agent
+        self.rest_app = rest_app
+        self.tracer = tracer
+        self.client: Optional[httpx.AsyncClient] = None
+        self.users = 0
+        # Lifespan of the in-process REST application when MCP_BACKEND is "direct"
+        self.app_lifespan = None
+        self.app_lock = asyncio.Lock()
+        self.etags: OrderedDict = OrderedDict()
+        self.breakers: dict[str, CircuitBreaker] = {}
+        # Latencies of the last GETs, used to pick the hedging delay when it is "auto"
+        self.get_latencies: deque = deque(maxlen=200)
+
+    def build_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=int(os.environ.get("MCP_HTTP_MAX_CONNECTIONS", 50)),
+            max_keepalive_connections=int(os.environ.get("MCP_HTTP_MAX_KEEPALIVE", 20)),
+            keepalive_expiry=float(os.environ.get("MCP_HTTP_KEEPALIVE_EXPIRY", 30.0)),
+        )
+        timeout = httpx.Timeout(
+            float(os.environ.get("MCP_HTTP_TIMEOUT", 30.0)),
+            connect=float(os.environ.get("MCP_HTTP_CONNECT_TIMEOUT", 5.0)),
+        )
+        headers = {
+            "User-Agent": self.user_agent,
+            "Accept": "application/json"
+        }
+        if direct_backend():
+            transport = httpx.ASGITransport(app=self.rest_app())
+            return httpx.AsyncClient(transport=transport, timeout=timeout, headers=headers)
+        return httpx.AsyncClient(limits=limits, timeout=timeout, headers=headers, http2=http2_enabled())
+
+    def get_client(self) -> httpx.AsyncClient:
+        """
+            Return the shared client, creating it if a tool runs outside the server lifespan.
+        """
+        if self.client is None or self.client.is_closed:
+            self.client = self.build_client()
+        return self.client
+
+    @asynccontextmanager
+    async def lifespan(self, server):
+        """
+            FastMCP lifespan: open the shared client at startup and close it at shutdown.
+            The server may run the lifespan once per session, so the client is reference counted.
+            With the direct backend it also runs the lifespan of the REST application.
+        """
+        self.get_client()
+        self.users += 1
+        try:
+            if direct_backend():
+                async with self.app_lock:
+                    if self.app_lifespan is None:
+                        app = self.rest_app()
+                        app_lifespan = app.router.lifespan_context(app)
+                        await app_lifespan.__aenter__()
+                        self.app_lifespan = app_lifespan
+            yield
+        finally:
+            self.users -= 1
+            if self.users == 0:
+                if self.client is not None:
+                    await self.client.aclose()
+                    self.client = None
+                if self.app_lifespan is not None:
+                    await self.app_lifespan.__aexit__(None, None, None)
+                    self.app_lifespan = None
+
+    def breaker_for(self, url: str) -> CircuitBreaker:
+        target = httpx.URL(url)
+        backend = "direct" if direct_backend() else f"{target.scheme}://{target.host}:{target.port}"
+        breaker = self.breakers.get(backend)
+        if breaker is None:
+            breaker = self.breakers[backend] = CircuitBreaker()
+        return breaker
+
+    def hedge_delay(self) -> Optional[float]:
+        if HEDGE_DELAY == "auto":
+            if len(self.get_latencies) < 20:
+                return None
+            ordered = sorted(self.get_latencies)
+            return ordered[int(len(ordered) * 0.95) - 1]
+        delay = float(HEDGE_DELAY)
+        return delay if delay > 0 else None
+
+    async def hedged(self, method: str, url: str, data: Any, params: Optional[dict]) -> Any:
+        """
+            Send a GET and, when it is slower than the hedging delay, a second identical one.
+            The first answer wins and the other request is cancelled.
+        """
+        delay = self.hedge_delay() if method == "GET" else None
+        started = time.perf_counter()
+        first = asyncio.create_task(self.send(method, url, data, params))
+        tasks = {first}
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    tasks.add(asyncio.create_task(self.send(method, url, data, params)))
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if method == "GET":
+                            self.get_latencies.append(time.perf_counter() - started)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def request(self, method: str, url: str, data: Any = None, params: dict = None) -> Any:
+        """
+            Send a request to the REST backend and return the decoded JSON body.
+            When the backend answers 304 to a revalidated GET the previous body is reused.
+            Transient failures are retried with backoff (idempotent requests only) and a backend
+            failing repeatedly is not called until its circuit closes again; any other failure
+            raises a RequestError.
+            The request is traced and carries the trace to the backend in its `traceparent` header.
+        """
+        breaker = self.breaker_for(url)
+        with self.tracer.span(f"http {method}", kind="client", method=method, url=url) as current:
+            for attempt in range(RETRIES + 1):
+                current.set(attempts=attempt + 1)
+                try:
+                    # An open circuit fails fast, without retrying
+                    breaker.before()
+                    body = await self.hedged(method, url, data, params)
+                except RequestError as error:
+                    error.attempts = attempt + 1
+                    raise
+                except Exception as e:
+                    error = classify(e, method)
+                    error.attempts = attempt + 1
+                    if error.type in BACKEND_FAILURES:
+                        breaker.failure()
+                    else:
+                        # The backend answered, it is up
+                        breaker.success()
+                    if not error.retryable or attempt == RETRIES:
+                        raise error from e
+                    await asyncio.sleep(backoff(attempt))
+                    continue
+                breaker.success()
+                return body
+
+    async def send(self, method: str, url: str, data: Any, params: Optional[dict]) -> Any:
+        client = self.get_client()
+        if method != "GET":
+            response = await client.request(method, url, json=data, params=params, headers=inject())
+            response.raise_for_status()
+            return response.json()
+
+        key = str(httpx.URL(url, params=params))
+        cached = self.etags.get(key)
+        headers = inject({"If-None-Match": cached[0]} if cached is not None else None)
+        response = await client.get(url, params=params, headers=headers)
+        if response.status_code == 304 and cached is not None:
+            self.etags.move_to_end(key)
+            return cached[1]
+
+        response.raise_for_status()
+        body = response.json()
+        etag = response.headers.get("ETag")
+        if etag is not None:
+            self.etags[key] = (etag, body)
+            self.etags.move_to_end(key)
+            while len(self.etags) > ETAG_CACHE_SIZE:
+                self.etags.popitem(last=False)
+        return body
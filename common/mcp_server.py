@@ -0,0 +1,35 @@
+from typing import Any
+
+from mcp.server.fastmcp import FastMCP
+from mcp.types import ToolAnnotations
+
+from common.tracing import Tracer
+
+
+class TracedFastMCP(FastMCP):
+    """
+        FastMCP recording a span and the latency of every tool call. The span continues the
+        trace of the agent, received as `traceparent` in the `_meta` of the request.
+    """
+
+    def __init__(self, name: str, tracer: Tracer, **settings: Any):
+        super().__init__(name, **settings)
+        self.tracer = tracer
+
+    async def call_tool(self, name: str, arguments: dict[str, Any]) -> Any:
+        meta = self.get_context().request_context.meta
+        with self.tracer.span(f"tool {name}", parent=getattr(meta, "traceparent", None), metric="mcp_tool_duration_seconds", labels={"tool": name}, kind="server") as current:
+            result = await super().call_tool(name, arguments)
+            if getattr(result, "isError", False):
+                current.status = "error"
+            return result
+
+
+def reads(*resources: str) -> dict:
+    """
+        Options of a read-only tool: its results may be reused until a tool writes one of its resources.
+    """
+    return {"annotations": ToolAnnotations(readOnlyHint=True), "meta": {"resources": list(resources)}}
+
+def writes(*resources: str) -> dict:
+    return {"annotations": ToolAnnotations(readOnlyHint=False), "meta": {"resources": list(resources)}}
@@ -0,0 +1,38 @@
+from typing import Optional
+
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def select_columns(fields: Optional[str], allowed: set[str], key: str) -> str:
+    """
+        Columns to select from a comma separated list of fields.
+        The key column is always included because it is the pagination cursor.
+    """
+    if not fields:
+        return "*"
+    columns = [column.strip() for column in fields.split(",") if column.strip()]
+    unknown = [column for column in columns if column not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    if key not in columns:
+        columns.insert(0, key)
+    return ",".join(columns)
+
+def paginate(query, key: str, limit: int, after: Optional[str] = None):
+    """
+        Keyset pagination: rows ordered by the key column starting after the cursor.
+        One extra row is requested to know if there is a next page.
+    """
+    if after is not None:
+        query = query.gt(key, after)
+    return query.order(key).limit(limit + 1)
+
+def build_page(rows: list, key: str, limit: int) -> dict:
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "items": rows,
+        "next_cursor": rows[-1][key] if has_more and rows else None
+    }
@@ -0,0 +1,263 @@
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+
+from common.database import Connection, close_connection, check_connection, execute
+from common.pagination import paginate, build_page
+from common.tracing import Tracer
+
+# A filter is a (column, operator, value) tuple, the operators follow PostgREST:
+# eq, neq, gt, gte, lt, lte, ilike (value is a pattern) and in (value is a list)
+Filter = tuple[str, str, Any]
+
+SQL_OPERATORS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "ilike": "LIKE"}
+
+
+class Repository(ABC):
+    """
+        Storage of the tables behind the routes.
+        Every method returns the affected rows as dictionaries.
+        Each service extends it with the queries of its own tables.
+    """
+    @abstractmethod
+    async def get(self, table: str, key: str, id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def page(self, table: str, key: str, columns: str, limit: int, after: Optional[str], filters: list[Filter]) -> dict:
+        ...
+
+    @abstractmethod
+    async def insert(self, table: str, rows: list[dict]) -> list[dict]:
+        ...
+
+    @abstractmethod
+    async def upsert(self, table: str, rows: list[dict], key: str) -> list[dict]:
+        ...
+
+    @abstractmethod
+    async def update(self, table: str, data: dict, filters: list[Filter]) -> list[dict]:
+        ...
+
+    @abstractmethod
+    async def delete(self, table: str, filters: list[Filter]) -> list[dict]:
+        ...
+
+    @abstractmethod
+    async def health(self) -> dict:
+        ...
+
+    async def close(self):
+        pass
+
+
+class SupabaseRepository(Repository):
+    """
+        Tables stored in Supabase, queried through the shared client of the worker.
+    """
+    def __init__(self, connection: Connection, tracer: Tracer, health_table: str, health_column: str):
+        self.connection = connection
+        self.tracer = tracer
+        self.health_table = health_table
+        self.health_column = health_column
+
+    @staticmethod
+    def apply_filters(query, filters: list[Filter]):
+        for column, operator, value in filters:
+            query = getattr(query, "in_" if operator == "in" else operator)(column, value)
+        return query
+
+    async def execute(self, query, operation: str, table: str) -> Any:
+        return await execute(query, self.tracer, operation, table)
+
+    async def get(self, table: str, key: str, id: str) -> Optional[dict]:
+        response = await self.execute(self.connection.table(table).select("*").eq(key, id).limit(1), "select", table)
+        return response.data[0] if response.data else None
+
+    async def page(self, table: str, key: str, columns: str, limit: int, after: Optional[str], filters: list[Filter]) -> dict:
+        query = self.apply_filters(self.connection.table(table).select(columns), filters)
+        response = await self.execute(paginate(query, key, limit, after), "select", table)
+        return build_page(response.data, key, limit)
+
+    async def insert(self, table: str, rows: list[dict]) -> list[dict]:
+        response = await self.execute(self.connection.table(table).insert(rows), "insert", table)
+        return response.data
+
+    async def upsert(self, table: str, rows: list[dict], key: str) -> list[dict]:
+        response = await self.execute(self.connection.table(table).upsert(rows, on_conflict=key), "upsert", table)
+        return response.data
+
+    async def update(self, table: str, data: dict, filters: list[Filter]) -> list[dict]:
+        response = await self.execute(self.apply_filters(self.connection.table(table).update(data), filters), "update", table)
+        return response.data
+
+    async def delete(self, table: str, filters: list[Filter]) -> list[dict]:
+        response = await self.execute(self.apply_filters(self.connection.table(table).delete(), filters), "delete", table)
+        return response.data
+
+    async def health(self) -> dict:
+        return {"backend": "supabase", **await check_connection(self.connection, self.tracer, self.health_table, self.health_column)}
+
+    async def close(self):
+        await close_connection(self.connection)
+
+
+class SQLiteRepository(Repository):
+    """
+        Tables stored in an embedded SQLite database in WAL mode, the schema is created on start.
+        Each worker thread has its own connection; an in-memory database has a single one.
+    """
+    def __init__(self, path: str, schema: str, tracer: Tracer, timeout: float = 5.0):
+        self.path = path
+        self.tracer = tracer
+        self.timeout = timeout
+        self.local = threading.local()
+        self.connections: list[sqlite3.Connection] = []
+        self.connections_lock = threading.Lock()
+        self.memory = path == ":memory:"
+        # Statements on the shared in-memory connection are serialized
+        self.memory_lock = threading.Lock() if self.memory else None
+        self.connection().executescript(schema)
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        with self.connections_lock:
+            self.connections.append(connection)
+        return connection
+
+    def connection(self) -> sqlite3.Connection:
+        if self.memory:
+            return self.connections[0] if self.connections else self.connect()
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.local.connection = self.connect()
+        return connection
+
+    def run_read(self, sql: str, params: list) -> list[dict]:
+        with self.memory_lock or nullcontext():
+            return [dict(row) for row in self.connection().execute(sql, params)]
+
+    def run_write(self, statements: list[tuple[str, list]]) -> list[dict]:
+        """
+            Run the statements in one transaction and return the rows they produce.
+        """
+        connection = self.connection()
+        rows = []
+        with self.memory_lock or nullcontext():
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    rows.extend(dict(row) for row in connection.execute(sql, params))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return rows
+
+    async def read(self, sql: str, params: list = ()) -> list[dict]:
+        with self.tracer.span("db read", metric="db_query_duration_seconds", labels={"operation": "read"}, backend="sqlite", statement=sql):
+            return await run_in_threadpool(self.run_read, sql, list(params))
+
+    async def write(self, statements: list[tuple[str, list]]) -> list[dict]:
+        """
+            Run the statements in one transaction. A write breaking a constraint (a duplicate key
+            or a missing referenced row) is rolled back and answered 409.
+        """
+        with self.tracer.span("db write", metric="db_query_duration_seconds", labels={"operation": "write"}, backend="sqlite", statements=len(statements)):
+            try:
+                return await run_in_threadpool(self.run_write, statements)
+            except sqlite3.IntegrityError as e:
+                raise HTTPException(status_code=409, detail=f"The write conflicts with the stored data: {e}")
+
+    @staticmethod
+    def where(filters: list[Filter]) -> tuple[str, list]:
+        clauses, params = [], []
+        for column, operator, value in filters:
+            if operator == "in":
+                clauses.append(f"{column} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+            else:
+                clauses.append(f"{column} {SQL_OPERATORS[operator]} ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    @staticmethod
+    def insert_statement(table: str, row: dict, conflict: str = "") -> tuple[str, list]:
+        columns = ", ".join(row)
+        placeholders = ", ".join("?" * len(row))
+        return f'INSERT INTO "{table}" ({columns}) VALUES ({placeholders}){conflict} RETURNING *', list(row.values())
+
+    async def get(self, table: str, key: str, id: str) -> Optional[dict]:
+        rows = await self.read(f'SELECT * FROM "{table}" WHERE {key} = ? LIMIT 1', [id])
+        return rows[0] if rows else None
+
+    async def page(self, table: str, key: str, columns: str, limit: int, after: Optional[str], filters: list[Filter]) -> dict:
+        if after is not None:
+            filters = [*filters, (key, "gt", after)]
+        where, params = self.where(filters)
+        rows = await self.read(f'SELECT {columns} FROM "{table}"{where} ORDER BY {key} LIMIT ?', [*params, limit + 1])
+        return build_page(rows, key, limit)
+
+    async def insert(self, table: str, rows: list[dict]) -> list[dict]:
+        return await self.write([self.insert_statement(table, row) for row in rows])
+
+    async def upsert(self, table: str, rows: list[dict], key: str) -> list[dict]:
+        statements = []
+        for row in rows:
+            conflict = f" ON CONFLICT({key}) DO UPDATE SET " + ", ".join(f"{column} = excluded.{column}" for column in row)
+            statements.append(self.insert_statement(table, row, conflict))
+        return await self.write(statements)
+
+    async def update(self, table: str, data: dict, filters: list[Filter]) -> list[dict]:
+        where, params = self.where(filters)
+        if not data:
+            return await self.read(f'SELECT * FROM "{table}"{where}', params)
+        assignments = ", ".join(f"{column} = ?" for column in data)
+        return await self.write([(f'UPDATE "{table}" SET {assignments}{where} RETURNING *', [*data.values(), *params])])
+
+    async def delete(self, table: str, filters: list[Filter]) -> list[dict]:
+        where, params = self.where(filters)
+        return await self.write([(f'DELETE FROM "{table}"{where} RETURNING *', params)])
+
+    async def health(self) -> dict:
+        try:
+            await self.read("SELECT 1")
+            status = "ok"
+        except Exception as e:
+            status = f"error: {e}"
+        return {"backend": "sqlite", "status": status, "path": self.path, "connections": len(self.connections)}
+
+    async def close(self):
+        with self.connections_lock:
+            for connection in self.connections:
+                connection.close()
+            self.connections.clear()
+
+
+def repository_lifespan(create_repository: Callable[[], Awaitable[Repository]]):
+    """
+        FastAPI lifespan opening the repository of the service once per worker.
+    """
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        app.state.repository = await create_repository()
+        try:
+            yield
+        finally:
+            await app.state.repository.close()
+    return lifespan
+
+def get_repository(request: Request) -> Repository:
+    """
+        FastAPI dependency returning the worker's shared repository.
+    """
+    return request.app.state.repository
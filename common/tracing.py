@@ -0,0 +1,242 @@
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "off" (default), "console" (one line per span on stderr) or "jsonl" (appended to TRACE_FILE)
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "off")
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+
+# Upper bounds in seconds of the latency histograms
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Shared by the tracers of the process, so a service called in-process continues the trace
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_export_lock = threading.Lock()
+_export_file = None
+
+
+class Span:
+    """
+        Timed operation of a trace, identified as in the W3C Trace Context.
+    """
+
+    def __init__(self, service: str, name: str, trace_id: str, parent_id: Optional[str], attributes: dict):
+        self.service = service
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.status = "ok"
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.duration = 0.0
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        return {
+            "service": self.service,
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "start_time": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[tuple[str, str]]:
+    """
+        Trace and parent span ids of a `traceparent` header, None when it is missing or invalid.
+    """
+    parts = (value or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2]
+
+def current_traceparent() -> Optional[str]:
+    span = _current.get()
+    return span.traceparent() if span is not None else None
+
+def inject(headers: Optional[dict] = None) -> dict:
+    """
+        Headers carrying the current trace to the next service.
+    """
+    headers = dict(headers or {})
+    traceparent = current_traceparent()
+    if traceparent is not None:
+        headers["traceparent"] = traceparent
+    return headers
+
+def export(finished: Span):
+    global _export_file
+    if TRACE_EXPORTER == "off":
+        return
+    line = json.dumps(finished.to_dict(), default=str)
+    with _export_lock:
+        if TRACE_EXPORTER == "console":
+            print(line, file=sys.stderr, flush=True)
+        elif TRACE_EXPORTER == "jsonl":
+            if _export_file is None:
+                _export_file = open(TRACE_FILE, "a", encoding="utf-8")
+            _export_file.write(line + "\n")
+            _export_file.flush()
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+
+def render_labels(labels: tuple, extra: Optional[tuple] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (
+        f'{name}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Tracer:
+    """
+        Spans and latency histograms of one service. The services loaded in the same process
+        (the agent, the MCP servers and the REST applications in-process) keep their own
+        histograms, so each one only exposes its own metrics.
+    """
+
+    def __init__(self, service: str):
+        self.service = service
+        self.histograms: dict[tuple[str, tuple], Histogram] = {}
+        self.histograms_lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[str] = None, metric: Optional[str] = None, labels: Optional[dict] = None, **attributes: Any) -> Iterator[Span]:
+        """
+            Record an operation as a child of the current span, or of the `parent` traceparent
+            received from another service. With `metric` its latency is also added to that histogram.
+        """
+        remote = parse_traceparent(parent)
+        current = _current.get()
+        if remote is not None:
+            trace_id, parent_id = remote
+        elif current is not None:
+            trace_id, parent_id = current.trace_id, current.span_id
+        else:
+            trace_id, parent_id = secrets.token_hex(16), None
+
+        new = Span(self.service, name, trace_id, parent_id, attributes)
+        token = _current.set(new)
+        try:
+            yield new
+        except BaseException as e:
+            new.status = "error"
+            new.set(error=f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _current.reset(token)
+            new.duration = time.perf_counter() - new.started
+            if metric is not None:
+                self.observe(metric, labels or {}, new.duration)
+            export(new)
+
+    def observe(self, metric: str, labels: dict, seconds: float):
+        key = (metric, tuple(sorted(labels.items())))
+        with self.histograms_lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def snapshot(self) -> dict:
+        """
+            Count and total seconds of each histogram, summed over its labels.
+        """
+        totals: dict[str, dict] = {}
+        with self.histograms_lock:
+            for (metric, _), histogram in self.histograms.items():
+                total = totals.setdefault(metric, {"count": 0, "sum": 0.0})
+                total["count"] += histogram.count
+                total["sum"] += histogram.sum
+        return totals
+
+    def metrics_text(self) -> str:
+        """
+            Latency histograms in the Prometheus text format.
+        """
+        lines = []
+        with self.histograms_lock:
+            items = sorted(self.histograms.items())
+            for metric in sorted({metric for (metric, _), _ in items}):
+                lines.append(f"# TYPE {metric} histogram")
+                for (name, labels), histogram in items:
+                    if name != metric:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{metric}_bucket{render_labels(labels, ('le', bound))} {cumulative}")
+                    lines.append(f"{metric}_bucket{render_labels(labels, ('le', '+Inf'))} {histogram.count}")
+                    lines.append(f"{metric}_sum{render_labels(labels)} {histogram.sum}")
+                    lines.append(f"{metric}_count{render_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    async def trace_request(self, request, call_next):
+        """
+            FastAPI middleware recording a span per request, continuing the trace of the caller,
+            and the latency of each route.
+        """
+        with self.span(f"{request.method} {request.url.path}", parent=request.headers.get("traceparent"), kind="server") as current:
+            response = await call_next(request)
+            # The route template keeps the ids out of the labels
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            current.name = f"{request.method} {route}"
+            current.set(route=route, status_code=response.status_code)
+            self.observe("http_server_duration_seconds", {"method": request.method, "route": route}, time.perf_counter() - current.started)
+            return response
+
+
+_tracers: dict[str, Tracer] = {}
+_tracers_lock = threading.Lock()
+
+def get_tracer(service: str) -> Tracer:
+    """
+        Tracer of the service, the same instance for every module of the service.
+    """
+    with _tracers_lock:
+        tracer = _tracers.get(service)
+        if tracer is None:
+            tracer = _tracers[service] = Tracer(service)
+        return tracer
@@ -1,3 +1,8 @@
 # Cosntants
+SERVICE = "management_server"
 SERVER_URL = "http://localhost:8000"
 USER_AGENT = "Management-server/1.0"
+
+# Columns of the tables that can be projected
+USER_COLUMNS = {"id_user", "user_name", "created_at"}
+PRIVILEGE_COLUMNS = {"id_privilege", "privilege_name", "privilege_description", "created_at"}
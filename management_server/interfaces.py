@@ -10,3 +10,7 @@ class update_user_request(BaseModel):
 
 class privilege_request(BaseModel):
     arr_id_privileges: List[str] = Field(description="List of privilege IDs to be added to the user")
+
+class users_privileges_request(BaseModel):
+    arr_id_users: List[str] = Field(description="List of user IDs")
+    arr_id_privileges: List[str] = Field(description="List of privilege IDs")
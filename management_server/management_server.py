@@ -1,122 +1,190 @@
-import os
-from supabase import create_client, Client
-from fastapi import FastAPI
+from typing import List, Optional
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
 
 from dotenv import load_dotenv
 
 from management_server.interfaces import (
     create_user_request,
     update_user_request,
-    privilege_request
+    privilege_request,
+    users_privileges_request
 )
 
-app = FastAPI()
+from management_server.repository import Repository, lifespan
+from common.repository import get_repository
+from common.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, select_columns
+from management_server.constants import SERVICE, USER_COLUMNS, PRIVILEGE_COLUMNS
+from common.cache import create_cache, cache_key
+from common.tracing import get_tracer
+from common.admission import Admission
+
 load_dotenv()
+app = FastAPI(lifespan=lifespan)
+tracer = get_tracer(SERVICE)
+# The tracing middleware is added last so it wraps the admission control and sees the 429s
+admission = Admission(tracer)
+app.middleware("http")(admission.admit_request)
+app.middleware("http")(tracer.trace_request)
+cache = create_cache("management_server:")
+
+def found(row: Optional[dict]) -> dict:
+    if row is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return row
+
+@app.get("/health")
+async def health(repository: Repository = Depends(get_repository)):
+    return await repository.health()
 
-def create_connection() -> Client:
-    url: str = os.environ.get("SUPABASE_URL")
-    key: str = os.environ.get("SUPABASE_KEY")
-    supabase: Client = create_client(url, key)
-    
-    return supabase
+@app.get("/cache/stats")
+async def cache_stats():
+    return cache.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return tracer.metrics_text()
 
 
 @app.post("/users/")
-def create_user(request: create_user_request):
-    supabase = create_connection()
-    response = supabase.table("Users").insert({"user_name": request.user_name}).execute()
-    return response.data
+async def create_user(request: create_user_request, repository: Repository = Depends(get_repository)):
+    rows = await repository.insert("Users", [{"user_name": request.user_name}])
+    await cache.invalidate("users:")
+    return rows
 
 @app.get("/users/")
-def list_users():
-    supabase = create_connection()
-    response = supabase.table("Users").select("*").execute()
-    return response.data
+async def list_users(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    name: Optional[str] = None,
+    repository: Repository = Depends(get_repository)
+):
+    filters = []
+    if name is not None:
+        filters.append(("user_name", "ilike", f"%{name}%"))
+    columns = select_columns(fields, USER_COLUMNS, "id_user")
+    return await repository.page("Users", "id_user", columns, limit, after, filters)
 
 @app.get("/users/{user_id}")
-def get_user(user_id: str):
-    supabase = create_connection()
-    response = supabase.table("Users").select("*").eq("id_user", user_id).single().execute()
-    return response.data
+async def get_user(user_id: str, request: Request, repository: Repository = Depends(get_repository)):
+    async def load():
+        return found(await repository.get("Users", "id_user", user_id))
+
+    return await cache.response(request, cache_key("users", user_id), load)
 
 @app.put("/users/{user_id}")
-def update_user(user_id: str, request: update_user_request):
+async def update_user(user_id: str, request: update_user_request, repository: Repository = Depends(get_repository)):
     print("Updating user:", user_id, "with new name:", request.user_name)
-    supabase = create_connection()
-    response = supabase.table("Users").update({"user_name": request.user_name}).eq("id_user", user_id).execute()
-    print("Update response:", response)
-    return response.data
+    rows = await repository.update("Users", {"user_name": request.user_name}, [("id_user", "eq", user_id)])
+    print("Update response:", rows)
+    await cache.invalidate("users:")
+    return rows
 
 @app.delete("/users/{user_id}")
-def delete_user(user_id: str):
-    supabase = create_connection()
-    response = supabase.table("Users").delete().eq("id_user", user_id).execute()
-    return {"deleted": response.data}
+async def delete_user(user_id: str, repository: Repository = Depends(get_repository)):
+    rows = await repository.delete("Users", [("id_user", "eq", user_id)])
+    await cache.invalidate("users:", "user_privileges:")
+    return {"deleted": rows}
 
 # Privileges CRUD
 @app.post("/privileges/")
-def create_privilege(privilege_name: str, privilege_description: str = None):
-    supabase = create_connection()
+async def create_privilege(privilege_name: str, privilege_description: str = None, repository: Repository = Depends(get_repository)):
     data = {"privilege_name": privilege_name}
     if privilege_description:
         data["privilege_description"] = privilege_description
-    response = supabase.table("Privileges").insert(data).execute()
-    return response.data
+    rows = await repository.insert("Privileges", [data])
+    await cache.invalidate("privileges:")
+    return rows
 
 @app.get("/privileges/")
-def list_privileges():
-    supabase = create_connection()
-    response = supabase.table("Privileges").select("*").execute()
-    return response.data
+async def list_privileges(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    name: Optional[str] = None,
+    repository: Repository = Depends(get_repository)
+):
+    async def load():
+        filters = []
+        if name is not None:
+            filters.append(("privilege_name", "ilike", f"%{name}%"))
+        columns = select_columns(fields, PRIVILEGE_COLUMNS, "id_privilege")
+        return await repository.page("Privileges", "id_privilege", columns, limit, after, filters)
+
+    key = cache_key("privileges", "list", limit, after, fields, name)
+    return await cache.response(request, key, load)
 
 @app.get("/privileges/{privilege_id}")
-def get_privilege(privilege_id: str):
-    supabase = create_connection()
-    response = supabase.table("Privileges").select("*").eq("id_privilege", privilege_id).single().execute()
-    return response.data
+async def get_privilege(privilege_id: str, repository: Repository = Depends(get_repository)):
+    return found(await repository.get("Privileges", "id_privilege", privilege_id))
 
 @app.put("/privileges/{privilege_id}")
-def update_privilege(privilege_id: str, privilege_name: str = None, privilege_description: str = None):
-    supabase = create_connection()
+async def update_privilege(privilege_id: str, privilege_name: str = None, privilege_description: str = None, repository: Repository = Depends(get_repository)):
     data = {}
     if privilege_name:
         data["privilege_name"] = privilege_name
     if privilege_description:
         data["privilege_description"] = privilege_description
-    response = supabase.table("Privileges").update(data).eq("id_privilege", privilege_id).execute()
-    return response.data
+    rows = await repository.update("Privileges", data, [("id_privilege", "eq", privilege_id)])
+    await cache.invalidate("privileges:", "user_privileges:")
+    return rows
 
 @app.delete("/privileges/{privilege_id}")
-def delete_privilege(privilege_id: str):
-    supabase = create_connection()
-    response = supabase.table("Privileges").delete().eq("id_privilege", privilege_id).execute()
-    return {"deleted": response.data}
+async def delete_privilege(privilege_id: str, repository: Repository = Depends(get_repository)):
+    rows = await repository.delete("Privileges", [("id_privilege", "eq", privilege_id)])
+    await cache.invalidate("privileges:", "user_privileges:")
+    return {"deleted": rows}
+
+@app.post("/grant_privileges/")
+async def grant_privileges_to_users(request: users_privileges_request, repository: Repository = Depends(get_repository)):
+    data = [
+        {"id_user": id_user, "id_privilege": privilege_id}
+        for id_user in request.arr_id_users
+        for privilege_id in request.arr_id_privileges
+    ]
+    rows = await repository.insert("Users_X_Privileges", data)
+    await cache.invalidate("user_privileges:")
+    return {"granted": rows}
 
 @app.post("/grant_privileges/{id_user}")
-def grant_privileges(id_user: str, request: privilege_request):
-    supabase = create_connection()
+async def grant_privileges(id_user: str, request: privilege_request, repository: Repository = Depends(get_repository)):
     data = [
         {"id_user": id_user, "id_privilege": privilege_id}
         for privilege_id in request.arr_id_privileges
     ]
-    response = supabase.table("Users_X_Privileges").insert(data).execute()
-    return {"granted": response.data}
+    rows = await repository.insert("Users_X_Privileges", data)
+    await cache.invalidate("user_privileges:")
+    return {"granted": rows}
+
+@app.post("/revoke_privileges/")
+async def revoke_privileges_of_users(request: users_privileges_request, repository: Repository = Depends(get_repository)):
+    rows = await repository.delete("Users_X_Privileges", [
+        ("id_user", "in", request.arr_id_users),
+        ("id_privilege", "in", request.arr_id_privileges)
+    ])
+    await cache.invalidate("user_privileges:")
+    return {"revoked": rows}
 
 @app.post("/revoke_privileges/{id_user}")
-def revoke_privileges(id_user: str, request: privilege_request):
-    supabase = create_connection()
-    deleted = []
-    for privilege_id in request.arr_id_privileges:
-        resp = supabase.table("Users_X_Privileges").delete().eq("id_user", id_user).eq("id_privilege", privilege_id).execute()
-        deleted.append(resp.data)
-    return {"revoked": deleted}
+async def revoke_privileges(id_user: str, request: privilege_request, repository: Repository = Depends(get_repository)):
+    rows = await repository.delete("Users_X_Privileges", [
+        ("id_user", "eq", id_user),
+        ("id_privilege", "in", request.arr_id_privileges)
+    ])
+    await cache.invalidate("user_privileges:")
+    return {"revoked": rows}
+
+# Privileges are resolved with a single query joining Users_X_Privileges and Privileges
+@app.get("/user_privileges/")
+async def users_privileges(id_user: List[str] = Query(...), repository: Repository = Depends(get_repository)):
+    return {"users": await repository.privileges_of_users(id_user)}
 
 @app.get("/user_privileges/{id_user}")
-def user_privileges(id_user: str):
-    supabase = create_connection()
-    response = supabase.table("Users_X_Privileges").select("id_privilege").eq("id_user", id_user).execute()
-    privilege_ids = [row["id_privilege"] for row in response.data]
-    if not privilege_ids:
-        return {"privileges": []}
-    privileges = supabase.table("Privileges").select("*").in_("id_privilege", privilege_ids).execute()
-    return {"privileges": privileges.data}
\ No newline at end of file
+async def user_privileges(id_user: str, request: Request, repository: Repository = Depends(get_repository)):
+    async def load():
+        privileges = await repository.privileges_of_users([id_user])
+        return {"privileges": privileges[id_user]}
+
+    return await cache.response(request, cache_key("user_privileges", id_user), load)
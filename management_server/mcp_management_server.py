@@ -1,176 +1,148 @@
+import argparse
+import sys
+from pathlib import Path
 from typing import Any
-import httpx
-from mcp.server.fastmcp import FastMCP
 
-from constants import SERVER_URL, USER_AGENT
+# Run as a script, the project root replaces the directory of the script so the
+# modules are imported from their package and do not collide with the ones of
+# the other MCP server when both are loaded in the same process
+if __package__ in (None, ""):
+    sys.path[0] = str(Path(__file__).resolve().parent.parent)
+
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+
+from management_server.constants import SERVER_URL, SERVICE, USER_AGENT
+from common.http_client import RestClient, RequestError, error_result
+from common.mcp_server import TracedFastMCP, reads, writes
+from common.tracing import get_tracer
+
+tracer = get_tracer(SERVICE)
+
+def rest_app():
+    # Imported on first use, only the direct backend serves the REST application in-process
+    from management_server.management_server import app
+
+    return app
+
+rest_client = RestClient(USER_AGENT, rest_app, tracer)
 
 # Initialize FastMCP server
-mcp = FastMCP("management_server")
-
-async def make_management_server_request(endpoint: str) -> Any:
-    headers = {
-        "User-Agent": USER_AGENT,
-        "Accept": "application/json"
-    }
-
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(endpoint, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            return None
+mcp = TracedFastMCP("management_server", tracer, lifespan=rest_client.lifespan)
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(tracer.metrics_text())
+
+async def make_management_server_request(method: str, endpoint: str, data: Any = None, params: dict = None) -> Any:
+    if params is not None:
+        params = {k: v for k, v in params.items() if v is not None}
+    try:
+        return await rest_client.request(method, endpoint, data, params)
+    except RequestError as e:
+        # Transient failures were already retried, the model gets a structured error
+        return error_result(e)
 
 # MCP tools for user management
-@mcp.tool("get_users")
-async def get_users() -> Any:
+@mcp.tool("get_users", **reads("users"))
+async def get_users(limit: int = 50, after: str = None, fields: str = None, name: str = None) -> Any:
     """
-        Retrieve a list of users from the management server.
+        Retrieve a page of users from the management server.
+        Pass the returned next_cursor as `after` to get the next page; `name` matches part of the user name.
     """
     url = f"{SERVER_URL}/users/"
-    return await make_management_server_request(url)
+    params = {"limit": limit, "after": after, "fields": fields, "name": name}
+    return await make_management_server_request("GET", url, params=params)
 
-@mcp.tool("create_user")
+@mcp.tool("create_user", **writes("users"))
 async def create_user(user_name: str) -> Any:
     """
         Create a new user on the management server.
     """
-    headers = {
-        "User-Agent": USER_AGENT,
-        "Accept": "application/json"
-    }
     data = {"user_name": user_name}
+    return await make_management_server_request("POST", f"{SERVER_URL}/users/", data)
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(f"{SERVER_URL}/users/", json=data, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            return None
-
-@mcp.tool("delete_user")
+@mcp.tool("delete_user", **writes("users", "user_privileges"))
 async def delete_user(user_id: str) -> Any:
     """
-        Create a new user on the management server.
+        Delete a user from the management server.
     """
-    headers = {
-        "User-Agent": USER_AGENT,
-        "Accept": "application/json"
-    }
-    
-
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.delete(f"{SERVER_URL}/users/" + user_id, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            return None
+    return await make_management_server_request("DELETE", f"{SERVER_URL}/users/" + user_id)
 
-    url = f"{SERVER_URL}/users/"
-    return await make_management_server_request(url)
-
-@mcp.tool("update_user")
+@mcp.tool("update_user", **writes("users"))
 async def update_user(user_id: str, user_name: str) -> Any:
     """
         Update an existing user on the management server.
     """
-    headers = {
-        "User-Agent": USER_AGENT,
-        "Accept": "application/json"
-    }
     data = {"user_name": user_name}
-
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.put(f"{SERVER_URL}/users/" + user_id, json=data, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            return None
+    return await make_management_server_request("PUT", f"{SERVER_URL}/users/" + user_id, data)
 
 
-# MCP tools for user - privilege 
-@mcp.tool("get_privileges_of_user")
+# MCP tools for user - privilege
+@mcp.tool("get_privileges_of_user", **reads("user_privileges", "privileges"))
 async def get_privileges_of_user(user_id: str) -> Any:
     """
         Retrieve a list of privileges for a specific user.
     """
-    headers = {
-        "User-Agent": USER_AGENT,
-        "Accept": "application/json"
-    }
-    
-
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(f"{SERVER_URL}/user_privileges/" + user_id, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            return None
-
-@mcp.tool("add_privileges_to_user")
+    return await make_management_server_request("GET", f"{SERVER_URL}/user_privileges/" + user_id)
+
+@mcp.tool("add_privileges_to_user", **writes("user_privileges"))
 async def add_privileges_to_user(user_id: str, arr_id_privileges: list[str]) -> Any:
     """
         Add privileges to a user.
     """
-    headers = {
-        "User-Agent": USER_AGENT,
-        "Accept": "application/json"
-    }
-    
     data = {"arr_id_privileges": arr_id_privileges}
+    return await make_management_server_request("POST", f"{SERVER_URL}/grant_privileges/" + user_id, data)
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(f"{SERVER_URL}/grant_privileges/" + user_id, json=data, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            return None
-        
-@mcp.tool("delete_privileges_to_user")
+@mcp.tool("delete_privileges_to_user", **writes("user_privileges"))
 async def delete_privileges_to_user(user_id: str, arr_id_privileges: list[str]) -> Any:
     """
         Delete privileges from a user.
     """
-    
-    headers = {
-        "User-Agent": USER_AGENT,
-        "Accept": "application/json"
-    }
-    
     data = {"arr_id_privileges": arr_id_privileges}
+    return await make_management_server_request("POST", f"{SERVER_URL}/revoke_privileges/" + user_id, data)
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.delete(f"{SERVER_URL}/revoke_privileges/" + user_id, json=data, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            return None
+@mcp.tool("get_privileges_of_users", **reads("user_privileges", "privileges"))
+async def get_privileges_of_users(user_ids: list[str]) -> Any:
+    """
+        Retrieve the privileges of several users at once, grouped by user id.
+    """
+    return await make_management_server_request("GET", f"{SERVER_URL}/user_privileges/", params={"id_user": user_ids})
 
-@mcp.tool("get_all_privileges")
-async def get_all_privileges() -> Any:
+@mcp.tool("add_privileges_to_users", **writes("user_privileges"))
+async def add_privileges_to_users(user_ids: list[str], arr_id_privileges: list[str]) -> Any:
     """
-        Retrieve all privileges.
+        Add the same privileges to several users.
     """
-    headers = {
-        "User-Agent": USER_AGENT,
-        "Accept": "application/json"
-    }
+    data = {"arr_id_users": user_ids, "arr_id_privileges": arr_id_privileges}
+    return await make_management_server_request("POST", f"{SERVER_URL}/grant_privileges/", data)
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(f"{SERVER_URL}/privileges/", headers=headers, timeout=30.0)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            return None
+@mcp.tool("delete_privileges_to_users", **writes("user_privileges"))
+async def delete_privileges_to_users(user_ids: list[str], arr_id_privileges: list[str]) -> Any:
+    """
+        Delete the same privileges from several users.
+    """
+    data = {"arr_id_users": user_ids, "arr_id_privileges": arr_id_privileges}
+    return await make_management_server_request("POST", f"{SERVER_URL}/revoke_privileges/", data)
+
+@mcp.tool("get_all_privileges", **reads("privileges"))
+async def get_all_privileges(limit: int = 50, after: str = None, fields: str = None, name: str = None) -> Any:
+    """
+        Retrieve a page of privileges.
+        Pass the returned next_cursor as `after` to get the next page; `name` matches part of the privilege name.
+    """
+    params = {"limit": limit, "after": after, "fields": fields, "name": name}
+    return await make_management_server_request("GET", f"{SERVER_URL}/privileges/", params=params)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MCP Management Server")
+    parser.add_argument("--transport", choices=["stdio", "sse", "streamable-http"], default="stdio",
+                        help="stdio for a private subprocess, sse or streamable-http to serve many clients")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    args = parser.parse_args()
+
+    mcp.settings.host = args.host
+    mcp.settings.port = args.port
     print("Starting MCP Management Server...")
-    server = mcp.run(transport="stdio")
-
+    server = mcp.run(transport=args.transport)
@@ -0,0 +1,85 @@
+import os
+from abc import abstractmethod
+
+from common import repository as base
+from common.database import DB_MODE, create_connection, create_async_connection
+from common.repository import repository_lifespan
+from common.tracing import get_tracer
+from management_server.constants import SERVICE
+
+tracer = get_tracer(SERVICE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS "Users" (
+    id_user INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_name TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+CREATE TABLE IF NOT EXISTS "Privileges" (
+    id_privilege INTEGER PRIMARY KEY AUTOINCREMENT,
+    privilege_name TEXT NOT NULL,
+    privilege_description TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+CREATE TABLE IF NOT EXISTS "Users_X_Privileges" (
+    id_user INTEGER NOT NULL REFERENCES "Users"(id_user) ON DELETE CASCADE,
+    id_privilege INTEGER NOT NULL REFERENCES "Privileges"(id_privilege) ON DELETE CASCADE,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+    PRIMARY KEY (id_user, id_privilege)
+);
+CREATE INDEX IF NOT EXISTS users_x_privileges_id_privilege ON "Users_X_Privileges"(id_privilege);
+"""
+
+
+class Repository(base.Repository):
+    """
+        Storage of the users, the privileges and the privileges granted to each user.
+    """
+    @abstractmethod
+    async def privileges_of_users(self, user_ids: list[str]) -> dict[str, list[dict]]:
+        """
+            Privileges of each user, resolved with a single query joining Users_X_Privileges and Privileges.
+        """
+        ...
+
+
+class SupabaseRepository(base.SupabaseRepository, Repository):
+    """
+        Users and privileges stored in Supabase.
+    """
+    async def privileges_of_users(self, user_ids: list[str]) -> dict[str, list[dict]]:
+        # The Privileges rows are embedded through the foreign key of Users_X_Privileges
+        response = await self.execute(self.connection.table("Users_X_Privileges").select("id_user, Privileges(*)").in_("id_user", user_ids), "select", "Users_X_Privileges")
+        privileges = {str(user_id): [] for user_id in user_ids}
+        for row in response.data:
+            privileges.setdefault(str(row["id_user"]), []).append(row["Privileges"])
+        return privileges
+
+
+class SQLiteRepository(base.SQLiteRepository, Repository):
+    """
+        Users and privileges stored in SQLite.
+    """
+    async def privileges_of_users(self, user_ids: list[str]) -> dict[str, list[dict]]:
+        rows = await self.read(
+            'SELECT x.id_user AS granted_to, p.* FROM "Users_X_Privileges" x'
+            ' JOIN "Privileges" p ON p.id_privilege = x.id_privilege'
+            f' WHERE x.id_user IN ({", ".join("?" * len(user_ids))})',
+            user_ids
+        )
+        privileges = {str(user_id): [] for user_id in user_ids}
+        for row in rows:
+            privileges.setdefault(str(row.pop("granted_to")), []).append(row)
+        return privileges
+
+
+async def create_repository() -> Repository:
+    """
+        Storage selected by STORAGE_BACKEND: `supabase` (default) or `sqlite` (stored at SQLITE_PATH).
+    """
+    if os.environ.get("STORAGE_BACKEND", "supabase") == "sqlite":
+        return SQLiteRepository(os.environ.get("SQLITE_PATH", "management_server.db"), SCHEMA, tracer)
+    connection = await create_async_connection() if DB_MODE == "async" else create_connection()
+    return SupabaseRepository(connection, tracer, "Users", "id_user")
+
+lifespan = repository_lifespan(create_repository)
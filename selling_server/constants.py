@@ -1,2 +1,8 @@
+SERVICE = "selling_server"
 SERVER_URL = "http://localhost:8001"
-USER_AGENT = "Management-server/1.0"
+USER_AGENT = "Selling-server/1.0"
+
+# Columns of the tables that can be projected
+CLIENT_COLUMNS = {"id_client", "client_name", "email", "created_at"}
+PRODUCT_COLUMNS = {"id_product", "product_name", "price", "created_at"}
+SELLING_COLUMNS = {"id", "id_client", "id_product", "price_at_moment", "created_at"}
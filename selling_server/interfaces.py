@@ -1,5 +1,8 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field
+from typing import List, Optional
+
+# Maximum number of rows of a bulk operation
+MAX_BULK_ITEMS = 1000
 
 class CreateClientRequest(BaseModel):
     client_name: str
@@ -26,3 +29,35 @@ class UpdateSellingRequest(BaseModel):
     id_client: Optional[str] = None
     id_product: Optional[str] = None
     price_at_moment: Optional[float] = None
+
+# Bulk operations
+class ClientRecord(CreateClientRequest):
+    id_client: str
+
+class ProductRecord(CreateProductRequest):
+    id_product: str
+
+class SellingRecord(CreateSellingRequest):
+    id: str
+
+class BulkCreateClientsRequest(BaseModel):
+    items: List[CreateClientRequest] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+
+class BulkUpsertClientsRequest(BaseModel):
+    items: List[ClientRecord] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+
+class BulkCreateProductsRequest(BaseModel):
+    items: List[CreateProductRequest] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+
+class BulkUpsertProductsRequest(BaseModel):
+    items: List[ProductRecord] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+
+class BulkCreateSellingsRequest(BaseModel):
+    items: List[CreateSellingRequest] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+
+class BulkUpsertSellingsRequest(BaseModel):
+    items: List[SellingRecord] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+
+class BulkDeleteRequest(BaseModel):
+    # Parsed as integers like the keys they are compared with, so "01" is the id 1
+    ids: List[int] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
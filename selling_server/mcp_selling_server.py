@@ -1,105 +1,244 @@
+import argparse
+import sys
+from pathlib import Path
 from typing import Any
-import httpx
-from mcp.server.fastmcp import FastMCP
 
-SELLING_SERVER_URL = "http://localhost:8001"  # Change port if needed
-USER_AGENT = "Selling-server/1.0"
+# Run as a script, the project root replaces the directory of the script so the
+# modules are imported from their package and do not collide with the ones of
+# the other MCP server when both are loaded in the same process
+if __package__ in (None, ""):
+    sys.path[0] = str(Path(__file__).resolve().parent.parent)
 
-mcp = FastMCP("selling_server")
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
 
-def get_headers():
-    return {
-        "User-Agent": USER_AGENT,
-        "Accept": "application/json"
-    }
+from selling_server.constants import SERVER_URL, SERVICE, USER_AGENT
+from selling_server.interfaces import CreateClientRequest, ClientRecord, CreateProductRequest, ProductRecord, CreateSellingRequest, SellingRecord
+from common.http_client import RestClient, RequestError, error_result
+from common.mcp_server import TracedFastMCP, reads, writes
+from common.tracing import get_tracer
 
-async def make_request(method: str, endpoint: str, data: Any = None) -> Any:
-    async with httpx.AsyncClient() as client:
-        try:
-            if method == "GET":
-                response = await client.get(endpoint, headers=get_headers(), timeout=30.0)
-            elif method == "POST":
-                response = await client.post(endpoint, json=data, headers=get_headers(), timeout=30.0)
-            elif method == "PUT":
-                response = await client.put(endpoint, json=data, headers=get_headers(), timeout=30.0)
-            elif method == "DELETE":
-                response = await client.delete(endpoint, headers=get_headers(), timeout=30.0)
-            else:
-                return None
-            response.raise_for_status()
-            return response.json()
-        except Exception:
-            return None
+tracer = get_tracer(SERVICE)
 
-# CLIENTS
-@mcp.tool("list_clients")
-async def list_clients() -> Any:
-    return await make_request("GET", f"{SELLING_SERVER_URL}/clients/")
+def rest_app():
+    # Imported on first use, only the direct backend serves the REST application in-process
+    from selling_server.selling_server import app
+
+    return app
+
+rest_client = RestClient(USER_AGENT, rest_app, tracer)
+
+mcp = TracedFastMCP("selling_server", tracer, lifespan=rest_client.lifespan)
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(tracer.metrics_text())
 
-@mcp.tool("get_client")
+async def make_request(method: str, endpoint: str, data: Any = None, params: dict = None) -> Any:
+    if params is not None:
+        params = {k: v for k, v in params.items() if v is not None}
+    try:
+        return await rest_client.request(method, endpoint, data, params)
+    except RequestError as e:
+        # Transient failures were already retried, the model gets a structured error
+        return error_result(e)
+
+# CLIENTS
+@mcp.tool("list_clients", **reads("clients"))
+async def list_clients(limit: int = 50, after: str = None, fields: str = None, name: str = None, email: str = None) -> Any:
+    """
+        List clients page by page. Pass the returned next_cursor as `after` to get the next page.
+        `fields` is a comma separated list of columns to return; `name` matches part of the client name.
+    """
+    params = {"limit": limit, "after": after, "fields": fields, "name": name, "email": email}
+    return await make_request("GET", f"{SERVER_URL}/clients/", params=params)
+
+@mcp.tool("get_client", **reads("clients"))
 async def get_client(client_id: str) -> Any:
-    return await make_request("GET", f"{SELLING_SERVER_URL}/clients/{client_id}")
+    return await make_request("GET", f"{SERVER_URL}/clients/{client_id}")
 
-@mcp.tool("create_client")
+@mcp.tool("create_client", **writes("clients"))
 async def create_client(client_name: str, email: str) -> Any:
     data = {"client_name": client_name, "email": email}
-    return await make_request("POST", f"{SELLING_SERVER_URL}/clients/", data)
+    return await make_request("POST", f"{SERVER_URL}/clients/", data)
 
-@mcp.tool("update_client")
+@mcp.tool("update_client", **writes("clients"))
 async def update_client(client_id: str, client_name: str = None, email: str = None) -> Any:
     data = {k: v for k, v in {"client_name": client_name, "email": email}.items() if v is not None}
-    return await make_request("PUT", f"{SELLING_SERVER_URL}/clients/{client_id}", data)
+    return await make_request("PUT", f"{SERVER_URL}/clients/{client_id}", data)
 
-@mcp.tool("delete_client")
+@mcp.tool("delete_client", **writes("clients", "sellings"))
 async def delete_client(client_id: str) -> Any:
-    return await make_request("DELETE", f"{SELLING_SERVER_URL}/clients/{client_id}")
+    return await make_request("DELETE", f"{SERVER_URL}/clients/{client_id}")
+
+@mcp.tool("create_clients_bulk", **writes("clients"))
+async def create_clients_bulk(items: list[CreateClientRequest]) -> Any:
+    """
+        Create many clients in a single operation. Returns one result per item.
+    """
+    data = {"items": [item.model_dump() for item in items]}
+    return await make_request("POST", f"{SERVER_URL}/clients/bulk", data)
+
+@mcp.tool("upsert_clients_bulk", **writes("clients"))
+async def upsert_clients_bulk(items: list[ClientRecord]) -> Any:
+    """
+        Insert or update many clients (complete records including their id) in a single operation.
+    """
+    data = {"items": [item.model_dump() for item in items]}
+    return await make_request("PUT", f"{SERVER_URL}/clients/bulk", data)
+
+@mcp.tool("delete_clients_bulk", **writes("clients", "sellings"))
+async def delete_clients_bulk(ids: list[str]) -> Any:
+    """
+        Delete many clients by id in a single operation. Returns whether each id was deleted.
+    """
+    return await make_request("POST", f"{SERVER_URL}/clients/bulk/delete", {"ids": ids})
 
 # PRODUCTS
-@mcp.tool("list_products")
-async def list_products() -> Any:
-    return await make_request("GET", f"{SELLING_SERVER_URL}/products/")
-
-@mcp.tool("get_product")
+@mcp.tool("list_products", **reads("products"))
+async def list_products(limit: int = 50, after: str = None, fields: str = None, name: str = None, min_price: float = None, max_price: float = None) -> Any:
+    """
+        List products page by page. Pass the returned next_cursor as `after` to get the next page.
+        `fields` is a comma separated list of columns to return; `name` matches part of the product name.
+    """
+    params = {"limit": limit, "after": after, "fields": fields, "name": name, "min_price": min_price, "max_price": max_price}
+    return await make_request("GET", f"{SERVER_URL}/products/", params=params)
+
+@mcp.tool("get_product", **reads("products"))
 async def get_product(product_id: str) -> Any:
-    return await make_request("GET", f"{SELLING_SERVER_URL}/products/{product_id}")
+    return await make_request("GET", f"{SERVER_URL}/products/{product_id}")
 
-@mcp.tool("create_product")
+@mcp.tool("create_product", **writes("products"))
 async def create_product(product_name: str, price: float) -> Any:
     data = {"product_name": product_name, "price": price}
-    return await make_request("POST", f"{SELLING_SERVER_URL}/products/", data)
+    return await make_request("POST", f"{SERVER_URL}/products/", data)
 
-@mcp.tool("update_product")
+@mcp.tool("update_product", **writes("products"))
 async def update_product(product_id: str, product_name: str = None, price: float = None) -> Any:
     data = {k: v for k, v in {"product_name": product_name, "price": price}.items() if v is not None}
-    return await make_request("PUT", f"{SELLING_SERVER_URL}/products/{product_id}", data)
+    return await make_request("PUT", f"{SERVER_URL}/products/{product_id}", data)
 
-@mcp.tool("delete_product")
+@mcp.tool("delete_product", **writes("products", "sellings"))
 async def delete_product(product_id: str) -> Any:
-    return await make_request("DELETE", f"{SELLING_SERVER_URL}/products/{product_id}")
+    return await make_request("DELETE", f"{SERVER_URL}/products/{product_id}")
+
+@mcp.tool("create_products_bulk", **writes("products"))
+async def create_products_bulk(items: list[CreateProductRequest]) -> Any:
+    """
+        Create many products in a single operation. Returns one result per item.
+    """
+    data = {"items": [item.model_dump() for item in items]}
+    return await make_request("POST", f"{SERVER_URL}/products/bulk", data)
+
+@mcp.tool("upsert_products_bulk", **writes("products"))
+async def upsert_products_bulk(items: list[ProductRecord]) -> Any:
+    """
+        Insert or update many products (complete records including their id) in a single operation.
+    """
+    data = {"items": [item.model_dump() for item in items]}
+    return await make_request("PUT", f"{SERVER_URL}/products/bulk", data)
+
+@mcp.tool("delete_products_bulk", **writes("products", "sellings"))
+async def delete_products_bulk(ids: list[str]) -> Any:
+    """
+        Delete many products by id in a single operation. Returns whether each id was deleted.
+    """
+    return await make_request("POST", f"{SERVER_URL}/products/bulk/delete", {"ids": ids})
 
 # SELLINGS
-@mcp.tool("list_sellings")
-async def list_sellings() -> Any:
-    return await make_request("GET", f"{SELLING_SERVER_URL}/sellings/")
-
-@mcp.tool("get_selling")
+@mcp.tool("list_sellings", **reads("sellings"))
+async def list_sellings(limit: int = 50, after: str = None, fields: str = None, id_client: str = None, id_product: str = None, date_from: str = None, date_to: str = None) -> Any:
+    """
+        List sellings page by page. Pass the returned next_cursor as `after` to get the next page.
+        Filter by client, product or by ISO dates (`date_from` inclusive, `date_to` exclusive).
+        `fields` is a comma separated list of columns to return.
+    """
+    params = {"limit": limit, "after": after, "fields": fields, "id_client": id_client, "id_product": id_product, "date_from": date_from, "date_to": date_to}
+    return await make_request("GET", f"{SERVER_URL}/sellings/", params=params)
+
+@mcp.tool("get_selling", **reads("sellings"))
 async def get_selling(selling_id: str) -> Any:
-    return await make_request("GET", f"{SELLING_SERVER_URL}/sellings/{selling_id}")
+    return await make_request("GET", f"{SERVER_URL}/sellings/{selling_id}")
 
-@mcp.tool("create_selling")
+@mcp.tool("create_selling", **writes("sellings"))
 async def create_selling(id_client: str, id_product: str, price_at_moment: float) -> Any:
     data = {"id_client": id_client, "id_product": id_product, "price_at_moment": price_at_moment}
-    return await make_request("POST", f"{SELLING_SERVER_URL}/sellings/", data)
+    return await make_request("POST", f"{SERVER_URL}/sellings/", data)
 
-@mcp.tool("update_selling")
+@mcp.tool("update_selling", **writes("sellings"))
 async def update_selling(selling_id: str, id_client: str = None, id_product: str = None, price_at_moment: float = None) -> Any:
     data = {k: v for k, v in {"id_client": id_client, "id_product": id_product, "price_at_moment": price_at_moment}.items() if v is not None}
-    return await make_request("PUT", f"{SELLING_SERVER_URL}/sellings/{selling_id}", data)
+    return await make_request("PUT", f"{SERVER_URL}/sellings/{selling_id}", data)
 
-@mcp.tool("delete_selling")
+@mcp.tool("delete_selling", **writes("sellings"))
 async def delete_selling(selling_id: str) -> Any:
-    return await make_request("DELETE", f"{SELLING_SERVER_URL}/sellings/{selling_id}")
+    return await make_request("DELETE", f"{SERVER_URL}/sellings/{selling_id}")
+
+@mcp.tool("create_sellings_bulk", **writes("sellings"))
+async def create_sellings_bulk(items: list[CreateSellingRequest]) -> Any:
+    """
+        Create many sellings in a single operation. Returns one result per item.
+    """
+    data = {"items": [item.model_dump() for item in items]}
+    return await make_request("POST", f"{SERVER_URL}/sellings/bulk", data)
+
+@mcp.tool("upsert_sellings_bulk", **writes("sellings"))
+async def upsert_sellings_bulk(items: list[SellingRecord]) -> Any:
+    """
+        Insert or update many sellings (complete records including their id) in a single operation.
+    """
+    data = {"items": [item.model_dump() for item in items]}
+    return await make_request("PUT", f"{SERVER_URL}/sellings/bulk", data)
+
+@mcp.tool("delete_sellings_bulk", **writes("sellings"))
+async def delete_sellings_bulk(ids: list[str]) -> Any:
+    """
+        Delete many sellings by id in a single operation. Returns whether each id was deleted.
+    """
+    return await make_request("POST", f"{SERVER_URL}/sellings/bulk/delete", {"ids": ids})
+
+# ANALYTICS
+@mcp.tool("get_sales_summary", **reads("sellings", "products", "clients"))
+async def get_sales_summary(group_by: str = "product", order_by: str = None, limit: int = 10, date_from: str = None, date_to: str = None, id_client: str = None, id_product: str = None) -> Any:
+    """
+        Revenue and units sold grouped by `product`, `client`, `day`, `week` or `month`, with the totals.
+        Prefer it over listing sellings to answer questions about amounts. Dates are ISO 8601, `date_to` is exclusive.
+        `order_by` is `revenue`, `units` or `key` (by default products and clients by revenue, time buckets in order).
+    """
+    params = {
+        "group_by": group_by,
+        "order_by": order_by,
+        "limit": limit,
+        "date_from": date_from,
+        "date_to": date_to,
+        "id_client": id_client,
+        "id_product": id_product
+    }
+    return await make_request("GET", f"{SERVER_URL}/analytics/sales", params=params)
+
+@mcp.tool("get_top_products", **reads("sellings", "products"))
+async def get_top_products(limit: int = 5, order_by: str = "revenue", date_from: str = None, date_to: str = None, id_client: str = None) -> Any:
+    """
+        Best selling products by `revenue` or `units`, optionally for a period or a client.
+    """
+    return await get_sales_summary("product", order_by, limit, date_from, date_to, id_client=id_client)
+
+@mcp.tool("get_top_clients", **reads("sellings", "clients"))
+async def get_top_clients(limit: int = 5, order_by: str = "revenue", date_from: str = None, date_to: str = None, id_product: str = None) -> Any:
+    """
+        Clients buying the most by `revenue` or `units`, optionally for a period or a product.
+    """
+    return await get_sales_summary("client", order_by, limit, date_from, date_to, id_product=id_product)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MCP Selling Server")
+    parser.add_argument("--transport", choices=["stdio", "sse", "streamable-http"], default="stdio",
+                        help="stdio for a private subprocess, sse or streamable-http to serve many clients")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001)
+    args = parser.parse_args()
+
+    mcp.settings.host = args.host
+    mcp.settings.port = args.port
     print("Starting MCP Selling Server...")
-    server = mcp.run(transport="stdio")
+    server = mcp.run(transport=args.transport)
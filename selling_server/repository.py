@@ -0,0 +1,223 @@
+import os
+from abc import abstractmethod
+
+from common import repository as base
+from common.database import DB_MODE, create_connection, create_async_connection
+from common.repository import repository_lifespan
+from common.tracing import get_tracer
+from selling_server.constants import SERVICE
+
+tracer = get_tracer(SERVICE)
+
+# Expressions grouping the Sellings rows of the sales summary in SQLite
+SALES_GROUPS = {
+    "product": "s.id_product",
+    "client": "s.id_client",
+    "day": "date(s.day)",
+    "week": "date(s.day, 'weekday 0', '-6 days')",
+    "month": "strftime('%Y-%m-01', s.day)",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS "Client" (
+    id_client INTEGER PRIMARY KEY AUTOINCREMENT,
+    client_name TEXT NOT NULL,
+    email TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+CREATE TABLE IF NOT EXISTS "Product" (
+    id_product INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_name TEXT NOT NULL,
+    price REAL NOT NULL,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+CREATE TABLE IF NOT EXISTS "Sellings" (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id_client INTEGER NOT NULL REFERENCES "Client"(id_client),
+    id_product INTEGER NOT NULL REFERENCES "Product"(id_product),
+    price_at_moment REAL NOT NULL,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+CREATE INDEX IF NOT EXISTS sellings_id_client ON "Sellings"(id_client);
+CREATE INDEX IF NOT EXISTS sellings_id_product ON "Sellings"(id_product);
+CREATE INDEX IF NOT EXISTS sellings_created_at ON "Sellings"(created_at);
+
+-- Revenue and units per day, product and client, kept up to date by the triggers of Sellings
+CREATE TABLE IF NOT EXISTS "Sellings_Daily_Rollup" (
+    day TEXT NOT NULL,
+    id_product INTEGER NOT NULL,
+    id_client INTEGER NOT NULL,
+    revenue REAL NOT NULL,
+    units INTEGER NOT NULL,
+    PRIMARY KEY (day, id_product, id_client)
+);
+CREATE INDEX IF NOT EXISTS sellings_daily_rollup_id_product ON "Sellings_Daily_Rollup"(id_product);
+CREATE INDEX IF NOT EXISTS sellings_daily_rollup_id_client ON "Sellings_Daily_Rollup"(id_client);
+
+CREATE TRIGGER IF NOT EXISTS sellings_rollup_insert AFTER INSERT ON "Sellings" BEGIN
+    INSERT INTO "Sellings_Daily_Rollup" (day, id_product, id_client, revenue, units)
+    VALUES (date(NEW.created_at), NEW.id_product, NEW.id_client, NEW.price_at_moment, 1)
+    ON CONFLICT (day, id_product, id_client) DO UPDATE SET revenue = revenue + excluded.revenue, units = units + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS sellings_rollup_delete AFTER DELETE ON "Sellings" BEGIN
+    UPDATE "Sellings_Daily_Rollup" SET revenue = revenue - OLD.price_at_moment, units = units - 1
+    WHERE day = date(OLD.created_at) AND id_product = OLD.id_product AND id_client = OLD.id_client;
+    DELETE FROM "Sellings_Daily_Rollup"
+    WHERE day = date(OLD.created_at) AND id_product = OLD.id_product AND id_client = OLD.id_client AND units <= 0;
+END;
+CREATE TRIGGER IF NOT EXISTS sellings_rollup_update AFTER UPDATE OF id_client, id_product, price_at_moment, created_at ON "Sellings" BEGIN
+    UPDATE "Sellings_Daily_Rollup" SET revenue = revenue - OLD.price_at_moment, units = units - 1
+    WHERE day = date(OLD.created_at) AND id_product = OLD.id_product AND id_client = OLD.id_client;
+    DELETE FROM "Sellings_Daily_Rollup"
+    WHERE day = date(OLD.created_at) AND id_product = OLD.id_product AND id_client = OLD.id_client AND units <= 0;
+    INSERT INTO "Sellings_Daily_Rollup" (day, id_product, id_client, revenue, units)
+    VALUES (date(NEW.created_at), NEW.id_product, NEW.id_client, NEW.price_at_moment, 1)
+    ON CONFLICT (day, id_product, id_client) DO UPDATE SET revenue = revenue + excluded.revenue, units = units + 1;
+END;
+"""
+
+# Sellings aggregated per day, product and client, the reference of the rollups
+SQLITE_RAW_ROLLUP = """
+SELECT date(created_at) AS day, id_product, id_client, SUM(price_at_moment) AS revenue, COUNT(*) AS units
+FROM "Sellings" GROUP BY 1, 2, 3
+"""
+
+# Differences larger than this between the rollups and the Sellings are reported
+ROLLUP_TOLERANCE = 0.005
+
+
+def rollup_covers(filters: dict) -> bool:
+    """
+        The daily rollups answer a sales summary when its dates are whole days (YYYY-MM-DD).
+    """
+    return all(
+        filters.get(name) is None or len(filters[name]) == 10
+        for name in ("date_from", "date_to")
+    )
+
+
+class Repository(base.Repository):
+    """
+        Storage of the clients, products and sellings, with the sales analytics.
+    """
+    @abstractmethod
+    async def sales_summary(self, group_by: str, order_by: str, limit: int, filters: dict) -> list[dict]:
+        """
+            Revenue and units of the sellings grouped by product, client or time bucket (day, week, month).
+            Each group also carries the totals of every group, computed before the limit.
+            `filters` may hold date_from, date_to, id_client and id_product.
+            The daily rollups are read instead of the Sellings when they cover the filters.
+        """
+        ...
+
+    @abstractmethod
+    async def rebuild_rollup(self) -> int:
+        """
+            Recompute the daily rollups from the Sellings and return the number of rollup rows.
+        """
+        ...
+
+    @abstractmethod
+    async def check_rollup(self) -> dict:
+        """
+            Compare the daily rollups with the Sellings and report the groups that differ.
+        """
+        ...
+
+
+class SupabaseRepository(base.SupabaseRepository, Repository):
+    """
+        Sellings stored in Supabase, summarized by the SQL functions of sql/.
+    """
+    async def sales_summary(self, group_by: str, order_by: str, limit: int, filters: dict) -> list[dict]:
+        # Aggregated in Postgres by the function of sql/sales_summary.sql
+        response = await self.execute(self.connection.rpc("sales_summary", {
+            "use_rollup": rollup_covers(filters),
+            "group_by": group_by,
+            "order_by": order_by,
+            "max_groups": limit,
+            "date_from": filters.get("date_from"),
+            "date_to": filters.get("date_to"),
+            "filter_client": filters.get("id_client"),
+            "filter_product": filters.get("id_product"),
+        }), "rpc", "sales_summary")
+        return response.data
+
+    async def rebuild_rollup(self) -> int:
+        # Functions of sql/sales_rollup.sql
+        response = await self.execute(self.connection.rpc("rebuild_sales_rollup", {}), "rpc", "rebuild_sales_rollup")
+        return response.data
+
+    async def check_rollup(self) -> dict:
+        response = await self.execute(self.connection.rpc("check_sales_rollup", {"tolerance": ROLLUP_TOLERANCE}), "rpc", "check_sales_rollup")
+        return {"consistent": not response.data, "mismatches": response.data}
+
+
+class SQLiteRepository(base.SQLiteRepository, Repository):
+    """
+        Sellings stored in SQLite, with the daily rollups kept by triggers.
+    """
+    async def sales_summary(self, group_by: str, order_by: str, limit: int, filters: dict) -> list[dict]:
+        if rollup_covers(filters):
+            source = '"Sellings_Daily_Rollup"'
+        else:
+            source = '(SELECT created_at AS day, id_product, id_client, price_at_moment AS revenue, 1 AS units FROM "Sellings")'
+        where, params = self.where([
+            (f"s.{column}", operator, filters[name])
+            for name, column, operator in [
+                ("date_from", "day", "gte"),
+                ("date_to", "day", "lt"),
+                ("id_client", "id_client", "eq"),
+                ("id_product", "id_product", "eq"),
+            ]
+            if filters.get(name) is not None
+        ])
+        name, join = "NULL", ""
+        if group_by == "product":
+            name, join = "n.product_name", ' LEFT JOIN "Product" n ON n.id_product = g.key'
+        elif group_by == "client":
+            name, join = "n.client_name", ' LEFT JOIN "Client" n ON n.id_client = g.key'
+        order = "g.key" if order_by == "key" else f"g.{order_by} DESC, g.key"
+        return await self.read(
+            f'WITH g AS (SELECT {SALES_GROUPS[group_by]} AS key, SUM(s.revenue) AS revenue, SUM(s.units) AS units,'
+            ' SUM(SUM(s.revenue)) OVER () AS total_revenue, SUM(SUM(s.units)) OVER () AS total_units'
+            f' FROM {source} s{where} GROUP BY 1)'
+            f' SELECT g.*, {name} AS name FROM g{join} ORDER BY {order} LIMIT ?',
+            [*params, limit]
+        )
+
+    async def rebuild_rollup(self) -> int:
+        await self.write([
+            ('DELETE FROM "Sellings_Daily_Rollup"', []),
+            (f'INSERT INTO "Sellings_Daily_Rollup" (day, id_product, id_client, revenue, units) {SQLITE_RAW_ROLLUP}', []),
+        ])
+        rows = await self.read('SELECT COUNT(*) AS groups FROM "Sellings_Daily_Rollup"')
+        return rows[0]["groups"]
+
+    async def check_rollup(self) -> dict:
+        # Groups missing on either side or whose amounts differ
+        mismatches = await self.read(
+            f'WITH raw AS ({SQLITE_RAW_ROLLUP})'
+            ' SELECT w.day, w.id_product, w.id_client, r.revenue AS rollup_revenue, r.units AS rollup_units,'
+            ' w.revenue AS raw_revenue, w.units AS raw_units'
+            ' FROM raw w LEFT JOIN "Sellings_Daily_Rollup" r USING (day, id_product, id_client)'
+            ' WHERE r.units IS NULL OR r.units != w.units OR abs(r.revenue - w.revenue) > ?'
+            ' UNION ALL'
+            ' SELECT r.day, r.id_product, r.id_client, r.revenue, r.units, NULL, NULL'
+            ' FROM "Sellings_Daily_Rollup" r LEFT JOIN raw w USING (day, id_product, id_client)'
+            ' WHERE w.units IS NULL',
+            [ROLLUP_TOLERANCE]
+        )
+        return {"consistent": not mismatches, "mismatches": mismatches}
+
+
+async def create_repository() -> Repository:
+    """
+        Storage selected by STORAGE_BACKEND: `supabase` (default) or `sqlite` (stored at SQLITE_PATH).
+    """
+    if os.environ.get("STORAGE_BACKEND", "supabase") == "sqlite":
+        return SQLiteRepository(os.environ.get("SQLITE_PATH", "selling_server.db"), SCHEMA, tracer)
+    connection = await create_async_connection() if DB_MODE == "async" else create_connection()
+    return SupabaseRepository(connection, tracer, "Product", "id_product")
+
+lifespan = repository_lifespan(create_repository)
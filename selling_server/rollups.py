@@ -0,0 +1,37 @@
+"""
+    Maintenance of the daily sales rollups of the configured storage.
+
+        python -m selling_server.rollups rebuild    backfill the rollups from the Sellings
+        python -m selling_server.rollups check      compare the rollups with the Sellings
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from dotenv import load_dotenv
+
+from selling_server.repository import create_repository
+
+async def run(command: str) -> dict:
+    repository = await create_repository()
+    try:
+        if command == "rebuild":
+            return {"groups": await repository.rebuild_rollup()}
+        return await repository.check_rollup()
+    finally:
+        await repository.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintenance of the daily sales rollups")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    args = parser.parse_args()
+
+    load_dotenv()
+    result = asyncio.run(run(args.command))
+    print(json.dumps(result, indent=2, default=str))
+    if args.command == "check" and not result["consistent"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
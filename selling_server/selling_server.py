@@ -1,116 +1,247 @@
-import os
-from supabase import create_client, Client
-from fastapi import FastAPI, Body
+from typing import Literal, Optional
+from fastapi import FastAPI, Body, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
 from selling_server.interfaces import CreateClientRequest, UpdateClientRequest, CreateProductRequest, UpdateProductRequest, CreateSellingRequest, UpdateSellingRequest
+from selling_server.interfaces import (
+    BulkCreateClientsRequest,
+    BulkUpsertClientsRequest,
+    BulkCreateProductsRequest,
+    BulkUpsertProductsRequest,
+    BulkCreateSellingsRequest,
+    BulkUpsertSellingsRequest,
+    BulkDeleteRequest
+)
+from selling_server.repository import Repository, lifespan
+from common.repository import get_repository
+from common.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, select_columns
+from selling_server.constants import SERVICE, CLIENT_COLUMNS, PRODUCT_COLUMNS, SELLING_COLUMNS
+from common.cache import create_cache, cache_key
+from common.tracing import get_tracer
+from common.admission import Admission
 from dotenv import load_dotenv
 
-app = FastAPI()
 load_dotenv()
+app = FastAPI(lifespan=lifespan)
+tracer = get_tracer(SERVICE)
+# The tracing middleware is added last so it wraps the admission control and sees the 429s
+admission = Admission(tracer)
+app.middleware("http")(admission.admit_request)
+app.middleware("http")(tracer.trace_request)
+cache = create_cache("selling_server:")
 
-def create_connection() -> Client:
-    url: str = os.environ.get("SUPABASE_URL")
-    key: str = os.environ.get("SUPABASE_KEY")
-    supabase: Client = create_client(url, key)
-    return supabase
+def bulk_results(status: str, rows: list) -> dict:
+    return {"results": [{"index": index, "status": status, "data": row} for index, row in enumerate(rows)]}
+
+def bulk_delete_results(ids: list[int], rows: list, key: str) -> dict:
+    deleted = {int(row[key]) for row in rows}
+    return {"results": [{"id": id, "status": "deleted" if id in deleted else "not_found"} for id in ids]}
+
+def found(row: Optional[dict]) -> dict:
+    if row is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return row
+
+@app.get("/health")
+async def health(repository: Repository = Depends(get_repository)):
+    return await repository.health()
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return cache.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return tracer.metrics_text()
 
 # CRUD for Client
 @app.post("/clients/")
-def create_client_entry(request: CreateClientRequest = Body(...)):
-    supabase = create_connection()
-    response = supabase.table("Client").insert({"client_name": request.client_name, "email": request.email}).execute()
-    return response.data
+async def create_client_entry(request: CreateClientRequest = Body(...), repository: Repository = Depends(get_repository)):
+    return await repository.insert("Client", [{"client_name": request.client_name, "email": request.email}])
+
+# Bulk routes are declared before the /{id} routes so "bulk" is not taken as an id
+@app.post("/clients/bulk")
+async def create_clients_bulk(request: BulkCreateClientsRequest = Body(...), repository: Repository = Depends(get_repository)):
+    data = [item.model_dump() for item in request.items]
+    rows = await repository.insert("Client", data)
+    return bulk_results("created", rows)
+
+@app.put("/clients/bulk")
+async def upsert_clients_bulk(request: BulkUpsertClientsRequest = Body(...), repository: Repository = Depends(get_repository)):
+    data = [item.model_dump() for item in request.items]
+    rows = await repository.upsert("Client", data, "id_client")
+    return bulk_results("upserted", rows)
+
+@app.post("/clients/bulk/delete")
+async def delete_clients_bulk(request: BulkDeleteRequest = Body(...), repository: Repository = Depends(get_repository)):
+    rows = await repository.delete("Client", [("id_client", "in", request.ids)])
+    return bulk_delete_results(request.ids, rows, "id_client")
 
 @app.get("/clients/")
-def list_clients():
-    supabase = create_connection()
-    response = supabase.table("Client").select("*").execute()
-    return response.data
+async def list_clients(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    name: Optional[str] = None,
+    email: Optional[str] = None,
+    repository: Repository = Depends(get_repository)
+):
+    filters = []
+    if name is not None:
+        filters.append(("client_name", "ilike", f"%{name}%"))
+    if email is not None:
+        filters.append(("email", "eq", email))
+    columns = select_columns(fields, CLIENT_COLUMNS, "id_client")
+    return await repository.page("Client", "id_client", columns, limit, after, filters)
 
 @app.get("/clients/{client_id}")
-def get_client(client_id: str):
-    supabase = create_connection()
-    response = supabase.table("Client").select("*").eq("id_client", client_id).single().execute()
-    return response.data
+async def get_client(client_id: str, repository: Repository = Depends(get_repository)):
+    return found(await repository.get("Client", "id_client", client_id))
 
 @app.put("/clients/{client_id}")
-def update_client(client_id: str, request: UpdateClientRequest = Body(...)):
-    supabase = create_connection()
+async def update_client(client_id: str, request: UpdateClientRequest = Body(...), repository: Repository = Depends(get_repository)):
     data = {}
     if request.client_name is not None:
         data["client_name"] = request.client_name
     if request.email is not None:
         data["email"] = request.email
-    response = supabase.table("Client").update(data).eq("id_client", client_id).execute()
-    return response.data
+    return await repository.update("Client", data, [("id_client", "eq", client_id)])
 
 @app.delete("/clients/{client_id}")
-def delete_client(client_id: str):
-    supabase = create_connection()
-    response = supabase.table("Client").delete().eq("id_client", client_id).execute()
-    return {"deleted": response.data}
+async def delete_client(client_id: str, repository: Repository = Depends(get_repository)):
+    rows = await repository.delete("Client", [("id_client", "eq", client_id)])
+    return {"deleted": rows}
 
 # CRUD for Product
 @app.post("/products/")
-def create_product(request: CreateProductRequest = Body(...)):
-    supabase = create_connection()
-    response = supabase.table("Product").insert({"product_name": request.product_name, "price": request.price}).execute()
-    return response.data
+async def create_product(request: CreateProductRequest = Body(...), repository: Repository = Depends(get_repository)):
+    rows = await repository.insert("Product", [{"product_name": request.product_name, "price": request.price}])
+    await cache.invalidate("products:")
+    return rows
+
+@app.post("/products/bulk")
+async def create_products_bulk(request: BulkCreateProductsRequest = Body(...), repository: Repository = Depends(get_repository)):
+    data = [item.model_dump() for item in request.items]
+    rows = await repository.insert("Product", data)
+    await cache.invalidate("products:")
+    return bulk_results("created", rows)
+
+@app.put("/products/bulk")
+async def upsert_products_bulk(request: BulkUpsertProductsRequest = Body(...), repository: Repository = Depends(get_repository)):
+    data = [item.model_dump() for item in request.items]
+    rows = await repository.upsert("Product", data, "id_product")
+    await cache.invalidate("products:")
+    return bulk_results("upserted", rows)
+
+@app.post("/products/bulk/delete")
+async def delete_products_bulk(request: BulkDeleteRequest = Body(...), repository: Repository = Depends(get_repository)):
+    rows = await repository.delete("Product", [("id_product", "in", request.ids)])
+    await cache.invalidate("products:")
+    return bulk_delete_results(request.ids, rows, "id_product")
 
 @app.get("/products/")
-def list_products():
-    supabase = create_connection()
-    response = supabase.table("Product").select("*").execute()
-    return response.data
+async def list_products(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    name: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    repository: Repository = Depends(get_repository)
+):
+    async def load():
+        filters = []
+        if name is not None:
+            filters.append(("product_name", "ilike", f"%{name}%"))
+        if min_price is not None:
+            filters.append(("price", "gte", min_price))
+        if max_price is not None:
+            filters.append(("price", "lte", max_price))
+        columns = select_columns(fields, PRODUCT_COLUMNS, "id_product")
+        return await repository.page("Product", "id_product", columns, limit, after, filters)
+
+    key = cache_key("products", "list", limit, after, fields, name, min_price, max_price)
+    return await cache.response(request, key, load)
 
 @app.get("/products/{product_id}")
-def get_product(product_id: str):
-    supabase = create_connection()
-    response = supabase.table("Product").select("*").eq("id_product", product_id).single().execute()
-    return response.data
+async def get_product(product_id: str, request: Request, repository: Repository = Depends(get_repository)):
+    async def load():
+        return found(await repository.get("Product", "id_product", product_id))
+
+    return await cache.response(request, cache_key("products", product_id), load)
 
 @app.put("/products/{product_id}")
-def update_product(product_id: str, request: UpdateProductRequest = Body(...)):
-    supabase = create_connection()
+async def update_product(product_id: str, request: UpdateProductRequest = Body(...), repository: Repository = Depends(get_repository)):
     data = {}
     if request.product_name is not None:
         data["product_name"] = request.product_name
     if request.price is not None:
         data["price"] = request.price
-    response = supabase.table("Product").update(data).eq("id_product", product_id).execute()
-    return response.data
+    rows = await repository.update("Product", data, [("id_product", "eq", product_id)])
+    await cache.invalidate("products:")
+    return rows
 
 @app.delete("/products/{product_id}")
-def delete_product(product_id: str):
-    supabase = create_connection()
-    response = supabase.table("Product").delete().eq("id_product", product_id).execute()
-    return {"deleted": response.data}
+async def delete_product(product_id: str, repository: Repository = Depends(get_repository)):
+    rows = await repository.delete("Product", [("id_product", "eq", product_id)])
+    await cache.invalidate("products:")
+    return {"deleted": rows}
 
 # CRUD for Selling
 @app.post("/sellings/")
-def create_selling(request: CreateSellingRequest = Body(...)):
-    supabase = create_connection()
-    response = supabase.table("Sellings").insert({
+async def create_selling(request: CreateSellingRequest = Body(...), repository: Repository = Depends(get_repository)):
+    return await repository.insert("Sellings", [{
         "id_client": request.id_client,
         "id_product": request.id_product,
         "price_at_moment": request.price_at_moment
-    }).execute()
-    return response.data
+    }])
+
+@app.post("/sellings/bulk")
+async def create_sellings_bulk(request: BulkCreateSellingsRequest = Body(...), repository: Repository = Depends(get_repository)):
+    data = [item.model_dump() for item in request.items]
+    rows = await repository.insert("Sellings", data)
+    return bulk_results("created", rows)
+
+@app.put("/sellings/bulk")
+async def upsert_sellings_bulk(request: BulkUpsertSellingsRequest = Body(...), repository: Repository = Depends(get_repository)):
+    data = [item.model_dump() for item in request.items]
+    rows = await repository.upsert("Sellings", data, "id")
+    return bulk_results("upserted", rows)
+
+@app.post("/sellings/bulk/delete")
+async def delete_sellings_bulk(request: BulkDeleteRequest = Body(...), repository: Repository = Depends(get_repository)):
+    rows = await repository.delete("Sellings", [("id", "in", request.ids)])
+    return bulk_delete_results(request.ids, rows, "id")
 
 @app.get("/sellings/")
-def list_sellings():
-    supabase = create_connection()
-    response = supabase.table("Sellings").select("*").execute()
-    return response.data
+async def list_sellings(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    id_client: Optional[str] = None,
+    id_product: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    repository: Repository = Depends(get_repository)
+):
+    filters = []
+    if id_client is not None:
+        filters.append(("id_client", "eq", id_client))
+    if id_product is not None:
+        filters.append(("id_product", "eq", id_product))
+    if date_from is not None:
+        filters.append(("created_at", "gte", date_from))
+    if date_to is not None:
+        filters.append(("created_at", "lt", date_to))
+    columns = select_columns(fields, SELLING_COLUMNS, "id")
+    return await repository.page("Sellings", "id", columns, limit, after, filters)
 
 @app.get("/sellings/{selling_id}")
-def get_selling(selling_id: str):
-    supabase = create_connection()
-    response = supabase.table("Sellings").select("*").eq("id", selling_id).single().execute()
-    return response.data
+async def get_selling(selling_id: str, repository: Repository = Depends(get_repository)):
+    return found(await repository.get("Sellings", "id", selling_id))
 
 @app.put("/sellings/{selling_id}")
-def update_selling(selling_id: str, request: UpdateSellingRequest = Body(...)):
-    supabase = create_connection()
+async def update_selling(selling_id: str, request: UpdateSellingRequest = Body(...), repository: Repository = Depends(get_repository)):
     data = {}
     if request.id_client is not None:
         data["id_client"] = request.id_client
@@ -118,11 +249,43 @@ def update_selling(selling_id: str, request: UpdateSellingRequest = Body(...)):
         data["id_product"] = request.id_product
     if request.price_at_moment is not None:
         data["price_at_moment"] = request.price_at_moment
-    response = supabase.table("Sellings").update(data).eq("id", selling_id).execute()
-    return response.data
+    return await repository.update("Sellings", data, [("id", "eq", selling_id)])
 
 @app.delete("/sellings/{selling_id}")
-def delete_selling(selling_id: str):
-    supabase = create_connection()
-    response = supabase.table("Sellings").delete().eq("id", selling_id).execute()
-    return {"deleted": response.data}
+async def delete_selling(selling_id: str, repository: Repository = Depends(get_repository)):
+    rows = await repository.delete("Sellings", [("id", "eq", selling_id)])
+    return {"deleted": rows}
+
+# Sales analytics, aggregated by the storage so only the groups are returned
+@app.get("/analytics/sales")
+async def sales_summary(
+    group_by: Literal["product", "client", "day", "week", "month"] = "product",
+    order_by: Optional[Literal["revenue", "units", "key"]] = None,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    id_client: Optional[str] = None,
+    id_product: Optional[str] = None,
+    repository: Repository = Depends(get_repository)
+):
+    if order_by is None:
+        # Time buckets are listed in order, products and clients from the best seller
+        order_by = "revenue" if group_by in ("product", "client") else "key"
+    filters = {"date_from": date_from, "date_to": date_to, "id_client": id_client, "id_product": id_product}
+    rows = await repository.sales_summary(group_by, order_by, limit, filters)
+    groups = []
+    for row in rows:
+        # The key is text whatever the grouping and the storage: an id of SQLite is an integer
+        group = {"key": str(row["key"]), "revenue": round(float(row["revenue"]), 2), "units": int(row["units"])}
+        if row.get("name") is not None:
+            group["name"] = row["name"]
+        groups.append(group)
+    return {
+        "group_by": group_by,
+        "order_by": order_by,
+        "groups": groups,
+        "totals": {
+            "revenue": round(float(rows[0]["total_revenue"]), 2) if rows else 0,
+            "units": int(rows[0]["total_units"]) if rows else 0
+        }
+    }
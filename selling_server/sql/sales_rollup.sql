@@ -0,0 +1,79 @@
+-- Revenue and units per day, product and client, kept up to date by a trigger of "Sellings".
+-- Apply it once in the SQL editor of the Supabase project, then call rebuild_sales_rollup()
+-- (or run `python -m selling_server.rollups rebuild`) to backfill the existing sellings.
+-- The ids are stored as text so the table does not depend on the type of the keys.
+create table if not exists "Sellings_Daily_Rollup" (
+    day date not null,
+    id_product text not null,
+    id_client text not null,
+    revenue numeric not null,
+    units bigint not null,
+    primary key (day, id_product, id_client)
+);
+create index if not exists sellings_daily_rollup_id_product on "Sellings_Daily_Rollup"(id_product);
+create index if not exists sellings_daily_rollup_id_client on "Sellings_Daily_Rollup"(id_client);
+
+create or replace function apply_sales_rollup(row_day date, row_product text, row_client text, delta_revenue numeric, delta_units bigint)
+returns void
+language sql
+as $$
+    insert into "Sellings_Daily_Rollup" as r (day, id_product, id_client, revenue, units)
+    values (row_day, row_product, row_client, delta_revenue, delta_units)
+    on conflict (day, id_product, id_client)
+    do update set revenue = r.revenue + excluded.revenue, units = r.units + excluded.units;
+
+    delete from "Sellings_Daily_Rollup"
+    where day = row_day and id_product = row_product and id_client = row_client and units <= 0;
+$$;
+
+create or replace function sellings_rollup_trigger()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform apply_sales_rollup(old.created_at::date, old.id_product::text, old.id_client::text, -old.price_at_moment, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform apply_sales_rollup(new.created_at::date, new.id_product::text, new.id_client::text, new.price_at_moment, 1);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists sellings_rollup on "Sellings";
+create trigger sellings_rollup
+after insert or delete or update of id_client, id_product, price_at_moment, created_at on "Sellings"
+for each row execute function sellings_rollup_trigger();
+
+create or replace function rebuild_sales_rollup()
+returns bigint
+language sql
+as $$
+    delete from "Sellings_Daily_Rollup" where true;
+
+    insert into "Sellings_Daily_Rollup" (day, id_product, id_client, revenue, units)
+    select created_at::date, id_product::text, id_client::text, sum(price_at_moment), count(*)
+    from "Sellings"
+    group by 1, 2, 3;
+
+    select count(*) from "Sellings_Daily_Rollup";
+$$;
+
+create or replace function check_sales_rollup(tolerance numeric default 0.005)
+returns table (day date, id_product text, id_client text, rollup_revenue numeric, rollup_units bigint, raw_revenue numeric, raw_units bigint)
+language sql
+stable
+as $$
+    with raw as (
+        select created_at::date as day, id_product::text as id_product, id_client::text as id_client,
+               sum(price_at_moment)::numeric as revenue, count(*) as units
+        from "Sellings"
+        group by 1, 2, 3
+    )
+    select day, id_product, id_client, r.revenue, r.units, w.revenue, w.units
+    from "Sellings_Daily_Rollup" r
+    full join raw w using (day, id_product, id_client)
+    where r.units is distinct from w.units
+       or abs(coalesce(r.revenue, 0) - coalesce(w.revenue, 0)) > tolerance;
+$$;
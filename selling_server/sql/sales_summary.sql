@@ -0,0 +1,59 @@
+-- Sales aggregated by product, client or time bucket, called by the selling server through RPC.
+-- Apply it once in the SQL editor of the Supabase project, after sales_rollup.sql.
+-- With use_rollup the daily rollups are read instead of "Sellings" (the dates must be whole days).
+drop function if exists sales_summary(text, text, integer, timestamptz, timestamptz, text, text);
+
+create or replace function sales_summary(
+    group_by text,
+    use_rollup boolean default false,
+    order_by text default 'revenue',
+    max_groups integer default 10,
+    date_from timestamptz default null,
+    date_to timestamptz default null,
+    filter_client text default null,
+    filter_product text default null
+)
+returns table (key text, name text, revenue numeric, units numeric, total_revenue numeric, total_units numeric)
+language sql
+stable
+as $$
+    with source as (
+        select r.day::timestamptz as created_at, r.id_product, r.id_client, r.revenue, r.units
+        from "Sellings_Daily_Rollup" r
+        where use_rollup
+          and (date_from is null or r.day >= date_from::date)
+          and (date_to is null or r.day < date_to::date)
+          and (filter_client is null or r.id_client = filter_client)
+          and (filter_product is null or r.id_product = filter_product)
+        union all
+        select s.created_at, s.id_product::text, s.id_client::text, s.price_at_moment::numeric, 1
+        from "Sellings" s
+        where not use_rollup
+          and (date_from is null or s.created_at >= date_from)
+          and (date_to is null or s.created_at < date_to)
+          and (filter_client is null or s.id_client::text = filter_client)
+          and (filter_product is null or s.id_product::text = filter_product)
+    ),
+    grouped as (
+        select
+            case group_by
+                when 'product' then s.id_product
+                when 'client' then s.id_client
+                else to_char(date_trunc(group_by, s.created_at), 'YYYY-MM-DD')
+            end as key,
+            sum(s.revenue) as revenue,
+            sum(s.units) as units,
+            sum(sum(s.revenue)) over () as total_revenue,
+            sum(sum(s.units)) over () as total_units
+        from source s
+        group by 1
+    )
+    select g.key, coalesce(p.product_name, c.client_name) as name, g.revenue, g.units, g.total_revenue, g.total_units
+    from grouped g
+    left join "Product" p on group_by = 'product' and p.id_product::text = g.key
+    left join "Client" c on group_by = 'client' and c.id_client::text = g.key
+    order by
+        case order_by when 'revenue' then g.revenue when 'units' then g.units end desc nulls last,
+        g.key
+    limit max_groups;
+$$;
@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+# The servers are imported from their package and the agent modules from agent_app,
+# as when they are run
+ROOT = Path(__file__).resolve().parent.parent
+for path in (ROOT, ROOT / "agent_app"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
@@ -0,0 +1,63 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from common.admission import Admission, RouteLimiter
+from common.tracing import get_tracer
+
+tracer = get_tracer("tests")
+
+
+def slow_app(admission: Admission, release: asyncio.Event) -> FastAPI:
+    app = FastAPI()
+    app.middleware("http")(admission.admit_request)
+
+    @app.get("/slow")
+    async def slow():
+        await release.wait()
+        return {"ok": True}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    return app
+
+
+def test_requests_over_the_limit_are_rejected():
+    async def run():
+        admission = Admission(tracer)
+        admission.limiters["GET /slow"] = RouteLimiter(concurrency=1, queue_size=1, timeout=5)
+        release = asyncio.Event()
+        transport = httpx.ASGITransport(app=slow_app(admission, release))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            running = asyncio.create_task(client.get("/slow"))
+            queued = asyncio.create_task(client.get("/slow"))
+            while admission.limiters["GET /slow"].stats()["queued"] < 1:
+                await asyncio.sleep(0.01)
+            rejected = await client.get("/slow")
+            # Exempt routes are never queued
+            health = await client.get("/health")
+            release.set()
+            return rejected, health, await running, await queued, admission.stats()
+
+    rejected, health, running, queued, stats = asyncio.run(run())
+    assert rejected.status_code == 429
+    assert rejected.headers["Retry-After"] == "5"
+    assert health.status_code == 200
+    assert running.status_code == queued.status_code == 200
+    assert stats["GET /slow"] == {"concurrency": 1, "active": 0, "queued": 0, "rejected": 1}
+
+
+def test_queued_request_times_out():
+    async def run():
+        limiter = RouteLimiter(concurrency=1, queue_size=1, timeout=0.05)
+        assert await limiter.acquire()
+        admitted = await limiter.acquire()
+        limiter.release()
+        return admitted, limiter.stats()
+
+    admitted, stats = asyncio.run(run())
+    assert not admitted
+    assert stats == {"concurrency": 1, "active": 0, "queued": 0, "rejected": 1}
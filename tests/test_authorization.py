@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+from mcp.types import CallToolResult, TextContent
+
+from authorization import Authorizer
+from conversation import Conversation
+
+USERS = [
+    {"id_user": "1", "user_name": "Ana"},
+    {"id_user": "2", "user_name": "Anabel"},
+    {"id_user": "3", "user_name": "Luis"},
+    {"id_user": "4", "user_name": "luis"},
+]
+PRIVILEGES = {"1": ["user_management"], "2": ["reader"], "3": [], "4": []}
+
+
+class FakeServers:
+    """
+    Management tools answering from USERS and PRIVILEGES, counting the calls.
+    """
+
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.calls: list[tuple[str, dict]] = []
+
+    async def call_tool(self, tool_name: str, tool_args: dict) -> CallToolResult:
+        self.calls.append((tool_name, tool_args))
+        await asyncio.sleep(self.delay)
+        if tool_name == "get_users":
+            name = tool_args["name"].lower()
+            body = {"items": [user for user in USERS if name in user["user_name"].lower()]}
+        else:
+            body = {"privileges": [{"privilege_name": name} for name in PRIVILEGES[tool_args["user_id"]]]}
+        return CallToolResult(content=[TextContent(type="text", text=json.dumps(body))])
+
+
+def identify(authorizer: Authorizer, **tool_args) -> tuple[Conversation, dict]:
+    conversation = Conversation()
+    return conversation, asyncio.run(authorizer.identify(conversation, tool_args))
+
+
+def test_exact_name_identifies_the_user():
+    conversation, result = identify(Authorizer(FakeServers()), user_name="ana")
+    assert result == {"user_id": "1", "privileges": ["user_management"]}
+    assert conversation.acting_user_id == "1"
+
+
+def test_partial_name_is_refused():
+    conversation, result = identify(Authorizer(FakeServers()), user_name="Anab")
+    assert result["error"] == "not_found"
+    assert [user["user_name"] for user in result["candidates"]] == ["Anabel"]
+    assert conversation.acting_user_id is None
+
+
+def test_ambiguous_name_is_refused():
+    conversation, result = identify(Authorizer(FakeServers()), user_name="LUIS")
+    assert result["error"] == "ambiguous"
+    assert {user["id_user"] for user in result["candidates"]} == {"3", "4"}
+    assert conversation.acting_user_id is None
+
+
+def test_tool_is_denied_without_the_privilege():
+    authorizer = Authorizer(FakeServers())
+    conversation, _ = identify(authorizer, user_name="Anabel")
+    # A privilege unrelated to user management does not allow reading the users either
+    for tool_name in ("delete_user", "get_users", "get_privileges_of_user"):
+        denied = asyncio.run(authorizer.check(conversation, tool_name))
+        assert denied["error"] == "forbidden"
+
+
+def test_user_management_allows_the_tools():
+    authorizer = Authorizer(FakeServers())
+    conversation, _ = identify(authorizer, user_name="Ana")
+    for tool_name in ("delete_user", "get_users", "get_privileges_of_user"):
+        assert asyncio.run(authorizer.check(conversation, tool_name)) is None
+
+
+def test_unidentified_user_is_denied():
+    denied = asyncio.run(Authorizer(FakeServers()).check(Conversation(), "get_users"))
+    assert denied["error"] == "unauthenticated"
+
+
+def test_concurrent_lookups_of_a_user_are_shared():
+    servers = FakeServers(delay=0.05)
+    authorizer = Authorizer(servers)
+
+    async def run():
+        return await asyncio.gather(
+            authorizer.privileges_of("1"),
+            authorizer.privileges_of("1"),
+            authorizer.privileges_of("2"),
+        )
+
+    assert asyncio.run(run()) == [{"user_management"}, {"user_management"}, {"reader"}]
+    assert [args["user_id"] for _, args in servers.calls] == ["1", "2"]
+
+
+def test_lookups_of_different_users_run_concurrently():
+    authorizer = Authorizer(FakeServers(delay=0.2))
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(*(authorizer.privileges_of(user_id) for user_id in PRIVILEGES))
+        return loop.time() - started
+
+    assert asyncio.run(run()) < 0.4
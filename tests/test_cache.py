@@ -0,0 +1,73 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI, Request
+
+from common.cache import MemoryCache, ResponseCache, cache_key
+
+
+def memory_cache() -> ResponseCache:
+    return ResponseCache(MemoryCache(16), ttl=60)
+
+
+def test_load_finishing_after_a_write_is_not_stored():
+    async def run():
+        cache = memory_cache()
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def stale_load():
+            started.set()
+            await release.wait()
+            return {"name": "before"}
+
+        read = asyncio.create_task(cache.get_or_load("users:1", stale_load))
+        await started.wait()
+        await cache.invalidate("users:")
+        release.set()
+        stale = await read
+        fresh = await cache.get_or_load("users:1", lambda: {"name": "after"})
+        return stale[0], fresh[0]
+
+    assert asyncio.run(run()) == ({"name": "before"}, {"name": "after"})
+
+
+def test_invalidation_is_scoped_to_its_prefix():
+    async def run():
+        cache = memory_cache()
+        await cache.get_or_load("users:1", lambda: "user")
+        await cache.get_or_load("privileges:1", lambda: "privilege")
+        await cache.invalidate("users:")
+        user = await cache.get_or_load("users:1", lambda: "reloaded")
+        privilege = await cache.get_or_load("privileges:1", lambda: "reloaded")
+        return user[0], privilege[0]
+
+    assert asyncio.run(run()) == ("reloaded", "privilege")
+
+
+def test_etag_revalidation():
+    cache = memory_cache()
+    users = {"1": {"name": "ana"}}
+    app = FastAPI()
+
+    @app.get("/users/{user_id}")
+    async def get_user(user_id: str, request: Request):
+        return await cache.response(request, cache_key("users", user_id), lambda: users[user_id])
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = await client.get("/users/1")
+            etag = first.headers["ETag"]
+            revalidated = await client.get("/users/1", headers={"If-None-Match": etag})
+            users["1"] = {"name": "anabel"}
+            await cache.invalidate("users:")
+            changed = await client.get("/users/1", headers={"If-None-Match": etag})
+            return first, revalidated, changed
+
+    first, revalidated, changed = asyncio.run(run())
+    assert first.json() == {"name": "ana"}
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == first.headers["ETag"]
+    assert changed.status_code == 200
+    assert changed.json() == {"name": "anabel"}
+    assert changed.headers["ETag"] != first.headers["ETag"]
@@ -0,0 +1,94 @@
+import asyncio
+import copy
+import json
+from types import SimpleNamespace
+
+from context_manager import COMPACTED_MARKER, ContextManager, count_text_tokens, count_tokens
+from conversation import Conversation
+
+
+class FakeOpenAI:
+    """
+    Responses API answering every summary request with a fixed text, or failing.
+    """
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.inputs = []
+        self.responses = SimpleNamespace(create=self.create)
+
+    async def create(self, model, input):
+        self.inputs.append(input)
+        if self.fail:
+            raise RuntimeError("unavailable")
+        return SimpleNamespace(output_text="summary")
+
+
+def conversation_with(turns: int, output_tokens: int) -> Conversation:
+    """
+    Conversation whose turns each call a tool answering about `output_tokens` tokens.
+    """
+    conversation = Conversation()
+    for index in range(turns):
+        conversation.start_turn(f"question {index}")
+        conversation.add_items([
+            {"type": "function_call", "call_id": f"call{index}", "name": "list_clients", "arguments": "{}"},
+            {"type": "function_call_output", "call_id": f"call{index}", "output": f"{index:04d}" * output_tokens},
+            {"role": "assistant", "content": f"answer {index}"},
+        ])
+    return conversation
+
+
+def test_context_under_budget_is_untouched():
+    conversation = conversation_with(3, 10)
+    before = copy.deepcopy(conversation.messages())
+    openai = FakeOpenAI()
+    asyncio.run(ContextManager(lambda: openai, budget=10000).fit(conversation))
+    assert conversation.messages() == before
+    assert not openai.inputs
+
+
+def test_older_tool_outputs_are_compacted_first():
+    conversation = conversation_with(3, 300)
+    prefix = copy.deepcopy(conversation.prefix)
+    recent = copy.deepcopy(conversation.turns[-2:])
+    openai = FakeOpenAI()
+    manager = ContextManager(lambda: openai, budget=900, keep_recent_turns=2, tool_output_tokens=50)
+    asyncio.run(manager.fit(conversation))
+
+    assert len(conversation.turns) == 3
+    output = conversation.turns[0][2]["output"]
+    assert output.startswith(COMPACTED_MARKER)
+    assert count_text_tokens(json.loads(output)["preview"]) <= 51
+    # The recent turns and the prefix are kept as they were, nothing was summarized
+    assert conversation.turns[-2:] == recent
+    assert conversation.prefix == prefix
+    assert conversation.summary is None
+    assert not openai.inputs
+
+
+def test_oldest_turns_are_folded_into_the_summary():
+    conversation = conversation_with(4, 300)
+    prefix = copy.deepcopy(conversation.prefix)
+    recent = copy.deepcopy(conversation.turns[-2:])
+    openai = FakeOpenAI()
+    manager = ContextManager(lambda: openai, budget=800, keep_recent_turns=2, tool_output_tokens=50)
+    asyncio.run(manager.fit(conversation))
+
+    assert conversation.turns == recent
+    assert conversation.summary == "summary"
+    assert conversation.prefix == prefix
+    assert conversation.messages()[:len(prefix)] == prefix
+    transcript = openai.inputs[0][1]["content"]
+    assert "user: question 0" in transcript and "user: question 1" in transcript
+    assert "question 2" not in transcript
+    assert count_tokens(conversation.messages()) <= 800
+
+
+def test_failed_summary_keeps_the_end_of_the_transcript_within_the_budget():
+    conversation = conversation_with(4, 300)
+    manager = ContextManager(lambda: FakeOpenAI(fail=True), budget=800, keep_recent_turns=2, tool_output_tokens=50)
+    asyncio.run(manager.fit(conversation))
+
+    assert count_text_tokens(conversation.summary) <= 800 // 4 + 1
+    assert conversation.summary.endswith("assistant: answer 1")
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from common import http_client
+from common.http_client import CircuitBreaker, RequestError, RestClient
+from common.tracing import get_tracer
+
+tracer = get_tracer("tests")
+
+
+def rest_client(handler) -> RestClient:
+    client = RestClient("tests", lambda: None, tracer)
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_breaker_opens_and_fails_fast():
+    breaker = CircuitBreaker(failures=2, reset_timeout=60)
+    breaker.failure()
+    breaker.before()
+    breaker.failure()
+    with pytest.raises(RequestError) as error:
+        breaker.before()
+    assert error.value.type == "unavailable"
+    assert error.value.retryable
+
+
+def test_breaker_half_open_recovery():
+    breaker = CircuitBreaker(failures=1, reset_timeout=0.05)
+    breaker.failure()
+    time.sleep(0.06)
+    # One probe goes through, the next request waits for its outcome
+    breaker.before()
+    with pytest.raises(RequestError):
+        breaker.before()
+    breaker.success()
+    breaker.before()
+    assert breaker.opened_at is None
+
+
+def test_breaker_failed_probe_opens_again():
+    breaker = CircuitBreaker(failures=1, reset_timeout=0.05)
+    breaker.failure()
+    time.sleep(0.06)
+    breaker.before()
+    breaker.failure()
+    with pytest.raises(RequestError):
+        breaker.before()
+
+
+def test_transient_failure_is_retried(monkeypatch):
+    monkeypatch.setattr(http_client, "backoff", lambda attempt: 0)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"ok": True})
+
+    assert asyncio.run(rest_client(handler).request("GET", "http://backend/clients/")) == {"ok": True}
+    assert len(calls) == 2
+
+
+def test_non_idempotent_request_is_not_retried(monkeypatch):
+    monkeypatch.setattr(http_client, "backoff", lambda attempt: 0)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503, json={"detail": "down"})
+
+    with pytest.raises(RequestError) as error:
+        asyncio.run(rest_client(handler).request("POST", "http://backend/clients/", {"name": "ana"}))
+    assert error.value.status == 503
+    assert error.value.detail == "down"
+    assert len(calls) == 1
+
+
+def test_clients_do_not_share_state():
+    selling = RestClient("selling", lambda: None, tracer)
+    management = RestClient("management", lambda: None, tracer)
+    assert selling.breaker_for("http://backend/") is not management.breaker_for("http://backend/")
+    assert selling.build_client().headers["User-Agent"] == "selling"
@@ -0,0 +1,29 @@
+import os
+
+from mcp_pool import script_version
+
+
+def touch(path, mtime):
+    path.write_text("")
+    os.utime(path, (mtime, mtime))
+
+
+def test_version_follows_the_imported_modules(tmp_path):
+    (tmp_path / "server").mkdir()
+    (tmp_path / "common").mkdir()
+    script = tmp_path / "server" / "mcp_server.py"
+    touch(script, 1000)
+    touch(tmp_path / "server" / "http_client.py", 1000)
+    touch(tmp_path / "common" / "tracing.py", 1000)
+
+    version = script_version(str(script))
+    assert version == script_version(str(script))
+    touch(tmp_path / "common" / "tracing.py", 2000)
+    assert script_version(str(script)) != version
+    version = script_version(str(script))
+    touch(tmp_path / "server" / "http_client.py", 2000)
+    assert script_version(str(script)) != version
+
+
+def test_missing_script_has_no_version(tmp_path):
+    assert script_version(str(tmp_path / "missing.py")) is None
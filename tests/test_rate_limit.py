@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+import rate_limit
+from rate_limit import RateLimitError, RateLimiter, TokenBucket
+
+
+def test_bucket_refills_over_time():
+    bucket = TokenBucket(rate=20, burst=2)
+    assert bucket.reserve(0) == 0
+    assert bucket.reserve(0) == 0
+    # Empty, the next token comes in 1/20 s
+    assert bucket.reserve(0) is None
+    assert bucket.reserve(1) == pytest.approx(0.05, abs=0.01)
+    time.sleep(0.15)
+    assert bucket.reserve(0) == 0
+
+
+def test_bucket_never_exceeds_its_burst():
+    bucket = TokenBucket(rate=1000, burst=2)
+    time.sleep(0.01)
+    bucket.refill()
+    assert bucket.tokens == 2
+
+
+def test_tool_limit_raises(monkeypatch):
+    monkeypatch.setattr(rate_limit, "AGENT_TOOL_LIMITS", {"create_selling": [0.1, 1]})
+    limiter = RateLimiter()
+    assert limiter.reserve("create_selling", max_wait=0) == 0
+    with pytest.raises(RateLimitError, match="create_selling"):
+        limiter.reserve("create_selling", max_wait=0)
+    # Other tools keep their own bucket
+    assert limiter.reserve("list_clients", max_wait=0) == 0
+
+
+def test_session_limit_refunds_the_tool_token(monkeypatch):
+    monkeypatch.setattr(rate_limit, "AGENT_SESSION_RATE", 0.1)
+    monkeypatch.setattr(rate_limit, "AGENT_SESSION_BURST", 1)
+    limiter = RateLimiter()
+    limiter.reserve("list_clients", max_wait=0)
+    tokens = limiter.bucket("get_users").tokens
+    with pytest.raises(RateLimitError, match="conversation"):
+        limiter.reserve("get_users", max_wait=0)
+    assert limiter.bucket("get_users").tokens == pytest.approx(tokens, abs=0.01)
@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from common import repository as base
+from common.tracing import get_tracer
+from management_server.repository import SCHEMA, Repository, SQLiteRepository
+
+tracer = get_tracer("tests")
+
+
+def test_incomplete_backend_fails_on_instantiation():
+    class NoPrivileges(base.SQLiteRepository, Repository):
+        pass
+
+    with pytest.raises(TypeError, match="privileges_of_users"):
+        NoPrivileges(":memory:", SCHEMA, tracer)
+
+
+def test_duplicate_grant_is_a_conflict():
+    repository = SQLiteRepository(":memory:", SCHEMA, tracer)
+
+    async def grant_twice():
+        users = await repository.insert("Users", [{"user_name": "ana"}])
+        privileges = await repository.insert("Privileges", [{"privilege_name": "reader"}])
+        grant = {"id_user": users[0]["id_user"], "id_privilege": privileges[0]["id_privilege"]}
+        await repository.insert("Users_X_Privileges", [grant])
+        await repository.insert("Users_X_Privileges", [grant])
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(grant_twice())
+    assert error.value.status_code == 409
+    # The failed transaction left the first grant in place
+    rows = asyncio.run(repository.read('SELECT COUNT(*) AS grants FROM "Users_X_Privileges"'))
+    assert rows == [{"grants": 1}]
+    asyncio.run(repository.close())
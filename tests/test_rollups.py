@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from common.tracing import get_tracer
+from selling_server.repository import SCHEMA, SQLITE_RAW_ROLLUP, SQLiteRepository
+
+tracer = get_tracer("tests")
+
+
+async def rollup(repository: SQLiteRepository) -> list[dict]:
+    return await repository.read('SELECT * FROM "Sellings_Daily_Rollup" ORDER BY day, id_product, id_client')
+
+async def recomputed(repository: SQLiteRepository) -> list[dict]:
+    return await repository.read(f"SELECT * FROM ({SQLITE_RAW_ROLLUP}) ORDER BY day, id_product, id_client")
+
+async def assert_consistent(repository: SQLiteRepository):
+    assert await rollup(repository) == await recomputed(repository)
+    assert (await repository.check_rollup())["consistent"]
+
+
+@pytest.fixture
+def repository():
+    repository = SQLiteRepository(":memory:", SCHEMA, tracer)
+    asyncio.run(repository.insert("Client", [{"client_name": "ana"}, {"client_name": "luis"}]))
+    asyncio.run(repository.insert("Product", [{"product_name": "pen", "price": 2.5}, {"product_name": "book", "price": 12}]))
+    yield repository
+    asyncio.run(repository.close())
+
+
+def selling(id_client: int, id_product: int, price: float, day: str) -> dict:
+    return {"id_client": id_client, "id_product": id_product, "price_at_moment": price, "created_at": f"{day}T10:00:00.000Z"}
+
+
+def test_triggers_follow_the_sellings(repository):
+    async def run():
+        rows = await repository.insert("Sellings", [
+            selling(1, 1, 2.5, "2024-01-01"),
+            selling(1, 1, 2.5, "2024-01-01"),
+            selling(2, 2, 12, "2024-01-01"),
+            selling(2, 1, 3, "2024-01-02"),
+        ])
+        await assert_consistent(repository)
+        assert len(await rollup(repository)) == 3
+
+        # Price, product and day of a selling change
+        await repository.update("Sellings", {"price_at_moment": 4}, [("id", "eq", rows[0]["id"])])
+        await assert_consistent(repository)
+        await repository.update("Sellings", {"id_product": 2}, [("id", "eq", rows[1]["id"])])
+        await assert_consistent(repository)
+        await repository.update("Sellings", {"created_at": "2024-01-03T09:00:00.000Z"}, [("id", "eq", rows[3]["id"])])
+        await assert_consistent(repository)
+
+        # The group of the last selling of a day disappears with it
+        await repository.delete("Sellings", [("id", "eq", rows[3]["id"])])
+        await assert_consistent(repository)
+        assert all(row["day"] != "2024-01-03" for row in await rollup(repository))
+        await repository.delete("Sellings", [("id_client", "eq", 1)])
+        await assert_consistent(repository)
+        return await rollup(repository)
+
+    assert asyncio.run(run()) == [{"day": "2024-01-01", "id_product": 2, "id_client": 2, "revenue": 12.0, "units": 1}]
+
+
+def test_product_changes_keep_the_rollup(repository):
+    async def run():
+        await repository.insert("Sellings", [selling(1, 1, 2.5, "2024-01-01")])
+        # The revenue was taken at the moment of the selling
+        await repository.update("Product", {"price": 9}, [("id_product", "eq", 1)])
+        await assert_consistent(repository)
+        # A product without sellings can go, one with sellings cannot
+        await repository.delete("Product", [("id_product", "eq", 2)])
+        with pytest.raises(HTTPException) as error:
+            await repository.delete("Product", [("id_product", "eq", 1)])
+        assert error.value.status_code == 409
+        await assert_consistent(repository)
+        return await repository.sales_summary("product", "revenue", 10, {})
+
+    summary = asyncio.run(run())
+    assert [(row["key"], row["name"], row["revenue"]) for row in summary] == [(1, "pen", 2.5)]
+
+
+def test_summary_from_the_rollup_matches_the_sellings(repository):
+    async def run():
+        await repository.insert("Sellings", [
+            selling(1, 1, 2.5, "2024-01-01"),
+            selling(2, 2, 12, "2024-01-02"),
+            selling(2, 1, 3, "2024-01-09"),
+        ])
+        # Whole days are answered from the rollup, a time of day from the Sellings
+        from_rollup = await repository.sales_summary("week", "key", 10, {"date_from": "2024-01-01"})
+        from_sellings = await repository.sales_summary("week", "key", 10, {"date_from": "2024-01-01T00:00:00"})
+        return from_rollup, from_sellings
+
+    from_rollup, from_sellings = asyncio.run(run())
+    assert from_rollup == from_sellings
+    assert [(row["key"], row["units"]) for row in from_rollup] == [("2024-01-01", 2), ("2024-01-08", 1)]
+
+
+def test_rebuild_repairs_a_drifted_rollup(repository):
+    async def run():
+        await repository.insert("Sellings", [selling(1, 1, 2.5, "2024-01-01"), selling(2, 2, 12, "2024-01-02")])
+        await repository.write([
+            ('UPDATE "Sellings_Daily_Rollup" SET revenue = revenue + 1 WHERE id_product = 1', []),
+            ('INSERT INTO "Sellings_Daily_Rollup" VALUES (\'2023-12-31\', 1, 1, 5, 1)', []),
+        ])
+        drifted = await repository.check_rollup()
+        groups = await repository.rebuild_rollup()
+        await assert_consistent(repository)
+        return drifted, groups
+
+    drifted, groups = asyncio.run(run())
+    assert not drifted["consistent"]
+    assert {row["day"] for row in drifted["mismatches"]} == {"2024-01-01", "2023-12-31"}
+    assert groups == 2
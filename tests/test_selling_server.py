@@ -0,0 +1,48 @@
+import asyncio
+
+import httpx
+
+
+def test_bulk_delete_reports_the_ids_it_deleted(monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", ":memory:")
+    from selling_server.selling_server import app
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                await client.post("/clients/bulk", json={"items": [{"client_name": "ana", "email": "ana@example.com"}, {"client_name": "luis", "email": "luis@example.com"}]})
+                deleted = await client.post("/clients/bulk/delete", json={"ids": ["01", " 2", "9"]})
+                invalid = await client.post("/clients/bulk/delete", json={"ids": ["ana"]})
+                return deleted, invalid
+
+    deleted, invalid = asyncio.run(run())
+    assert deleted.json()["results"] == [
+        {"id": 1, "status": "deleted"},
+        {"id": 2, "status": "deleted"},
+        {"id": 9, "status": "not_found"},
+    ]
+    assert invalid.status_code == 422
+
+
+def test_sales_summary_keys_are_strings(monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", ":memory:")
+    from selling_server.selling_server import app
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            repository = app.state.repository
+            await repository.insert("Client", [{"client_name": "ana"}])
+            await repository.insert("Product", [{"product_name": "pen", "price": 2.5}])
+            await repository.insert("Sellings", [{"id_client": 1, "id_product": 1, "price_at_moment": 2.5}])
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return [
+                    (await client.get("/analytics/sales", params={"group_by": group_by})).json()
+                    for group_by in ("product", "client", "day")
+                ]
+
+    for summary in asyncio.run(run()):
+        assert [type(group["key"]) for group in summary["groups"]] == [str]
@@ -0,0 +1,111 @@
+import asyncio
+import socket
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from mcp import ClientSession, types
+
+import server_registry
+from server_registry import ServerConnection, ServerRegistry
+
+ROOT = Path(__file__).resolve().parent.parent
+SELLING_SERVER = str(ROOT / "selling_server" / "mcp_selling_server.py")
+
+
+def count_list_tools(monkeypatch) -> list:
+    requests = []
+    send_request = ClientSession.send_request
+
+    async def counting(self, request, *args, **kwargs):
+        if isinstance(request.root, types.ListToolsRequest):
+            requests.append(request)
+        return await send_request(self, request, *args, **kwargs)
+
+    monkeypatch.setattr(ClientSession, "send_request", counting)
+    return requests
+
+
+async def run_session(cache_path: str) -> types.CallToolResult:
+    """
+    Connect to the server like connect_all does, load its catalog and call one tool.
+    """
+    registry = ServerRegistry(cache_path)
+    connection = ServerConnection(SELLING_SERVER, transport="inprocess")
+    await connection.start()
+    connection.on_tools_changed = registry._invalidate
+    registry.servers[connection.name] = connection
+    try:
+        await registry.get_tools()
+        return await registry.call_tool("list_clients", {"limit": 1})
+    finally:
+        await registry.close()
+
+
+def test_warm_restart_does_not_list_tools(tmp_path, monkeypatch):
+    monkeypatch.setenv("MCP_BACKEND", "direct")
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", ":memory:")
+    requests = count_list_tools(monkeypatch)
+    cache_path = str(tmp_path / "tools.json")
+
+    result = asyncio.run(run_session(cache_path))
+    assert not result.isError
+    assert len(requests) == 1
+
+    # The restart reuses the catalog, output schemas included, for the tool call too
+    result = asyncio.run(run_session(cache_path))
+    assert not result.isError
+    assert len(requests) == 1
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_server_starting_after_the_agent_is_awaited(monkeypatch):
+    monkeypatch.setenv("MCP_BACKEND", "direct")
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", ":memory:")
+    monkeypatch.setattr(server_registry, "MCP_RECONNECT_INITIAL_DELAY", 0.1)
+    monkeypatch.setattr(server_registry, "MCP_RECONNECT_MAX_DELAY", 0.5)
+    monkeypatch.setattr(server_registry, "MCP_STARTUP_TIMEOUT", 30)
+    port = free_port()
+
+    async def run():
+        connection = ServerConnection(f"http://127.0.0.1:{port}/mcp")
+        starting = asyncio.create_task(connection.start())
+        await asyncio.sleep(0.5)
+        assert not starting.done()
+        server = await asyncio.create_subprocess_exec(
+            sys.executable, SELLING_SERVER, "--transport", "streamable-http", "--port", str(port),
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+        )
+        try:
+            await asyncio.wait_for(starting, 30)
+            return await connection.call_tool("list_clients", {"limit": 1})
+        finally:
+            await connection.close()
+            server.terminate()
+            await server.wait()
+
+    assert not asyncio.run(run()).isError
+
+
+def test_server_not_started_in_time_fails(monkeypatch):
+    monkeypatch.setattr(server_registry, "MCP_RECONNECT_INITIAL_DELAY", 0.1)
+    monkeypatch.setattr(server_registry, "MCP_STARTUP_TIMEOUT", 0.5)
+    port = free_port()
+
+    async def run():
+        connection = ServerConnection(f"http://127.0.0.1:{port}/mcp")
+        try:
+            await connection.start()
+        finally:
+            await connection.close()
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(run())
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from tool_memo import ToolMemo
+
+READ_A = {"read_only": True, "resources": ["a"]}
+READ_B = {"read_only": True, "resources": ["b"]}
+WRITE_A = {"read_only": False, "resources": ["a"]}
+
+
+class Loader:
+    """
+    Tool call counting its loads, each one waiting for `release` when it is given.
+    """
+
+    def __init__(self, result="result", release: asyncio.Event = None):
+        self.result = result
+        self.release = release
+        self.calls = 0
+        self.started = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        self.started.set()
+        if self.release is not None:
+            await self.release.wait()
+        return self.result
+
+
+def test_concurrent_identical_calls_share_one_load():
+    async def run():
+        memo = ToolMemo()
+        load = Loader(release=asyncio.Event())
+        calls = [asyncio.create_task(memo.call("list", {"page": 1}, READ_A, load)) for _ in range(3)]
+        await load.started.wait()
+        load.release.set()
+        return await asyncio.gather(*calls), load.calls
+
+    results, calls = asyncio.run(run())
+    assert results == ["result"] * 3
+    assert calls == 1
+
+
+def test_cancelled_leader_does_not_cancel_its_joiners():
+    async def run():
+        memo = ToolMemo()
+        leader_load = Loader(release=asyncio.Event())
+        joiner_load = Loader("joiner")
+        leader = asyncio.create_task(memo.call("list", {}, READ_A, leader_load))
+        await leader_load.started.wait()
+        joiner = asyncio.create_task(memo.call("list", {}, READ_A, joiner_load))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        # The joiner loads the result itself
+        return await joiner, joiner_load.calls
+
+    assert asyncio.run(run()) == ("joiner", 1)
+
+
+def test_write_evicts_only_the_entries_of_its_resources():
+    async def run():
+        memo = ToolMemo()
+        loads = {"a": Loader("a"), "b": Loader("b")}
+        await memo.call("read_a", {}, READ_A, loads["a"])
+        await memo.call("read_b", {}, READ_B, loads["b"])
+        await memo.call("write_a", {}, WRITE_A, Loader("written"))
+        await memo.call("read_a", {}, READ_A, loads["a"])
+        await memo.call("read_b", {}, READ_B, loads["b"])
+        return loads["a"].calls, loads["b"].calls
+
+    assert asyncio.run(run()) == (2, 1)
+
+
+def test_write_during_a_read_prevents_storing_it():
+    async def run():
+        memo = ToolMemo()
+        read = Loader("stale", release=asyncio.Event())
+        call = asyncio.create_task(memo.call("read_a", {}, READ_A, read))
+        await read.started.wait()
+        await memo.call("write_a", {}, WRITE_A, Loader("written"))
+        read.release.set()
+        stale = await call
+        fresh = Loader("fresh")
+        return stale, await memo.call("read_a", {}, READ_A, fresh), fresh.calls
+
+    assert asyncio.run(run()) == ("stale", "fresh", 1)
+
+
+def test_unrelated_write_during_a_read_keeps_it():
+    async def run():
+        memo = ToolMemo()
+        read = Loader("b", release=asyncio.Event())
+        call = asyncio.create_task(memo.call("read_b", {}, READ_B, read))
+        await read.started.wait()
+        await memo.call("write_a", {}, WRITE_A, Loader("written"))
+        read.release.set()
+        await call
+        await memo.call("read_b", {}, READ_B, read)
+        return read.calls
+
+    assert asyncio.run(run()) == 1
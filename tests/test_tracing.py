@@ -0,0 +1,41 @@
+import asyncio
+import json
+from pathlib import Path
+
+from server_registry import ServerConnection
+from tracing import span
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_trace_continues_in_spawned_server(tmp_path, monkeypatch):
+    """
+    The server spawned over stdio inherits the trace settings of the agent
+    and records its spans in the trace of the agent.
+    """
+    trace_file = tmp_path / "traces.jsonl"
+    monkeypatch.setenv("TRACE_EXPORTER", "jsonl")
+    monkeypatch.setenv("TRACE_FILE", str(trace_file))
+    monkeypatch.setenv("MCP_BACKEND", "direct")
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", ":memory:")
+
+    async def call():
+        connection = ServerConnection(str(ROOT / "selling_server" / "mcp_selling_server.py"), transport="stdio")
+        await connection.start()
+        try:
+            with span("agent query") as root:
+                result = await connection.call_tool("list_clients", {"limit": 1})
+        finally:
+            await connection.close()
+        return root, result
+
+    root, result = asyncio.run(call())
+    assert not result.isError
+
+    spans = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    server_spans = {item["name"]: item for item in spans if item["service"] == "selling_server"}
+    assert {"tool list_clients", "http GET", "GET /clients/", "db read"} <= set(server_spans)
+    assert all(item["trace_id"] == root.trace_id for item in server_spans.values())
+    assert server_spans["tool list_clients"]["parent_span_id"] == root.span_id
+    assert server_spans["GET /clients/"]["parent_span_id"] == server_spans["http GET"]["span_id"]